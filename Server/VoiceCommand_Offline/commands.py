@@ -0,0 +1,148 @@
+"""
+오프라인 텍스트 → 명령/스킬 판정
+- 서버(/recognize)와 평가 도구(tools/evaluate.py)가 같은 판정 로직을 사용
+- 명령 키워드 / 스킬 별칭은 voice_common.catalog 의 데이터 파일에서 로드
+- 전사는 resolve_text 에서 한 번 정규화(voice_common.normalize)해 모든 매처가 공유
+"""
+
+import os
+
+from voice_common.catalog import CatalogStore, DEFAULT_COMMANDS_PATH, DEFAULT_SKILLS_PATH
+from voice_common.early_exit import CommandSpotter
+from voice_common.keyword_spotter import KWS_COMMANDS
+from voice_common.normalize import canonical, normalize, word_breaks
+from voice_common.segment import segment_commands
+
+# 명령/스킬 카탈로그 (데이터 파일에서 로드, 서버는 catalog_store.start_watching()으로 변경 시 다시 로드)
+catalog_store = CatalogStore(
+    os.getenv("COMMANDS_CATALOG_PATH", DEFAULT_COMMANDS_PATH),
+    os.getenv("SKILLS_CATALOG_PATH", DEFAULT_SKILLS_PATH)
+).load()
+
+
+def build_spotter(skills: tuple = (), context: str = "") -> CommandSpotter:
+    """활성 카탈로그(시스템 명령 키워드 + 요청의 스킬 이름/별칭)로 조기 종료 판정기 생성"""
+    catalog = catalog_store.current
+    phrases = {keyword: f"SYSTEM:{command}" for keyword, command in catalog.keywords_for(context)}
+    for alias, target in catalog.skill_aliases:
+        if target in skills:
+            phrases[alias] = target
+    for skill in skills:
+        phrases[skill] = skill
+    return CommandSpotter(phrases)
+
+
+def grammar_phrases(context: str, context_keywords: str, skills: tuple = ()) -> dict:
+    """문법 제한 디코딩에 쓸 허용 구문 → 대상 (닫힌 구문 집합이 없는 컨텍스트면 빈 사전)
+
+    InGame_Playing: 요청 스킬 이름/별칭 + 이동 명령(KWS_COMMANDS) 키워드
+    그 외 context_keywords 가 있는 화면: 화면 키워드("설정", "뒤로" 등)를 포함하는 명령 키워드
+    """
+    catalog = catalog_store.current
+    if context == "InGame_Playing":
+        if not skills:
+            return {}
+        phrases = {keyword: f"SYSTEM:{command}" for keyword, command in catalog.keywords_for(context)
+                   if command in KWS_COMMANDS}
+        for alias, target in catalog.skill_aliases:
+            if target in skills:
+                phrases[alias] = target
+        for skill in skills:
+            phrases[skill.lower()] = skill
+        return phrases
+
+    stems = [k.strip().lower() for k in context_keywords.split(",") if k.strip()]
+    if not stems:
+        return {}
+    return {keyword: f"SYSTEM:{command}" for keyword, command in catalog.keywords_for(context)
+            if any(stem in keyword for stem in stems)}
+
+
+def classify_intent(text, context: str = "") -> dict:
+    """키워드 기반 의도 분류 (가장 긴 키워드 우선, text: 문자열 또는 NormalizedText, context: 게임 컨텍스트)"""
+    normalized = normalize(text)
+    command, keyword = catalog_store.current.match_command(normalized, context)
+    if command:
+        # 더 긴 키워드가 매칭되면 더 높은 점수 (0.5 ~ 0.95 범위, 정규형 길이 기준)
+        return {"command": command, "confidence": min(0.95, 0.5 + len(keyword) / len(normalized.compact))}
+
+    return {"command": "Unknown", "confidence": 0.0}
+
+
+def match_skill(text, skills: list) -> tuple:
+    """키워드 기반 스킬 매칭 (카탈로그 별칭 포함, text: 문자열 또는 NormalizedText)"""
+    normalized = normalize(text)
+    compact = normalized.compact
+    if not compact:
+        return None, 0.0, []
+    candidates = []
+
+    for skill in skills:
+        skill_key = canonical(skill)
+        if not skill_key:
+            continue
+
+        # 정확히 일치
+        if skill_key == compact:
+            candidates.append({"name": skill, "confidence": 0.95})
+        # 스킬 이름이 텍스트에 포함 (어절 경계 기준)
+        elif normalized.contains(skill_key, word_breaks(skill)):
+            candidates.append({"name": skill, "confidence": 0.85})
+        # 텍스트가 스킬 이름에 포함
+        elif compact in skill_key:
+            candidates.append({"name": skill, "confidence": 0.75})
+        # 부분 일치 (첫 글자 또는 마지막 글자)
+        elif skill_key.startswith(compact[:2]) or skill_key.endswith(compact[-2:]):
+            candidates.append({"name": skill, "confidence": 0.5})
+
+    # 별칭(띄어쓰기 변형, 영어 이름, 속성별 이름 등)이 포함된 활성 스킬
+    for target in catalog_store.current.mentioned_skills(normalized):
+        if target not in skills:
+            continue
+        existing = next((c for c in candidates if c["name"] == target), None)
+        if existing is None:
+            candidates.append({"name": target, "confidence": 0.9})
+        elif existing["confidence"] < 0.9:
+            existing["confidence"] = 0.9
+
+    # 신뢰도 순으로 정렬
+    candidates.sort(key=lambda x: x["confidence"], reverse=True)
+
+    if candidates:
+        return candidates[0]["name"], candidates[0]["confidence"], candidates[:5]
+
+    return None, 0.0, []
+
+
+def resolve_text(text, skills: list, context: str = "") -> dict:
+    """/recognize 판정 로직: 시스템 명령 우선, 아니면 스킬 매칭 (text: 문자열 또는 NormalizedText)
+
+    context: 게임 컨텍스트 (같은 말이 화면에 따라 다른 명령일 때 컨텍스트별 키워드 우선)
+    """
+    text = normalize(text)
+    system_result = classify_intent(text, context)
+
+    # 시스템 명령이 감지되면 (Unknown이 아니고 신뢰도가 0.5 이상)
+    if system_result["command"] != "Unknown" and system_result["confidence"] >= 0.5:
+        name = f"SYSTEM:{system_result['command']}"
+        return {
+            "matched_skill": name,
+            "confidence": system_result["confidence"],
+            "candidates": [{"name": name, "confidence": system_result["confidence"]}],
+            "is_system_command": True
+        }
+
+    # 시스템 명령이 아니면 스킬 매칭
+    matched_skill, confidence, candidates = match_skill(text, skills)
+    return {
+        "matched_skill": matched_skill,
+        "confidence": confidence,
+        "candidates": candidates,
+        "is_system_command": False
+    }
+
+
+def resolve_sequence(text, skills: list, context: str = "") -> list:
+    """한 발화의 여러 명령/스킬을 발화 순서대로 (인게임 플레이 중에는 이동 명령과 스킬만)"""
+    commands = KWS_COMMANDS if context == "InGame_Playing" else None
+    return segment_commands(text, catalog_store.current, skills, commands, context)
@@ -0,0 +1,381 @@
+"""
+오프라인 인식 파이프라인 (HTTP 없이 import 해서 쓰는 라이브러리)
+- 단계: decode(오디오 → 16kHz 모노) → vad(앞뒤 무음 제거, 선택) → asr(로컬 Whisper)
+        → normalize(전사 정규화) → resolve(시스템 명령 분류 → 스킬 매칭, 연속 명령 목록)
+- 서버(/recognize, IPC)는 요청 제한/스케줄링/캡처만 하고 recognize() 를 호출
+- 평가/부하/배치 작업은 recognize_batch() 로 클립 목록을 직접 처리 (HTTP, JSON, 임시 WAV 없음,
+  log-mel 특징은 배치 전체를 한 번에 계산)
+- 모델은 처음 필요할 때 로드 (서버는 engine.start_background 로 미리 로드 + 워밍업)
+
+사용 예:
+    from pipeline import RecognitionPipeline
+    pipeline = RecognitionPipeline(model_size="base")
+    result = pipeline.recognize("jump.wav", skills=["매직 미사일"], context="InGame_Playing")
+    results = pipeline.recognize_batch(["a.wav", "b.wav"], skills=["매직 미사일"])
+"""
+
+import contextlib
+import math
+import os
+import tempfile
+import time
+import wave
+
+from voice_common.audio import load_wav_16k, trim_silence
+from voice_common.features import take_feature_seconds
+from voice_common.local_whisper import LocalWhisperEngine, load_audio
+from voice_common.nbest import rescore
+from voice_common.normalize import normalize
+from voice_common.scheduler import PRIORITY_BACKGROUND
+from commands import build_spotter, grammar_phrases, resolve_sequence, resolve_text
+
+
+def failure(error: str, processing_time: float = 0.0, **extra) -> dict:
+    """인식 실패 응답 (/recognize 와 같은 필드)"""
+    return {
+        "success": False,
+        "text": "",
+        "matched_skill": None,
+        "confidence": 0.0,
+        "candidates": [],
+        "processing_time": processing_time,
+        **extra,
+        "error": error
+    }
+
+
+class RecognitionPipeline:
+    """로컬 Whisper 인식 파이프라인
+
+    engine: 이미 만든 LocalWhisperEngine (없으면 model_size 로 생성, 처음 사용할 때 로드)
+    early_exit: 부분 전사에 명령/스킬이 확정되면 디코딩 중단
+    early_exit_full_transcript + scheduler: 조기 종료된 클립의 전체 전사를 scheduler 의 background 작업으로
+        예약해 로그로 남김 (대기 중인 작업이 full_transcript_queue개 이상이면 버림, scheduler 가 없으면 기록 안 함)
+    short_context: 클립 길이에 맞는 구간만 인코딩
+    nbest_size > 0: 빔 서치 가설 N개를 활성 문법으로 재채점 (nbest_weight, nbest_max_gap)
+    grammar_decode: 닫힌 구문 집합이 있는 화면에서 허용 구문만 디코딩 (grammar_min_logprob 미만이면 일반 디코딩)
+    cascade_engine + cascade: 작은 모델로 먼저 디코딩하고 CascadeGate 기준 미달이면 engine 으로 다시 디코딩
+    vad: ASR 전에 앞뒤 무음 제거 (짧은 클립 모드와 함께 쓰면 인코딩 구간도 짧아짐)
+    profiler: voice_common.profiling.Profiler (관리자 프로파일 세션 중 torch 연산자 수집)
+    """
+
+    def __init__(self, engine: LocalWhisperEngine = None, model_size: str = "base", weight_store_dir: str = "",
+                 early_exit: bool = True, early_exit_full_transcript: bool = False, short_context: bool = False,
+                 nbest_size: int = 0, nbest_weight: float = 1.0, nbest_max_gap: float = 1.0,
+                 grammar_decode: bool = False, grammar_min_logprob: float = -0.7,
+                 cascade_engine: LocalWhisperEngine = None, cascade=None, vad: bool = False, profiler=None,
+                 scheduler=None, full_transcript_queue: int = 1):
+        self.engine = engine or LocalWhisperEngine(model_size, weight_store_dir=weight_store_dir)
+        self.early_exit = early_exit
+        self.early_exit_full_transcript = early_exit_full_transcript
+        self.short_context = short_context
+        self.nbest_size = nbest_size
+        self.nbest_weight = nbest_weight
+        self.nbest_max_gap = nbest_max_gap
+        self.grammar_decode = grammar_decode
+        self.grammar_min_logprob = grammar_min_logprob
+        self.cascade_engine = cascade_engine if cascade is not None else None
+        self.cascade = cascade if cascade_engine is not None else None
+        self.vad = vad
+        self.profiler = profiler
+        self.scheduler = scheduler
+        self.full_transcript_queue = full_transcript_queue
+
+    # ---- 모델 ----
+
+    def ensure_loaded(self):
+        """엔진이 아직 로드되지 않았으면 지금 로드 (워밍업 없이), 백그라운드 로드 중이면 그대로 둠"""
+        for engine in (self.engine, self.cascade_engine):
+            if engine is not None:
+                engine.ensure_loaded()
+        return self
+
+    def _full_transcript_hook(self, language: str):
+        """조기 종료 시 전체 전사 기록을 예약하는 콜백 (꺼져 있으면 None)"""
+        if not self.early_exit_full_transcript or self.scheduler is None:
+            return None
+
+        def schedule(audio):
+            self.scheduler.offer(
+                lambda cancel_event: self.engine.log_full_transcript(audio, language, cancel_event=cancel_event),
+                priority=PRIORITY_BACKGROUND, max_queued=self.full_transcript_queue
+            )
+        return schedule
+
+    def _scope(self):
+        return self.profiler.torch_scope("transcribe") if self.profiler else contextlib.nullcontext()
+
+    # ---- 단계 ----
+
+    @staticmethod
+    def decode(audio):
+        """오디오 → 16kHz 모노 float32 샘플
+
+        audio: 샘플 배열(그대로), WAV 바이트(파싱만, 임시 파일 없음), 그 외 바이트/파일 경로(ffmpeg)
+        """
+        if isinstance(audio, str):
+            return load_audio(audio)
+        if not isinstance(audio, (bytes, bytearray)):
+            return audio
+        try:
+            return load_wav_16k(bytes(audio))
+        except (wave.Error, EOFError, ValueError):
+            pass
+        # WAV 가 아닌 업로드 (ogg, mp3 등)는 ffmpeg 로 디코딩
+        with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as f:
+            f.write(audio)
+            temp_path = f.name
+        try:
+            return load_audio(temp_path)
+        finally:
+            os.unlink(temp_path)
+
+    def trim(self, samples):
+        """vad 가 켜져 있으면 앞뒤 무음 제거"""
+        return trim_silence(samples) if self.vad and len(samples) else samples
+
+    def transcribe_text(self, audio, language: str = "ko", spotter=None, cancel_event=None) -> str:
+        """기본 음성 인식 (spotter가 있으면 명령 확정 시 조기 종료)"""
+        self.ensure_loaded()
+        try:
+            with self._scope():
+                if (spotter and self.early_exit) or self.short_context:
+                    text, _ = self.engine.transcribe_until(
+                        audio, spotter.match if spotter and self.early_exit else None, language=language,
+                        on_early_exit=self._full_transcript_hook(language), cancel_event=cancel_event,
+                        short_context=self.short_context
+                    )
+                    return text
+                return self.engine.transcribe(audio, language=language)
+        except Exception as e:
+            print(f"Whisper 로컬 오류: {e}")
+            raise e
+
+    def transcribe_nbest(self, audio, language: str = "ko", cancel_event=None) -> list:
+        """빔 서치로 가설 nbest_size개 (디코더 순위 순)"""
+        self.ensure_loaded()
+        try:
+            with self._scope():
+                return self.engine.transcribe_nbest(
+                    audio, self.nbest_size, language=language, cancel_event=cancel_event,
+                    short_context=self.short_context
+                )
+        except Exception as e:
+            print(f"Whisper 로컬 오류: {e}")
+            raise e
+
+    def transcribe_grammar(self, audio, phrases: dict, language: str = "ko", spotter=None,
+                           cancel_event=None) -> tuple:
+        """문법 제한 디코딩 → (텍스트, 문법 결과), 기준 미달이면 일반 음성 인식 → (텍스트, None)"""
+        self.ensure_loaded()
+        try:
+            with self._scope():
+                result = self.engine.transcribe_grammar(
+                    audio, phrases, language=language, cancel_event=cancel_event, short_context=self.short_context
+                )
+        except Exception as e:
+            print(f"Whisper 로컬 오류: {e}")
+            raise e
+
+        if result and result["target"] and result["raw_avg_logprob"] >= self.grammar_min_logprob:
+            print(f"[Grammar] '{result['text']}' → {result['target']} "
+                  f"(logprob {result['raw_avg_logprob']:.2f}, {result['steps']} steps)")
+            return result["text"], result
+        if cancel_event is not None and cancel_event.is_set():
+            return "", None
+        if result:
+            print(f"[Grammar] '{result['text']}' 기준 미달 (logprob {result['raw_avg_logprob']:.2f}), 일반 디코딩")
+        return self.transcribe_text(audio, language, spotter, cancel_event), None
+
+    def transcribe_cascade(self, audio, language: str = "ko", spotter=None, skills: list = (),
+                           cancel_event=None, context: str = "") -> str:
+        """작은 모델로 먼저 디코딩, 기준 미달이면 같은 작업 안에서 기본 모델로 다시 디코딩"""
+        self.ensure_loaded()
+        if not self.cascade_engine.ready:
+            return self.transcribe_text(audio, language, spotter, cancel_event)
+
+        cascade = self.cascade
+        first_start = time.perf_counter()
+        if len(audio) > 30 * 16000:
+            decoded, reason = None, "long_audio"
+        else:
+            try:
+                with self._scope():
+                    decoded = self.cascade_engine.decode_once(
+                        audio, spotter.match if spotter and self.early_exit else None, language,
+                        cancel_event=cancel_event, short_context=self.short_context
+                    )
+            except Exception as e:
+                print(f"Whisper 로컬 오류 ({cascade.first_model}): {e}")
+                raise e
+            if decoded["cancelled"]:
+                return ""
+            if cascade.is_silence(decoded):
+                cascade.record(None, time.perf_counter() - first_start)
+                return ""
+            reason = cascade.decide(decoded, resolve_text(decoded["text"], list(skills), context))
+        first_latency = time.perf_counter() - first_start
+
+        if reason is None:
+            cascade.record(None, first_latency)
+            return decoded["text"]
+
+        print(f"[Cascade] {cascade.first_model} → {cascade.second_model} ({reason}): "
+              f"'{decoded['text'] if decoded else ''}'")
+        second_start = time.perf_counter()
+        text = self.transcribe_text(audio, language, spotter, cancel_event)
+        cascade.record(reason, first_latency, time.perf_counter() - second_start)
+        return text
+
+    def transcribe(self, samples, language: str = "ko", skills: list = (), context: str = "",
+                   context_keywords: str = "", multi: bool = False, cancel_event=None, spotter=None) -> dict:
+        """설정된 ASR 경로로 음성 인식 → {"text", "grammar", "nbest"}
+
+        우선순위: 문법 제한 디코딩(닫힌 구문 집합이 있을 때) > N-best > 모델 캐스케이드 > 기본(조기 종료)
+        spotter: 미리 만든 조기 종료 판정기 (배치에서 재사용, 없으면 skills 로 생성)
+        multi: 연속 명령 발화. 조기 종료와 문법 제한 디코딩(구문 하나만 허용)을 쓰지 않음
+        """
+        skills = list(skills)
+        if multi:
+            spotter = None
+        elif spotter is None:
+            spotter = build_spotter(tuple(skills), context)
+        phrases = grammar_phrases(context, context_keywords, tuple(skills)) if self.grammar_decode and not multi else {}
+
+        if phrases:
+            text, grammar = self.transcribe_grammar(samples, phrases, language, spotter, cancel_event)
+            return {"text": text, "grammar": grammar, "nbest": None}
+        if self.nbest_size > 0:
+            hypotheses = self.transcribe_nbest(samples, language, cancel_event)
+            return {"text": hypotheses[0]["text"] if hypotheses else "", "grammar": None, "nbest": hypotheses}
+        if self.cascade is not None:
+            text = self.transcribe_cascade(samples, language, spotter, skills, cancel_event, context)
+            return {"text": text, "grammar": None, "nbest": None}
+        return {"text": self.transcribe_text(samples, language, spotter, cancel_event), "grammar": None, "nbest": None}
+
+    def resolve(self, transcript: dict, skills: list = (), context: str = "") -> dict:
+        """전사 → 판정 (시스템 명령 우선, 아니면 스킬 매칭) + 발화 순서의 명령/스킬 목록
+
+        문법 디코딩이 통과하면 구문의 대상이 곧 판정, N-best면 문법에 맞는 가설을 다시 골라 판정
+        """
+        skills = list(skills)
+        extra = {}
+        grammar = transcript.get("grammar")
+        hypotheses = transcript.get("nbest")
+        if grammar:
+            text = transcript["text"]
+            target = grammar["target"]
+            confidence = min(0.95, math.exp(grammar["raw_avg_logprob"]))
+            resolved = {
+                "matched_skill": target,
+                "confidence": confidence,
+                "candidates": [{"name": target, "confidence": confidence}],
+                "is_system_command": target.startswith("SYSTEM:")
+            }
+            extra = {"grammar": True}
+        elif hypotheses is not None:
+            rescored = rescore(
+                hypotheses, lambda hypothesis: resolve_text(hypothesis, skills, context), self.nbest_weight, self.nbest_max_gap
+            )
+            text, resolved = rescored["text"], rescored["resolved"]
+            extra = {"nbest_rank": rescored["rank"], "nbest": rescored["hypotheses"]}
+            if rescored["rank"] > 0:
+                print(f"[N-best] '{hypotheses[0]['text']}' → {rescored['rank'] + 1}위 가설 선택")
+        else:
+            text = transcript["text"]
+            resolved = resolve_text(normalize(text), skills, context)
+        return {"text": text, **resolved, "sequence": resolve_sequence(normalize(text), skills, context), **extra}
+
+    # ---- 전체 ----
+
+    def load(self, audio, timings: dict) -> tuple:
+        """오디오 → ASR 입력 샘플 (decode, vad 단계), timings 에 단계별 소요 시간(초) 기록"""
+        stage_start = time.perf_counter()
+        samples = self.decode(audio)
+        timings["decode"] = time.perf_counter() - stage_start
+        if self.vad:
+            stage_start = time.perf_counter()
+            samples = self.trim(samples)
+            timings["vad"] = time.perf_counter() - stage_start
+        return samples
+
+    def recognize(self, audio, language: str = "ko", skills: list = (), context: str = "",
+                  context_keywords: str = "", multi: bool = False, cancel_event=None, timings: dict = None,
+                  spotter=None) -> dict:
+        """오디오 하나 → /recognize 응답과 같은 결과 (동기, 호출 스레드에서 추론)
+
+        timings: 주어지면 단계별 소요 시간(초) 기록 (decode, vad, asr, features, resolve)
+        예외는 호출 측으로 전달 (서버는 실패 응답으로 변환)
+        """
+        start_time = time.time()
+        timings = timings if timings is not None else {}
+        samples = self.load(audio, timings)
+        return self._recognize_samples(samples, language, skills, context, context_keywords, multi, cancel_event,
+                                       timings, spotter, start_time)
+
+    def _recognize_samples(self, samples, language: str, skills: list, context: str, context_keywords: str,
+                           multi: bool, cancel_event, timings: dict, spotter, start_time: float) -> dict:
+        """ASR 입력 샘플 → 결과 (asr, features, resolve 단계)"""
+        take_feature_seconds()
+        stage_start = time.perf_counter()
+        transcript = self.transcribe(samples, language, skills, context, context_keywords, multi, cancel_event,
+                                     spotter)
+        timings["asr"] = time.perf_counter() - stage_start
+        timings["features"] = take_feature_seconds()
+
+        stage_start = time.perf_counter()
+        result = self.resolve(transcript, skills, context)
+        timings["resolve"] = time.perf_counter() - stage_start
+        return {"success": True, **result, "processing_time": time.time() - start_time}
+
+    def _feature_engine(self, context: str, context_keywords: str, skills: list, multi: bool):
+        """transcribe() 가 처음 인코딩할 엔진 (자체 log-mel 을 쓰지 않는 whisper transcribe() 경로면 None)"""
+        if self.grammar_decode and not multi and grammar_phrases(context, context_keywords, tuple(skills)):
+            return self.engine
+        if self.nbest_size > 0:
+            return self.engine
+        if self.cascade is not None:
+            return self.cascade_engine if self.cascade_engine.ready else None
+        if (self.early_exit and not multi) or self.short_context:
+            return self.engine
+        return None
+
+    def recognize_batch(self, clips: list, language: str = "ko", skills: list = (), context: str = "",
+                        context_keywords: str = "", multi: bool = False, timings: list = None) -> list:
+        """같은 요청 조건의 클립 여러 개를 인식 (평가/배치 작업용)
+
+        모든 클립을 먼저 decode/vad 한 뒤 log-mel 특징을 인코딩 구간별로 한 번에 계산하고, 디코딩은 클립별로 순서대로
+        조기 종료 판정기와 문법 구문 트라이는 배치 전체에서 한 번만 만들어 재사용
+        클립 하나가 실패하면 그 클립만 실패 결과, timings: 주어지면 클립별 단계 시간 dict 를 추가
+        """
+        self.ensure_loaded()
+        spotter = None if multi else build_spotter(tuple(skills), context)
+        clip_timings = [{} for _ in clips]
+        loaded = []
+        for clip, stages in zip(clips, clip_timings):
+            try:
+                loaded.append(self.load(clip, stages))
+            except Exception as e:
+                loaded.append(e)
+
+        engine = self._feature_engine(context, context_keywords, skills, multi)
+        ready = [samples for samples in loaded if not isinstance(samples, Exception) and len(samples)]
+        prepared = engine.prepare_features(ready, self.short_context) if engine and ready else contextlib.nullcontext()
+
+        results = []
+        with prepared:
+            for samples, stages in zip(loaded, clip_timings):
+                # 처리 시간: 이 클립의 decode/vad + 인식 (배치 특징 계산 몫은 features 에 포함)
+                start_time = time.time() - stages.get("decode", 0.0) - stages.get("vad", 0.0)
+                if isinstance(samples, Exception):
+                    results.append(failure(str(samples), time.time() - start_time))
+                    continue
+                try:
+                    results.append(self._recognize_samples(
+                        samples, language, skills, context, context_keywords, multi, None, stages, spotter, start_time
+                    ))
+                except Exception as e:
+                    results.append(failure(str(e), time.time() - start_time))
+        if timings is not None:
+            timings.extend(clip_timings)
+        return results
@@ -6,23 +6,35 @@
 """
 
 import os
+import sys
+import hmac
 import base64
-import tempfile
 import json
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+import math
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request, Header, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
+from typing import Optional
 import time
-import warnings
-
-# Whisper 경고 숨기기
-warnings.filterwarnings("ignore", category=UserWarning)
-warnings.filterwarnings("ignore", category=FutureWarning)
-
-# 로컬 Whisper 모델 로드
-print("Loading local Whisper model...")
-import whisper
 
+# 공용 모듈(Server/voice_common) 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voice_common.local_whisper import DECODE_PROFILES, LocalWhisperEngine
+from voice_common.cascade import CascadeGate
+from voice_common.scheduler import (
+    InferenceScheduler, RequestShed, RequestCancelled, priority_for_context, PRIORITY_BACKGROUND
+)
+from voice_common.profiling import Profiler, PROFILE_KINDS
+from voice_common.shadow import ShadowRecorder, ShadowSkipped
+from voice_common.rate_limit import ClientRateLimiter, client_key, parse_trusted_proxies
+from voice_common.engine_router import wav_duration
+from voice_common.capture import TrafficRecorder
+from voice_common.ipc import UnixSocketServer
+from commands import build_spotter, catalog_store, classify_intent, resolve_text
+from pipeline import RecognitionPipeline, failure
+
+# 로컬 Whisper 모델 (서버 시작 후 백그라운드에서 로드 + 워밍업, 상태는 /ready 로 확인)
 # 모델 크기 선택 (tiny, base, small, medium, large)
 # tiny: 가장 빠름, 정확도 낮음 (~39MB)
 # base: 빠름, 적당한 정확도 (~74MB)
@@ -31,9 +43,121 @@ import whisper
 # large: 가장 느림, 최고 정확도 (~1.5GB)
 MODEL_SIZE = os.getenv("WHISPER_MODEL", "base")
 
-print(f"Loading Whisper model: {MODEL_SIZE}")
-whisper_model = whisper.load_model(MODEL_SIZE)
-print(f"Whisper model '{MODEL_SIZE}' loaded successfully!")
+# WEIGHT_STORE_DIR: tools/export_weights.py 로 내보낸 mmap 가중치 저장소 디렉터리
+# 모델 크기별 저장소가 있으면 체크포인트 역직렬화 대신 mmap (거의 즉시 로드, 같은 호스트의 프로세스 간 페이지 공유)
+WEIGHT_STORE_DIR = os.getenv("WEIGHT_STORE_DIR", "")
+
+local_engine = LocalWhisperEngine(MODEL_SIZE, weight_store_dir=WEIGHT_STORE_DIR)
+
+# WARMUP=0 이면 합성 오디오 워밍업 추론 생략 (로드 직후 ready)
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+# 조기 종료: 부분 전사에 명령/스킬이 확정되면 디코딩을 멈추고 바로 응답
+# EARLY_EXIT_FULL_TRANSCRIPT=1 이면 전체 전사를 가장 낮은 우선순위 작업으로 마저 수행해 로그로 남김 (디버깅용)
+# 스케줄러를 거치므로 플레이어 요청보다 먼저 실행되지 않고, 대기 중인 전체 전사가
+# FULL_TRANSCRIPT_QUEUE개 이상이면 새 작업은 버림
+EARLY_EXIT = os.getenv("EARLY_EXIT", "1") == "1"
+EARLY_EXIT_FULL_TRANSCRIPT = os.getenv("EARLY_EXIT_FULL_TRANSCRIPT", "0") == "1"
+FULL_TRANSCRIPT_QUEUE = int(os.getenv("FULL_TRANSCRIPT_QUEUE", "1"))
+
+# 짧은 클립 모드: 30초 창 대신 클립 길이에 맞는 구간(2/4/8/15초)만 인코딩
+# 켜기 전에 tools/evaluate.py --profiles full_ctx,short_ctx 로 전사 일치율 확인 권장
+SHORT_CONTEXT = os.getenv("SHORT_CONTEXT", "0") == "1"
+
+# N-best 재채점: NBEST_SIZE > 0 이면 /recognize 는 빔 서치로 가설 N개를 디코딩하고
+# 활성 문법(시스템 명령 + 요청 스킬)에 맞는 가설을 음향 점수와 함께 다시 골라 판정 (조기 종료 대신 사용)
+# NBEST_WEIGHT: 1위 대비 avg_logprob 손실 가중치, NBEST_MAX_GAP: 이보다 손실이 큰 가설은 제외
+NBEST_SIZE = int(os.getenv("NBEST_SIZE", "0"))
+NBEST_WEIGHT = float(os.getenv("NBEST_WEIGHT", "1.0"))
+NBEST_MAX_GAP = float(os.getenv("NBEST_MAX_GAP", "1.0"))
+
+# 문법 제한 디코딩: GRAMMAR_DECODE=1 이면 닫힌 구문 집합이 있는 화면(context_keywords가 있는 메뉴,
+# 스킬이 있는 InGame_Playing)에서 허용 구문만 출력하도록 디코딩 (분류 단계 없이 구문 → 대상)
+# 제한 전 분포 기준 평균 logprob가 GRAMMAR_MIN_LOGPROB 미만이면 같은 작업 안에서 일반 디코딩으로 폴백
+GRAMMAR_DECODE = os.getenv("GRAMMAR_DECODE", "0") == "1"
+GRAMMAR_MIN_LOGPROB = float(os.getenv("GRAMMAR_MIN_LOGPROB", "-0.7"))
+
+# 모델 캐스케이드: CASCADE_MODEL(예: tiny)을 지정하면 /recognize 클립을 그 모델로 먼저 디코딩하고
+# avg_logprob < CASCADE_MIN_LOGPROB, 명령/스킬 미매칭, 판정 신뢰도 < CASCADE_MIN_CONFIDENCE 이면
+# WHISPER_MODEL 로 다시 디코딩 (승격률은 /cascade)
+CASCADE_MODEL = os.getenv("CASCADE_MODEL", "")
+cascade_engine = None
+cascade = None
+if CASCADE_MODEL and CASCADE_MODEL != MODEL_SIZE:
+    cascade_engine = LocalWhisperEngine(CASCADE_MODEL, weight_store_dir=WEIGHT_STORE_DIR)
+    cascade = CascadeGate(
+        CASCADE_MODEL, MODEL_SIZE,
+        min_logprob=float(os.getenv("CASCADE_MIN_LOGPROB", "-0.6")),
+        min_confidence=float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.7"))
+    )
+
+# 추론 스케줄러: 컨텍스트별 우선순위 + 마감 시간 + 연결 종료 시 취소
+# 클라이언트는 X-Deadline-Ms 헤더 또는 deadline_ms 폼 필드로 마감(ms)을 보낼 수 있음
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+scheduler = InferenceScheduler(workers=INFERENCE_WORKERS)
+
+# 관리자 프로파일링 엔드포인트 (/admin/profile/*): ADMIN_TOKEN 을 설정해야 활성화
+# 요청 시 X-Admin-Token 헤더 필요, 결과는 PROFILE_DIR 에 저장
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+profiler = Profiler(os.getenv("PROFILE_DIR", "profiles"))
+
+# 인식 파이프라인 (decode → ASR → 정규화 → 명령/스킬 판정, pipeline.py), 라우트는 요청 제한/스케줄링만 담당
+pipeline = RecognitionPipeline(
+    local_engine,
+    early_exit=EARLY_EXIT, early_exit_full_transcript=EARLY_EXIT_FULL_TRANSCRIPT, short_context=SHORT_CONTEXT,
+    nbest_size=NBEST_SIZE, nbest_weight=NBEST_WEIGHT, nbest_max_gap=NBEST_MAX_GAP,
+    grammar_decode=GRAMMAR_DECODE, grammar_min_logprob=GRAMMAR_MIN_LOGPROB,
+    cascade_engine=cascade_engine, cascade=cascade, profiler=profiler,
+    scheduler=scheduler, full_transcript_queue=FULL_TRANSCRIPT_QUEUE
+)
+
+# 클라이언트별 요청 제한 (접속 IP 기준 토큰 버킷)
+# TRUSTED_PROXIES: 쉼표로 구분한 리버스 프록시 주소. 이 주소에서 온 요청만 X-Client-Id / X-Forwarded-For 를 믿음
+TRUSTED_PROXIES = parse_trusted_proxies(os.getenv("TRUSTED_PROXIES", ""))
+# RATE_LIMIT_ASR_BURST: 한 번에 쓸 수 있는 오디오 초 (0이면 제한 없음)
+# RATE_LIMIT_ASR_RATE: 초당 다시 채워지는 오디오 초
+asr_limiter = ClientRateLimiter(
+    "asr_seconds",
+    capacity=float(os.getenv("RATE_LIMIT_ASR_BURST", "0")),
+    refill_rate=float(os.getenv("RATE_LIMIT_ASR_RATE", "0.5"))
+)
+
+# 명령/스킬 카탈로그 파일 변경 감지 주기(초), 0이면 감시 안 함 (POST /catalog/reload 로 수동 재로드)
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "2"))
+
+# 섀도 모드: /recognize 요청 중 SHADOW_SAMPLE_RATE 비율을 응답 후 다른 설정으로 한 번 더 처리해 비교 기록
+# SHADOW_MODEL: 다른 모델 크기 (비우면 같은 모델), SHADOW_PROFILE: 디코딩 설정 (local_whisper.DECODE_PROFILES)
+# 섀도 작업은 가장 낮은 우선순위로 스케줄링되고 SHADOW_DEADLINE 초 안에 시작하지 못하면 버림
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+SHADOW_MODEL = os.getenv("SHADOW_MODEL", "") or MODEL_SIZE
+SHADOW_PROFILE = os.getenv("SHADOW_PROFILE", "greedy")
+SHADOW_DEADLINE = float(os.getenv("SHADOW_DEADLINE", "10"))
+if SHADOW_PROFILE not in DECODE_PROFILES:
+    raise ValueError(f"SHADOW_PROFILE must be one of {', '.join(DECODE_PROFILES)}")
+
+shadow_engine = local_engine
+if SHADOW_SAMPLE_RATE > 0 and SHADOW_MODEL != MODEL_SIZE:
+    shadow_engine = LocalWhisperEngine(SHADOW_MODEL, weight_store_dir=WEIGHT_STORE_DIR)
+
+PRIMARY_PROFILE = {
+    (True, True): "early_exit_short", (True, False): "early_exit", (False, True): "short_ctx", (False, False): "greedy"
+}[(EARLY_EXIT, SHORT_CONTEXT)]
+shadow = ShadowRecorder(
+    f"{MODEL_SIZE}/{PRIMARY_PROFILE}", f"{SHADOW_MODEL}/{SHADOW_PROFILE}",
+    sample_rate=SHADOW_SAMPLE_RATE, log_path=os.getenv("SHADOW_LOG", "shadow_log.jsonl")
+)
+
+# 트래픽 캡처: /recognize 요청 중 CAPTURE_SAMPLE_RATE 비율을 오디오/필드/도착 시각/단계별 시간과 함께 기록
+# CAPTURE_DIR 에 CAPTURE_CAPACITY 개 슬롯을 돌려 씀 (가장 오래된 것부터 덮어씀), 재생은 tools/replay.py
+capture = TrafficRecorder(
+    os.getenv("CAPTURE_DIR", "captures"),
+    sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "0")),
+    capacity=int(os.getenv("CAPTURE_CAPACITY", "500"))
+)
+
+# 로컬 IPC: IPC_SOCKET 경로를 지정하면 Unix 도메인 소켓으로도 /recognize 요청을 받음 (Linux, 같은 호스트의 게임용)
+# HTTP/멀티파트/임시 WAV 없이 PCM 을 그대로 전달 (프로토콜은 voice_common/ipc.py)
+IPC_SOCKET = os.getenv("IPC_SOCKET", "")
 
 app = FastAPI(title="Voice Command Server (Offline)", version="1.0.0")
 
@@ -49,6 +173,47 @@ app.add_middleware(
 print("Voice Command Server (Offline) initialized!")
 
 
+@app.on_event("startup")
+async def load_model_in_background():
+    """포트를 먼저 열고 모델 로드/워밍업은 백그라운드 스레드에서 진행"""
+    local_engine.start_background(warmup=WARMUP)
+    if shadow_engine is not local_engine:
+        shadow_engine.start_background(warmup=WARMUP)
+    if cascade_engine is not None:
+        cascade_engine.start_background(warmup=WARMUP)
+    catalog_store.start_watching(CATALOG_RELOAD_INTERVAL)
+    if ipc_server is not None:
+        try:
+            await ipc_server.start()
+        except Exception as e:
+            print(f"[IPC] Unix 소켓을 열 수 없음 ({IPC_SOCKET}): {e}")
+
+
+@app.on_event("shutdown")
+async def stop_ipc_server():
+    if ipc_server is not None:
+        await ipc_server.stop()
+
+# 프로파일링 세션의 요청 수 집계 대상
+PROFILED_PATHS = ("/recognize", "/voice_command", "/transcribe")
+
+
+@app.middleware("http")
+async def count_profiled_requests(request: Request, call_next):
+    response = await call_next(request)
+    if profiler.active and request.url.path in PROFILED_PATHS:
+        profiler.request_finished()
+    return response
+
+
+def require_admin(x_admin_token: str = Header("")):
+    """관리자 토큰 확인 (ADMIN_TOKEN 미설정 시 엔드포인트 비활성화)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="admin endpoints disabled")
+    if not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+
 class AudioRequest(BaseModel):
     audioData: str  # Base64 인코딩된 WAV 데이터
 
@@ -59,247 +224,67 @@ class CommandResponse(BaseModel):
     confidence: float  # 신뢰도
 
 
-# 사용 가능한 함수 정의
-AVAILABLE_FUNCTIONS = [
-    {
-        "name": "OpenSettings",
-        "description": "설정창, 옵션창을 엽니다",
-        "keywords": ["설정", "옵션", "세팅", "settings", "options"]
-    },
-    {
-        "name": "CloseSettings",
-        "description": "설정창을 닫고 인게임으로 돌아갑니다",
-        "keywords": ["설정 닫", "옵션 닫", "설정창 닫", "close settings"]
-    },
-    {
-        "name": "OpenMenu",
-        "description": "게임 메뉴를 엽니다",
-        "keywords": ["메뉴", "menu"]
-    },
-    {
-        "name": "CloseMenu",
-        "description": "게임 메뉴를 닫습니다",
-        "keywords": ["메뉴 닫", "close menu"]
-    },
-    {
-        "name": "PauseGame",
-        "description": "게임을 일시정지합니다",
-        "keywords": ["일시정지", "멈춰", "정지", "퍼즈", "pause", "stop"]
-    },
-    {
-        "name": "ResumeGame",
-        "description": "일시정지된 게임을 재개합니다",
-        "keywords": ["계속", "재개", "플레이", "resume", "continue"]
-    },
-    {
-        "name": "RestartGame",
-        "description": "게임을 재시작합니다",
-        "keywords": ["재시작", "다시 시작", "리스타트", "재도전", "다시", "restart"]
-    },
-    {
-        "name": "QuitToMainMenu",
-        "description": "메인 메뉴로 나갑니다",
-        "keywords": ["나가기", "종료", "quit", "exit"]
-    },
-    {
-        "name": "OpenInventory",
-        "description": "인벤토리/가방을 엽니다",
-        "keywords": ["인벤토리", "가방", "아이템", "소지품", "inventory"]
-    },
-    {
-        "name": "CloseInventory",
-        "description": "인벤토리를 닫습니다",
-        "keywords": ["인벤토리 닫", "가방 닫", "close inventory"]
-    },
-    {
-        "name": "OpenMap",
-        "description": "지도를 엽니다",
-        "keywords": ["지도", "맵", "map"]
-    },
-    {
-        "name": "CloseMap",
-        "description": "지도를 닫습니다",
-        "keywords": ["지도 닫", "맵 닫", "close map"]
-    },
-    {
-        "name": "ShowHelp",
-        "description": "도움말을 표시합니다",
-        "keywords": ["도움말", "도와", "help"]
-    },
-    {
-        "name": "StartGame",
-        "description": "게임 모드 선택 화면으로 이동합니다",
-        "keywords": ["게임 시작", "시작", "플레이", "start", "play"]
-    },
-    {
-        "name": "SelectStoryMode",
-        "description": "스토리 모드를 선택합니다",
-        "keywords": ["스토리 모드", "스토리", "챕터 모드", "story"]
-    },
-    {
-        "name": "SelectEndlessMode",
-        "description": "무한 모드를 선택합니다",
-        "keywords": ["무한 모드", "엔드리스", "무한", "endless"]
-    },
-    {
-        "name": "StartEndless",
-        "description": "무한 모드 게임을 시작합니다",
-        "keywords": ["게임 시작", "시작해줘", "시작"]
-    },
-    {
-        "name": "GoBack",
-        "description": "이전 화면으로 돌아갑니다",
-        "keywords": ["뒤로", "뒤로가기", "이전", "취소", "back"]
-    },
-    {
-        "name": "GoToMainMenu",
-        "description": "메인 메뉴 화면으로 돌아갑니다",
-        "keywords": ["메인 메뉴", "메인으로", "main menu"]
-    },
-    {
-        "name": "GoToGameModeSelection",
-        "description": "게임 모드 선택 화면으로 돌아갑니다",
-        "keywords": ["게임 모드 선택", "모드 선택", "game mode"]
-    },
-    {
-        "name": "OpenStore",
-        "description": "상점을 엽니다",
-        "keywords": ["상점", "스토어", "store", "shop"]
-    },
-    {
-        "name": "SelectTutorial",
-        "description": "튜토리얼을 시작합니다",
-        "keywords": ["튜토리얼", "챕터 0", "챕터 영", "tutorial"]
-    },
-    {
-        "name": "SelectChapter1",
-        "description": "챕터 1을 선택합니다",
-        "keywords": ["챕터 1", "1챕터", "챕터 일", "chapter 1"]
-    },
-    {
-        "name": "SelectChapter2",
-        "description": "챕터 2를 선택합니다",
-        "keywords": ["챕터 2", "2챕터", "챕터 이", "chapter 2"]
-    },
-    {
-        "name": "SelectChapter3",
-        "description": "챕터 3을 선택합니다",
-        "keywords": ["챕터 3", "3챕터", "챕터 삼", "chapter 3"]
-    },
-    {
-        "name": "SelectChapter4",
-        "description": "챕터 4를 선택합니다",
-        "keywords": ["챕터 4", "4챕터", "챕터 사", "chapter 4"]
-    },
-    {
-        "name": "SelectChapter5",
-        "description": "챕터 5를 선택합니다",
-        "keywords": ["챕터 5", "5챕터", "챕터 오", "chapter 5"]
-    },
-    {
-        "name": "SelectChapter6",
-        "description": "챕터 6을 선택합니다",
-        "keywords": ["챕터 6", "6챕터", "챕터 육", "chapter 6"]
-    },
-    {
-        "name": "SelectChapter7",
-        "description": "챕터 7을 선택합니다",
-        "keywords": ["챕터 7", "7챕터", "챕터 칠", "chapter 7"]
-    },
-    {
-        "name": "SelectChapter8",
-        "description": "챕터 8을 선택합니다",
-        "keywords": ["챕터 8", "8챕터", "챕터 팔", "chapter 8"]
-    },
-    {
-        "name": "SelectChapter9",
-        "description": "챕터 9를 선택합니다",
-        "keywords": ["챕터 9", "9챕터", "챕터 구", "chapter 9"]
-    },
-    {
-        "name": "SelectChapter10",
-        "description": "챕터 10을 선택합니다",
-        "keywords": ["챕터 10", "10챕터", "챕터 십", "chapter 10"]
-    },
-    {
-        "name": "SelectChapter11",
-        "description": "챕터 11을 선택합니다",
-        "keywords": ["챕터 11", "11챕터", "chapter 11"]
-    },
-    {
-        "name": "SelectChapter12",
-        "description": "챕터 12를 선택합니다",
-        "keywords": ["챕터 12", "12챕터", "chapter 12"]
-    },
-]
-
-
-def transcribe_audio(audio_path: str, language: str = "ko") -> str:
-    """로컬 Whisper 모델로 음성 인식"""
-    try:
-        result = whisper_model.transcribe(
-            audio_path,
-            language=language,
-            fp16=False  # CPU에서는 False 권장
+def admit_asr(http_request: Request, audio_bytes: bytes):
+    """클라이언트 음성 인식 예산에서 오디오 길이만큼 차감, 부족하면 바로 429"""
+    allowed, retry_after = asr_limiter.try_acquire(client_key(http_request, TRUSTED_PROXIES), wav_duration(audio_bytes))
+    if not allowed:
+        raise HTTPException(
+            status_code=429, detail="ASR budget exceeded",
+            headers={"Retry-After": str(math.ceil(min(retry_after, 3600)))}
         )
-        return result["text"].strip()
-    except Exception as e:
-        print(f"Whisper 로컬 오류: {e}")
-        raise e
-
-
-def classify_intent(text: str) -> dict:
-    """키워드 기반 의도 분류"""
-    text_lower = text.lower()
-
-    best_match = None
-    best_score = 0.0
 
-    for func in AVAILABLE_FUNCTIONS:
-        for keyword in func["keywords"]:
-            if keyword.lower() in text_lower:
-                # 더 긴 키워드가 매칭되면 더 높은 점수
-                score = len(keyword) / len(text) if text else 0
-                score = min(0.95, 0.5 + score)  # 0.5 ~ 0.95 범위
 
-                if score > best_score:
-                    best_score = score
-                    best_match = func["name"]
-
-    if best_match:
-        return {"command": best_match, "confidence": best_score}
-
-    return {"command": "Unknown", "confidence": 0.0}
+def request_deadline(http_request: Request, deadline_ms: int = 0) -> Optional[float]:
+    """클라이언트가 보낸 마감 시간(초) (없으면 None → 우선순위별 기본값)"""
+    value = deadline_ms or http_request.headers.get("x-deadline-ms")
+    try:
+        return int(value) / 1000.0 if value else None
+    except ValueError:
+        return None
 
 
-def match_skill(text: str, skills: list) -> tuple:
-    """키워드 기반 스킬 매칭"""
-    text_lower = text.lower()
-    candidates = []
+async def scheduled_transcribe(http_request: Request, run, priority: int, deadline: float = None):
+    """스케줄러를 거쳐 run(cancel_event) 수행 (추론은 작업 스레드에서)
 
-    for skill in skills:
-        skill_lower = skill.lower()
+    http_request가 None이면 연결 종료 감지 안 함 (IPC)
+    마감 초과 또는 모델 준비 전이면 RequestShed, 클라이언트 연결 종료 시 RequestCancelled 발생
+    """
+    if not local_engine.ready:
+        raise RequestShed(f"model not ready ({local_engine.state})")
+    return await scheduler.submit(
+        run,
+        priority=priority,
+        deadline_seconds=deadline,
+        is_disconnected=http_request.is_disconnected if http_request is not None else None
+    )
 
-        # 정확히 일치
-        if skill_lower == text_lower:
-            candidates.append({"name": skill, "confidence": 0.95})
-        # 스킬 이름이 텍스트에 포함
-        elif skill_lower in text_lower:
-            candidates.append({"name": skill, "confidence": 0.85})
-        # 텍스트가 스킬 이름에 포함
-        elif text_lower in skill_lower:
-            candidates.append({"name": skill, "confidence": 0.75})
-        # 부분 일치 (첫 글자 또는 마지막 글자)
-        elif skill_lower.startswith(text_lower[:2]) or skill_lower.endswith(text_lower[-2:]):
-            candidates.append({"name": skill, "confidence": 0.5})
 
-    # 신뢰도 순으로 정렬
-    candidates.sort(key=lambda x: x["confidence"], reverse=True)
+async def shadow_recognize(content: bytes, language: str, skill_list: list, context: str = "") -> dict:
+    """섀도 설정으로 같은 오디오를 다시 인식 (가장 낮은 우선순위, 시작 마감 SHADOW_DEADLINE)
 
-    if candidates:
-        return candidates[0]["name"], candidates[0]["confidence"], candidates[:5]
+    선점 가능 작업으로 등록: 실행 중에 플레이어 요청이 들어오면 디코딩을 중단하고 ShadowSkipped
+    """
+    if not shadow_engine.ready:
+        raise ShadowSkipped(f"shadow model not ready ({shadow_engine.state})")
+
+    def run(cancel_event):
+        start = time.time()
+        text = shadow_engine.transcribe_profile(
+            RecognitionPipeline.decode(content), SHADOW_PROFILE, build_spotter(tuple(skill_list), context).match,
+            language=language, cancel_event=cancel_event
+        )
+        if cancel_event.is_set():
+            raise ShadowSkipped("preempted by a player request")
+        latency = time.time() - start
+        resolved = resolve_text(text, skill_list, context) if text else {"matched_skill": None, "confidence": 0.0}
+        return {"text": text, "matched": resolved["matched_skill"], "confidence": resolved["confidence"],
+                "latency": latency}
 
-    return None, 0.0, []
+    try:
+        return await scheduler.submit(run, priority=PRIORITY_BACKGROUND, deadline_seconds=SHADOW_DEADLINE,
+                                      preemptible=True)
+    except RequestShed as e:
+        raise ShadowSkipped(str(e))
 
 
 @app.get("/")
@@ -310,18 +295,76 @@ async def root():
         "message": "Voice Command Server (Offline) is running",
         "version": "offline",
         "whisper_model": MODEL_SIZE,
+        "model_state": local_engine.state,
+        "short_context": SHORT_CONTEXT,
+        "nbest_size": NBEST_SIZE,
+        "grammar_decode": GRAMMAR_DECODE,
+        "cascade_model": CASCADE_MODEL or None,
+        "ipc": ipc_server.snapshot() if ipc_server else None,
         "openai_available": False
     }
 
 
+@app.get("/ready")
+async def readiness():
+    """모델 준비 상태 (loading / warming / ready / failed), ready가 아니면 503"""
+    status = local_engine.readiness()
+    return JSONResponse(status, status_code=200 if local_engine.ready else 503)
+
+
+@app.get("/catalog")
+async def get_catalog_status():
+    """명령/스킬 카탈로그 상태 (버전, 로드 시각, 항목 수, 중복 경고)"""
+    return catalog_store.snapshot()
+
+
+@app.post("/catalog/reload")
+async def reload_catalog():
+    """카탈로그 파일 즉시 다시 로드 (모델은 그대로)"""
+    catalog_store.load()
+    return catalog_store.snapshot()
+
+
+@app.get("/shadow")
+async def get_shadow_status():
+    """섀도 모드 비교 통계 (전사/판정 일치율, 양쪽 지연 백분위수)"""
+    return shadow.snapshot()
+
+
+@app.get("/capture")
+async def get_capture_status():
+    """트래픽 캡처 상태"""
+    return capture.snapshot()
+
+
+@app.get("/cascade")
+async def get_cascade_status():
+    """모델 캐스케이드 채택/승격 통계 (캐스케이드를 쓰지 않으면 enabled=False)"""
+    if cascade is None:
+        return {"enabled": False}
+    return {"enabled": True, "first_model_state": cascade_engine.state, **cascade.snapshot()}
+
+
+@app.get("/rate_limits")
+async def get_rate_limits():
+    """클라이언트별 토큰 버킷 잔량 (잔량이 적은 순)"""
+    return {"asr_seconds": asr_limiter.snapshot()}
+
+
+@app.get("/scheduler")
+async def get_scheduler_status():
+    """추론 스케줄러 상태 (우선순위별 대기 수, 처리/버림/취소 통계)"""
+    return scheduler.snapshot()
+
+
 @app.get("/commands")
 async def get_commands():
     """사용 가능한 명령어 목록 반환"""
-    return {"commands": AVAILABLE_FUNCTIONS}
+    return {"commands": catalog_store.current.commands}
 
 
 @app.post("/voice_command", response_model=CommandResponse)
-async def process_voice_command(request: AudioRequest):
+async def process_voice_command(request: AudioRequest, http_request: Request):
     """
     음성 명령 처리
     1. Base64 디코딩 → WAV 파일
@@ -332,20 +375,20 @@ async def process_voice_command(request: AudioRequest):
     try:
         # 1. Base64 디코딩
         audio_bytes = base64.b64decode(request.audioData)
-
-        # 2. 임시 WAV 파일로 저장
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            f.write(audio_bytes)
-            temp_path = f.name
-
-        # 3. 로컬 Whisper로 음성 인식
-        print(f"Transcribing audio from: {temp_path}")
-        transcribed_text = transcribe_audio(temp_path)
+        admit_asr(http_request, audio_bytes)
+
+        # 2. 로컬 Whisper로 음성 인식 (WAV 디코딩부터 작업 스레드에서, 임시 파일 없음)
+        print(f"Transcribing audio ({len(audio_bytes)} bytes)")
+        spotter = build_spotter()
+        transcribed_text = await scheduled_transcribe(
+            http_request,
+            lambda cancel_event: pipeline.transcribe_text(
+                pipeline.decode(audio_bytes), spotter=spotter, cancel_event=cancel_event
+            ),
+            priority_for_context(""), request_deadline(http_request)
+        )
         print(f"Transcribed text: {transcribed_text}")
 
-        # 4. 임시 파일 삭제
-        os.unlink(temp_path)
-
         # 5. 텍스트가 비어있으면 Unknown
         if not transcribed_text:
             return CommandResponse(
@@ -363,104 +406,174 @@ async def process_voice_command(request: AudioRequest):
             confidence=classification["confidence"]
         )
 
+    except (RequestShed, RequestCancelled) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error processing voice command: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/transcribe")
-async def transcribe_only(request: AudioRequest):
+async def transcribe_only(request: AudioRequest, http_request: Request):
     """음성 인식만 수행 (명령 분류 없이)"""
     try:
         audio_bytes = base64.b64decode(request.audioData)
+        admit_asr(http_request, audio_bytes)
 
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            f.write(audio_bytes)
-            temp_path = f.name
-
-        transcribed_text = transcribe_audio(temp_path)
-        os.unlink(temp_path)
+        transcribed_text = await scheduled_transcribe(
+            http_request,
+            lambda cancel_event: pipeline.transcribe_text(pipeline.decode(audio_bytes), cancel_event=cancel_event),
+            PRIORITY_BACKGROUND, request_deadline(http_request)
+        )
 
         return {"text": transcribed_text}
 
+    except (RequestShed, RequestCancelled) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/recognize")
 async def recognize_skill(
+    http_request: Request,
+    background_tasks: BackgroundTasks,
     audio: UploadFile = File(...),
     language: str = Form("ko"),
     skills: str = Form(""),
     context: str = Form(""),
-    context_keywords: str = Form("")
+    context_keywords: str = Form(""),
+    deadline_ms: int = Form(0),
+    multi: bool = Form(False)
 ):
     """
     기존 Unity VoiceServerClient와 호환되는 스킬 인식 엔드포인트
     시스템 명령(설정, 메뉴 등)과 스킬 모두 인식
+    deadline_ms: 응답 마감(ms, 선택). 추론 시작 전에 지나면 요청을 버림
+    multi: 연속 명령 발화("왼쪽으로 이동 점프")용. 첫 명령에서 디코딩을 끝내지 않고 끝까지 전사
+    응답의 sequence: 발화 순서의 명령/스킬 목록 (항목별 신뢰도, 어절 범위)
+    """
+    arrival = time.time()
+    content = await audio.read()
+    admit_asr(http_request, content)
+    skill_list = [s.strip() for s in skills.split(",") if s.strip()]
+    timings = {}
+    result = await recognize_audio(
+        http_request, content, language, skill_list, context, context_keywords,
+        request_deadline(http_request, deadline_ms), timings, multi=multi
+    )
+
+    # 섀도 모드: 응답을 보낸 뒤 다른 설정으로 다시 처리해 비교 기록
+    if result["success"] and shadow.should_sample():
+        primary = {"text": result["text"], "matched": result["matched_skill"],
+                   "confidence": result["confidence"], "latency": result["processing_time"]}
+        background_tasks.add_task(
+            shadow.run, primary, lambda: shadow_recognize(content, language, skill_list, context),
+            {"context": context, "skills": skill_list}
+        )
+
+    # 트래픽 캡처: 재생 도구(tools/replay.py)로 같은 요청을 같은 간격으로 다시 보낼 수 있도록 기록
+    if capture.should_sample():
+        fields = {"language": language, "skills": skills, "context": context,
+                  "context_keywords": context_keywords, "deadline_ms": deadline_ms, "multi": multi}
+        background_tasks.add_task(
+            capture.record, arrival, fields, content, result, timings, client_key(http_request, TRUSTED_PROXIES)
+        )
+    return result
+
+
+async def recognize_audio(http_request: Request, content: bytes, language: str, skill_list: list, context: str,
+                          context_keywords: str = "", deadline: float = None, timings: dict = None,
+                          samples=None, multi: bool = False) -> dict:
+    """/recognize 처리 본문 (오디오 바이트 → 인식 결과), timings에 단계별 소요 시간(초) 기록
+
+    인식 자체는 pipeline.recognize (컨텍스트 우선순위로 스케줄링, 명령/스킬이 확정되면 조기 종료)
+    samples: 16kHz 모노 float32 샘플 (IPC), 주어지면 content 대신 사용
+    multi: 연속 명령 발화. 조기 종료와 문법 제한 디코딩(구문 하나만 허용)을 쓰지 않음
     """
     start_time = time.time()
+    timings = timings if timings is not None else {}
+    audio = samples if samples is not None else content
+    print(f"[/recognize] Language: {language}, Context: {context}, Skills: {skill_list}")
+
+    def run(cancel_event):
+        timings["queue"] = time.time() - start_time
+        return pipeline.recognize(
+            audio, language, skill_list, context, context_keywords, multi,
+            cancel_event=cancel_event, timings=timings
+        )
 
     try:
-        # 1. 오디오 파일 저장
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            content = await audio.read()
-            f.write(content)
-            temp_path = f.name
-
-        print(f"[/recognize] Audio saved, Language: {language}, Context: {context}, Skills: {skills}")
-
-        # 2. 로컬 Whisper로 음성 인식
-        transcribed_text = transcribe_audio(temp_path, language)
-        print(f"[/recognize] Transcribed: {transcribed_text}")
-
-        # 3. 임시 파일 삭제
-        os.unlink(temp_path)
-
-        # 4. 먼저 시스템 명령인지 확인
-        system_result = classify_intent(transcribed_text)
-        print(f"[/recognize] System command check: {system_result}")
-
-        # 시스템 명령이 감지되면 (Unknown이 아니고 신뢰도가 0.5 이상)
-        if system_result["command"] != "Unknown" and system_result["confidence"] >= 0.5:
-            processing_time = time.time() - start_time
-            return {
-                "success": True,
-                "text": transcribed_text,
-                "matched_skill": f"SYSTEM:{system_result['command']}",
-                "confidence": system_result["confidence"],
-                "candidates": [{"name": f"SYSTEM:{system_result['command']}", "confidence": system_result["confidence"]}],
-                "processing_time": processing_time,
-                "is_system_command": True
-            }
-
-        # 5. 시스템 명령이 아니면 스킬 매칭
-        skill_list = [s.strip() for s in skills.split(",") if s.strip()]
-        matched_skill, confidence, candidates = match_skill(transcribed_text, skill_list)
-
-        processing_time = time.time() - start_time
-
-        return {
-            "success": True,
-            "text": transcribed_text,
-            "matched_skill": matched_skill,
-            "confidence": confidence,
-            "candidates": candidates,
-            "processing_time": processing_time,
-            "is_system_command": False
-        }
-
+        result = await scheduled_transcribe(http_request, run, priority_for_context(context), deadline)
+    except (RequestShed, RequestCancelled) as e:
+        print(f"[/recognize] Shed: {e}")
+        return failure(str(e), time.time() - start_time, shed=True)
     except Exception as e:
         print(f"[/recognize] Error: {e}")
-        return {
-            "success": False,
-            "text": "",
-            "matched_skill": None,
-            "confidence": 0.0,
-            "candidates": [],
-            "processing_time": time.time() - start_time,
-            "error": str(e)
-        }
+        return failure(str(e), time.time() - start_time)
+
+    print(f"[/recognize] Transcribed: {result['text']}")
+    print(f"[/recognize] Resolved: {result['matched_skill']} ({result['confidence']:.2f})")
+    if len(result["sequence"]) > 1:
+        print(f"[/recognize] Sequence: {' → '.join(item['name'] for item in result['sequence'])}")
+    # 대기 시간을 포함한 요청 전체 시간, 단계별 시간(초)은 응답의 timings (queue, decode, vad, asr, features, resolve)
+    result["processing_time"] = time.time() - start_time
+    result["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    return result
+
+
+async def recognize_ipc(header: dict, samples) -> dict:
+    """Unix 소켓 요청 처리 (/recognize 와 같은 판정, 같은 호스트의 신뢰된 클라이언트라 요청 제한/캡처 없음)"""
+    skills = header.get("skills", "")
+    deadline_ms = int(header.get("deadline_ms") or 0)
+    return await recognize_audio(
+        None, b"", header.get("language", "ko"), [s.strip() for s in skills.split(",") if s.strip()],
+        header.get("context", ""), header.get("context_keywords", ""),
+        deadline_ms / 1000.0 if deadline_ms else None, samples=samples, multi=bool(header.get("multi"))
+    )
+
+
+ipc_server = UnixSocketServer(IPC_SOCKET, recognize_ipc) if IPC_SOCKET else None
+
+
+@app.post("/admin/profile/start", dependencies=[Depends(require_admin)])
+async def start_profile(requests: int = 20, seconds: float = 60.0, kinds: str = ",".join(PROFILE_KINDS)):
+    """프로파일링 세션 시작 (다음 requests개 요청 또는 seconds초 동안)
+
+    kinds: cpu(샘플링), torch(연산자), memory(tracemalloc) 중 쉼표 구분
+    """
+    selected = tuple(k.strip() for k in kinds.split(",") if k.strip() in PROFILE_KINDS)
+    if not selected:
+        raise HTTPException(status_code=400, detail=f"kinds must be in {PROFILE_KINDS}")
+    try:
+        return profiler.start(selected, max_requests=requests, max_seconds=seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/profile/status", dependencies=[Depends(require_admin)])
+async def profile_status():
+    """현재(또는 마지막) 프로파일링 세션 상태"""
+    return {**profiler.status(), "sessions": profiler.sessions()}
+
+
+@app.post("/admin/profile/stop", dependencies=[Depends(require_admin)])
+async def stop_profile():
+    """프로파일링 세션 즉시 종료 및 결과 저장"""
+    return profiler.stop()
+
+
+@app.get("/admin/profile/{session_id}/{name}", dependencies=[Depends(require_admin)])
+async def download_profile_artifact(session_id: str, name: str):
+    """프로파일링 결과 파일 다운로드"""
+    path = profiler.artifact_path(session_id, name)
+    if not path:
+        raise HTTPException(status_code=404, detail="artifact not found")
+    return FileResponse(path, filename=f"{session_id}_{name}")
 
 
 @app.get("/models")
@@ -482,6 +595,8 @@ async def get_models():
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"Starting Voice Command Server (Offline) on port 8000...")
+    # 같은 호스트에서 두 서버를 함께 띄울 때는 PORT로 구분
+    port = int(os.getenv("PORT", "8000"))
+    print(f"Starting Voice Command Server (Offline) on port {port}...")
     print(f"Using Whisper model: {MODEL_SIZE}")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=port)
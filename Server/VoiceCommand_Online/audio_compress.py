@@ -0,0 +1,68 @@
+"""
+Whisper API 업로드 전 오디오 압축
+- 앞뒤 무음 제거
+- 모노 다운믹스 + 16kHz 다운샘플 (Whisper 내부 처리 샘플레이트)
+- ffmpeg가 있으면 FLAC(무손실) 또는 Opus(저비트레이트)로 인코딩, 없으면 16kHz 모노 WAV
+"""
+
+import shutil
+import subprocess
+import time
+
+from voice_common.audio import TARGET_SAMPLE_RATE, encode_wav, read_wav, to_mono_16k, trim_silence
+
+# 코덱별 (ffmpeg 인자, 파일 확장자)
+CODECS = {
+    "flac": (["-c:a", "flac", "-f", "flac"], "flac"),
+    "opus": (["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"], "ogg"),
+}
+
+_ffmpeg_path = shutil.which("ffmpeg")
+
+
+def encode_with_ffmpeg(wav_bytes: bytes, codec: str) -> bytes:
+    """ffmpeg 파이프로 WAV → 압축 포맷 변환"""
+    args, _ = CODECS[codec]
+    process = subprocess.run(
+        [_ffmpeg_path, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *args, "pipe:1"],
+        input=wav_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    return process.stdout
+
+
+def prepare_upload(audio_bytes: bytes, codec: str = "flac") -> tuple:
+    """업로드용 오디오 생성
+
+    반환: (업로드 바이트, 파일 이름, 통계 dict)
+    WAV 파싱에 실패하면 원본을 그대로 반환
+    """
+    start = time.perf_counter()
+    stats = {"original_bytes": len(audio_bytes), "codec": "original"}
+
+    try:
+        samples, rate = read_wav(audio_bytes)
+        original_seconds = len(samples) / float(rate) if rate else 0.0
+        mono = trim_silence(to_mono_16k(samples, rate))
+        payload = encode_wav(mono)
+        filename, used_codec = "audio.wav", "wav"
+
+        if codec in CODECS and _ffmpeg_path:
+            try:
+                payload = encode_with_ffmpeg(payload, codec)
+                filename, used_codec = f"audio.{CODECS[codec][1]}", codec
+            except Exception as e:
+                print(f"[AudioCompress] ffmpeg {codec} 인코딩 실패, WAV 사용: {e}")
+
+        stats.update({
+            "codec": used_codec,
+            "original_seconds": round(original_seconds, 3),
+            "trimmed_seconds": round(len(mono) / float(TARGET_SAMPLE_RATE), 3)
+        })
+    except Exception as e:
+        print(f"[AudioCompress] 전처리 실패, 원본 업로드: {e}")
+        payload, filename = audio_bytes, "audio.wav"
+
+    stats["upload_bytes"] = len(payload)
+    stats["saved_bytes"] = len(audio_bytes) - len(payload)
+    stats["encode_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return payload, filename, stats
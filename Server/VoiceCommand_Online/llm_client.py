@@ -0,0 +1,174 @@
+"""
+LLM 요청 계층 (온라인 버전)
+- 메시지 순서: 시스템 프롬프트(불변, 메모이즈) → 세션 단위 정보(스킬 목록) → 발화 텍스트
+  OpenAI 프롬프트 캐싱은 공통 프리픽스가 1024 토큰 이상일 때만 적용되는데, 스킬 매칭 프롬프트는 이보다 훨씬 짧아
+  캐시되지 않음 (명령 분류 프롬프트도 카탈로그가 커야 도달). 비용 절감은 구조화 응답 + 작은 max_tokens 로 얻고,
+  실제 캐시 적중 여부는 /llm_usage 의 cached_tokens / cache_hit_ratio 로 확인
+- JSON 스키마 기반 구조화 응답 (response_format=json_schema, strict)
+- 호출별 토큰 사용량 / 지연 시간 집계
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+
+# 응답 토큰 상한 (스키마가 고정되어 있으므로 작게 유지)
+COMMAND_MAX_TOKENS = 40   # {"command": "...", "confidence": 0.9}
+SKILL_MAX_TOKENS = 160    # matched_skill + 후보 최대 3개
+
+
+@lru_cache(maxsize=8)
+def command_response_format(command_names: tuple) -> dict:
+    """명령 분류 응답 스키마 (명령어 이름 enum으로 제한)"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "command_classification",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "command": {"type": "string", "enum": list(command_names) + ["Unknown"]},
+                    "confidence": {"type": "number"}
+                },
+                "required": ["command", "confidence"],
+                "additionalProperties": False
+            }
+        }
+    }
+
+
+@lru_cache(maxsize=64)
+def skill_response_format(skill_names: tuple) -> dict:
+    """스킬 매칭 응답 스키마 (활성 스킬 이름 enum으로 제한)"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "skill_match",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "matched_skill": {"type": ["string", "null"], "enum": list(skill_names) + [None]},
+                    "confidence": {"type": "number"},
+                    "candidates": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string", "enum": list(skill_names)},
+                                "confidence": {"type": "number"}
+                            },
+                            "required": ["name", "confidence"],
+                            "additionalProperties": False
+                        }
+                    }
+                },
+                "required": ["matched_skill", "confidence", "candidates"],
+                "additionalProperties": False
+            }
+        }
+    }
+
+
+def parse_json_reply(text: str) -> dict:
+    """LLM 응답 파싱 (구조화 응답이 아닌 경우를 대비해 ``` 코드 블록도 처리)"""
+    text = text.strip()
+    if "```" in text:
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+    return json.loads(text)
+
+
+class LLMUsageStats:
+    """LLM 호출별 토큰 사용량 및 지연 시간 집계 (용도별)"""
+
+    def __init__(self, recent_size: int = 200):
+        self._lock = threading.Lock()
+        self._recent_size = recent_size
+        self._stats = {}
+
+    def _entry(self, purpose: str) -> dict:
+        if purpose not in self._stats:
+            self._stats[purpose] = {
+                "calls": 0,
+                "errors": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "completion_tokens": 0,
+                "total_latency": 0.0,
+                "recent_latencies": deque(maxlen=self._recent_size)
+            }
+        return self._stats[purpose]
+
+    def record(self, purpose: str, usage, latency: float):
+        """성공한 호출 기록 (usage: OpenAI 응답의 usage 객체)"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+        with self._lock:
+            entry = self._entry(purpose)
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["total_latency"] += latency
+            entry["recent_latencies"].append(latency)
+
+        print(f"[LLM] {purpose}: {latency * 1000:.0f}ms, "
+              f"prompt={prompt_tokens} (cached={cached_tokens}), completion={completion_tokens}")
+
+    def record_error(self, purpose: str):
+        with self._lock:
+            self._entry(purpose)["errors"] += 1
+
+    def snapshot(self) -> dict:
+        """용도별 누적 통계 반환"""
+        result = {}
+        with self._lock:
+            for purpose, entry in self._stats.items():
+                recent = sorted(entry["recent_latencies"])
+                calls = entry["calls"]
+                result[purpose] = {
+                    "calls": calls,
+                    "errors": entry["errors"],
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "cached_tokens": entry["cached_tokens"],
+                    "completion_tokens": entry["completion_tokens"],
+                    "cache_hit_ratio": entry["cached_tokens"] / entry["prompt_tokens"] if entry["prompt_tokens"] else 0.0,
+                    "avg_latency": entry["total_latency"] / calls if calls else 0.0,
+                    "p50_latency": recent[len(recent) // 2] if recent else 0.0,
+                    "p95_latency": recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+                }
+        return result
+
+
+usage_stats = LLMUsageStats()
+
+
+def chat_json(client, model: str, purpose: str, messages: list, response_format: dict, max_tokens: int) -> dict:
+    """구조화 JSON 응답을 요청하고 사용량을 기록한 뒤 파싱된 결과 반환
+
+    실패 시 예외를 그대로 올려 호출부의 키워드 폴백이 처리하도록 함
+    """
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            max_tokens=max_tokens,
+            response_format=response_format
+        )
+    except Exception:
+        usage_stats.record_error(purpose)
+        raise
+
+    usage_stats.record(purpose, response.usage, time.perf_counter() - start)
+    return parse_json_reply(response.choices[0].message.content)
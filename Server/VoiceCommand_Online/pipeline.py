@@ -0,0 +1,301 @@
+"""
+온라인 인식 파이프라인 (HTTP 없이 import 해서 쓰는 라이브러리)
+- 단계: spot(인게임 플레이 중 키워드 스포터 빠른 경로) → asr(Whisper API / 하이브리드 라우터)
+        → normalize(전사 정규화) → resolve(연속 명령 목록 → 컨텍스트별 키워드 매칭 → 의도 분류 → 스킬 매칭)
+- 서버(/recognize, IPC)는 요청 제한/캡처/섀도만 하고 recognize() 를 호출
+- ASR 과 GPT 의도 분류/스킬 매칭은 async 콜백으로 주입
+  (분류/매칭 콜백이 없으면 키워드 매칭만 사용 → OpenAI 없이 평가/배치 작업 가능)
+
+사용 예:
+    from pipeline import RecognitionPipeline
+    pipeline = RecognitionPipeline(transcribe, CatalogStore().load())
+    result = await pipeline.recognize(wav_bytes, skills="매직 미사일", context="InGame_Playing")
+    results = await pipeline.recognize_batch([a_bytes, b_bytes], skills="매직 미사일")
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from voice_common.keyword_spotter import KWS_COMMANDS
+from voice_common.normalize import canonical, normalize, word_breaks
+from voice_common.segment import segment_commands
+
+# 인게임 플레이 중 키워드가 맞으면 GPT 분류 없이 바로 확정하는 명령
+INGAME_COMMANDS = ("MoveLeft", "MoveRight", "TurnLeft", "TurnRight", "Jump", "StopMove", "PauseGame", "OpenMenu")
+
+
+def keyword_classify(text, catalog, context: str = "") -> dict:
+    """키워드 기반 분류 (시스템 명령만 - 스킬은 별도 처리, 정규형 기준 가장 긴 키워드 우선)
+
+    context: 게임 컨텍스트 (같은 말이 화면에 따라 다른 명령일 때 컨텍스트별 키워드 우선)
+    """
+    command, _ = catalog.match_command(text, context)
+    if command:
+        return {"command": command, "confidence": 0.7}
+
+    return {"command": "Unknown", "confidence": 0.0}
+
+
+def keyword_skill_match(text, skills: list, catalog) -> tuple:
+    """단순 키워드 스킬 매칭 (정규형 기준: 띄어쓰기, 문장 부호, 영어/한글 표기 차이 무시)"""
+    print(f"[fallback_skill_match] Text: '{text}', Skills: {skills}")
+    normalized = normalize(text)
+    compact = normalized.compact
+    candidates = []
+
+    # 카탈로그 별칭(짧은 형태, 영어 이름, 속성별 이름)으로 먼저 매칭 시도
+    for target_skill in catalog.mentioned_skills(normalized):
+        # 대상 스킬이 활성 스킬 목록에 있는지 확인
+        target_key = canonical(target_skill)
+        for skill in skills:
+            if target_key in canonical(skill):
+                candidates.append({"name": skill, "confidence": 0.9})
+                break
+
+    # 직접 매칭
+    for skill in skills:
+        skill_key = canonical(skill)
+        if skill_key and compact and (normalized.contains(skill_key, word_breaks(skill)) or compact in skill_key):
+            # 이미 candidates에 있으면 건너뛰기
+            if not any(c["name"] == skill for c in candidates):
+                candidates.append({"name": skill, "confidence": 0.8})
+
+    if candidates:
+        # 가장 높은 confidence 순으로 정렬
+        candidates.sort(key=lambda x: x["confidence"], reverse=True)
+        print(f"[fallback_skill_match] Matched: {candidates[0]['name']} (confidence: {candidates[0]['confidence']})")
+        return candidates[0]["name"], candidates[0]["confidence"], candidates
+
+    print(f"[fallback_skill_match] No match found")
+    return None, 0.0, []
+
+
+def failure(error: str, processing_time: float = 0.0, **extra) -> dict:
+    """인식 실패 응답 (/recognize 와 같은 필드)"""
+    return {
+        "success": False,
+        "text": "",
+        "matched_skill": None,
+        "confidence": 0.0,
+        "candidates": [],
+        "processing_time": processing_time,
+        **extra,
+        "error": error
+    }
+
+
+def _command_result(text: str, command: str, confidence: float, sequence: list, start_time: float) -> dict:
+    return {
+        "success": True,
+        "text": text,
+        "matched_skill": f"SYSTEM:{command}",
+        "confidence": confidence,
+        "candidates": [{"name": f"SYSTEM:{command}", "confidence": confidence}],
+        "sequence": sequence,
+        "processing_time": time.time() - start_time,
+        "is_system_command": True
+    }
+
+
+class RecognitionPipeline:
+    """온라인 인식 파이프라인
+
+    transcribe: async (audio_path, prompt, context) → 전사 텍스트 (환각이면 빈 문자열)
+    catalog_store: 명령/스킬 카탈로그 (CatalogStore, 요청마다 current 사용 → 재로드 반영)
+    keyword_spotter: KeywordSpotter (없거나 템플릿이 없으면 빠른 경로 생략)
+    classify: async (text, client, context) → {"command", "confidence"} (없으면 keyword_classify)
+    match_skill: async (text, skills, language, client) → (스킬, 신뢰도, 후보) (없으면 keyword_skill_match)
+    """
+
+    def __init__(self, transcribe, catalog_store, keyword_spotter=None, classify=None, match_skill=None):
+        self.transcribe_fn = transcribe
+        self.catalog_store = catalog_store
+        self.keyword_spotter = keyword_spotter
+        self.classify_fn = classify
+        self.match_skill_fn = match_skill
+
+    # ---- 키워드 매칭 ----
+
+    def classify_keywords(self, text, context: str = "") -> dict:
+        return keyword_classify(text, self.catalog_store.current, context)
+
+    def match_skill_keywords(self, text, skills: list) -> tuple:
+        return keyword_skill_match(text, skills, self.catalog_store.current)
+
+    # ---- 단계 ----
+
+    async def spot(self, content: bytes, skills: str, context: str, multi: bool, timings: dict,
+                   start_time: float):
+        """인게임 플레이 중 짧은 이동 명령은 키워드 스포터로 바로 처리 (Whisper 생략), 아니면 None
+
+        거부 템플릿이 없으면 짧은 스킬 발화를 이동 명령으로 오인할 수 있으므로 활성 스킬이 없을 때만
+        """
+        spotter = self.keyword_spotter
+        if (context != "InGame_Playing" or spotter is None or not spotter.ready or multi
+                or not (spotter.can_reject or not skills.strip())):
+            return None
+        command, confidence, elapsed_ms = await asyncio.to_thread(spotter.spot, content)
+        timings["kws"] = elapsed_ms / 1000.0
+        if not command:
+            return None
+        print(f"[/recognize] KWS 감지: {command} ({confidence:.2f}, {elapsed_ms:.1f}ms)")
+        result = _command_result("", command, confidence, [], start_time)
+        result["sequence"] = [{"name": f"SYSTEM:{command}", "confidence": confidence,
+                               "is_system_command": True, "start_word": 0, "end_word": 0, "text": ""}]
+        result["fast_path"] = "kws"
+        return result
+
+    async def transcribe(self, content: bytes, prompt: str = "", context: str = "", timings: dict = None) -> str:
+        """오디오 바이트 → 전사 텍스트 (ASR 콜백이 파일 경로를 받으므로 임시 WAV 로 저장)"""
+        timings = timings if timings is not None else {}
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+            f.write(content)
+            temp_path = f.name
+        try:
+            stage_start = time.perf_counter()
+            text = await self.transcribe_fn(temp_path, prompt, context)
+            timings["asr"] = time.perf_counter() - stage_start
+            return text
+        finally:
+            os.unlink(temp_path)
+
+    async def resolve(self, text: str, skill_list: list, context: str = "", language: str = "ko",
+                      client: str = "", timings: dict = None, start_time: float = None) -> dict:
+        """전사 → 판정 + 발화 순서의 명령/스킬 목록
+
+        인게임 플레이 중: 이동/시스템 명령 키워드 → 스킬 키워드 매칭 (GPT 생략)
+        메뉴 화면: 키워드 매칭이 충분히 확실하면 바로 확정 (GPT 오분류 방지)
+        그 외: 의도 분류 → 시스템 명령이 아니면 스킬 매칭
+        """
+        timings = timings if timings is not None else {}
+        start_time = start_time if start_time is not None else time.time()
+
+        # 전사 정규화 (모든 키워드 매처가 공유) + 발화 순서의 명령/스킬 목록
+        # (키워드 매칭, 인게임 플레이 중에는 이동 명령과 스킬만)
+        normalized = normalize(text)
+        sequence = segment_commands(
+            normalized, self.catalog_store.current, skill_list,
+            KWS_COMMANDS if context == "InGame_Playing" else None, context
+        )
+        if len(sequence) > 1:
+            print(f"[/recognize] Sequence: {' → '.join(item['name'] for item in sequence)}")
+
+        if context == "InGame_Playing" and skill_list:
+            # 먼저 이동/점프/정지/방향전환 명령인지 확인 (키워드 매칭)
+            movement_result = self.classify_keywords(normalized, context)
+            if movement_result["command"] in INGAME_COMMANDS:
+                print(f"[/recognize] InGame_Playing: 이동/시스템 명령 감지: {movement_result}")
+                return _command_result(text, movement_result["command"], movement_result["confidence"],
+                                       sequence, start_time)
+
+            # 이동 명령이 아니면 스킬 매칭 (GPT 분류 건너뛰기)
+            print(f"[/recognize] InGame_Playing: 스킬 매칭만 수행")
+            matched_skill, confidence, candidates = self.match_skill_keywords(normalized, skill_list)
+            return {
+                "success": True,
+                "text": text,
+                "matched_skill": matched_skill,
+                "confidence": confidence,
+                "candidates": candidates,
+                "sequence": sequence,
+                "processing_time": time.time() - start_time,
+                "is_system_command": False
+            }
+
+        # 메뉴 컨텍스트에서는 키워드 기반 매칭 먼저 시도 (GPT 오분류 방지)
+        if context and context.startswith("Menu_"):
+            keyword_result = self.classify_keywords(normalized, context)
+            if keyword_result["command"] != "Unknown" and keyword_result["confidence"] >= 0.7:
+                print(f"[/recognize] {context}: 키워드 매칭 성공: {keyword_result}")
+                return _command_result(text, keyword_result["command"], keyword_result["confidence"],
+                                       sequence, start_time)
+
+        # 키워드 매칭 실패 시 의도 분류 (GPT)
+        stage_start = time.perf_counter()
+        if self.classify_fn is not None:
+            system_result = await self.classify_fn(text, client, context)
+        else:
+            system_result = self.classify_keywords(normalized, context)
+        timings["classify"] = time.perf_counter() - stage_start
+        print(f"[/recognize] System command check: {system_result}")
+
+        # 시스템 명령이 감지되면 (Unknown이 아니고 신뢰도가 0.5 이상)
+        if system_result["command"] != "Unknown" and system_result["confidence"] >= 0.5:
+            return _command_result(text, system_result["command"], system_result["confidence"],
+                                   sequence, start_time)
+
+        # 시스템 명령이 아니면 스킬 매칭
+        stage_start = time.perf_counter()
+        if self.match_skill_fn is not None:
+            matched_skill, confidence, candidates = await self.match_skill_fn(text, skill_list, language, client)
+        elif skill_list:
+            matched_skill, confidence, candidates = self.match_skill_keywords(normalized, skill_list)
+        else:
+            matched_skill, confidence, candidates = None, 0.0, []
+        timings["skill_match"] = time.perf_counter() - stage_start
+
+        return {
+            "success": True,
+            "text": text,
+            "matched_skill": matched_skill,
+            "confidence": confidence,
+            "candidates": candidates,
+            "sequence": sequence,
+            "processing_time": time.time() - start_time,
+            "is_system_command": False
+        }
+
+    # ---- 전체 ----
+
+    async def recognize(self, content: bytes, language: str = "ko", skills: str = "", context: str = "",
+                        prompt: str = "", client: str = "", timings: dict = None, multi: bool = False) -> dict:
+        """WAV 바이트 하나 → /recognize 응답과 같은 결과
+
+        skills: 쉼표로 구분한 활성 스킬, prompt: Whisper 인식 힌트
+        timings: 주어지면 단계별 소요 시간(초) 기록 (kws, asr, classify, skill_match)
+        multi: 연속 명령 발화. 키워드 스포터 빠른 경로를 쓰지 않고 전사 전체를 명령/스킬 목록으로 분리
+        """
+        start_time = time.time()
+        timings = timings if timings is not None else {}
+        print(f"[/recognize] Language: {language}, Context: {context}, Skills: {skills}")
+
+        try:
+            spotted = await self.spot(content, skills, context, multi, timings, start_time)
+            if spotted is not None:
+                return spotted
+
+            text = await self.transcribe(content, prompt, context, timings)
+            print(f"[/recognize] Transcribed: {text}")
+
+            # 환각 등으로 텍스트가 비어있으면 실패 반환
+            if not text:
+                return failure("No speech detected or hallucination filtered", time.time() - start_time,
+                               is_system_command=False)
+
+            skill_list = [s.strip() for s in skills.split(",") if s.strip()]
+            return await self.resolve(text, skill_list, context, language, client, timings, start_time)
+
+        except Exception as e:
+            print(f"[/recognize] Error: {e}")
+            return failure(str(e), time.time() - start_time)
+
+    async def recognize_batch(self, clips: list, language: str = "ko", skills: str = "", context: str = "",
+                              prompt: str = "", multi: bool = False, timings: list = None,
+                              concurrency: int = 4) -> list:
+        """같은 요청 조건의 WAV 바이트 여러 개를 최대 concurrency개씩 동시에 인식 (평가/배치 작업용)
+
+        결과는 clips 순서, timings: 주어지면 클립별 단계 시간 dict 를 추가
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        clip_timings = [{} for _ in clips]
+
+        async def run(content, stages):
+            async with semaphore:
+                return await self.recognize(content, language, skills, context, prompt, "batch", stages, multi)
+
+        results = await asyncio.gather(*(run(content, stages) for content, stages in zip(clips, clip_timings)))
+        if timings is not None:
+            timings.extend(clip_timings)
+        return list(results)
@@ -0,0 +1,197 @@
+"""
+업스트림(OpenAI) 호출 보호 계층
+- 단계별 지연 예산(deadline): 예산을 넘기면 즉시 포기하고 폴백으로 전환
+- 헤지 요청(hedged request): 최근 지연 분포의 백분위수를 넘기면 동일 요청을 하나 더 보내
+  먼저 끝난 결과를 사용
+- 서킷 브레이커: 연속 실패 시 일정 시간 업스트림 호출을 건너뛰고 바로 폴백 사용
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class UpstreamUnavailable(Exception):
+    """서킷 브레이커가 열려 있거나 지연 예산을 초과한 경우"""
+    pass
+
+
+class CircuitBreaker:
+    """연속 실패 기반 서킷 브레이커 (closed → open → half_open → closed)"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_probe = False
+        self._total_failures = 0
+        self._total_short_circuits = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = "half_open"
+            self._half_open_probe = False
+
+    def allow(self) -> bool:
+        """호출 허용 여부 (half_open 상태에서는 시험 요청 하나만 허용)"""
+        with self._lock:
+            self._refresh()
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._half_open_probe:
+                self._half_open_probe = True
+                return True
+            self._total_short_circuits += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != "closed":
+                print(f"[CircuitBreaker] {self.name}: 복구됨 → closed")
+            self._state = "closed"
+            self._consecutive_failures = 0
+            self._half_open_probe = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._total_failures += 1
+            if self._state == "half_open" or self._consecutive_failures >= self.failure_threshold:
+                if self._state != "open":
+                    print(f"[CircuitBreaker] {self.name}: 연속 실패 {self._consecutive_failures}회 → open")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._half_open_probe = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refresh()
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if self._state == "open" else 0.0
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "total_failures": self._total_failures,
+                "short_circuited": self._total_short_circuits,
+                "retry_in": retry_in
+            }
+
+
+class LatencyWindow:
+    """최근 성공 호출 지연 시간 (헤지 임계값 계산용)"""
+
+    def __init__(self, size: int = 100):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._values.append(latency)
+
+    def percentile(self, q: float):
+        """q 백분위수 (표본이 부족하면 None)"""
+        with self._lock:
+            if len(self._values) < 10:
+                return None
+            values = sorted(self._values)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class UpstreamStage:
+    """단일 업스트림 단계 (예: Whisper API, GPT)의 예산·헤지·브레이커 설정"""
+
+    def __init__(self, name: str, timeout: float, hedge: bool = False, hedge_percentile: float = 0.95,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.latencies = LatencyWindow()
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.timeouts = 0
+
+    def is_available(self) -> bool:
+        """폴백으로 바로 갈지 판단할 때 사용 (시험 요청 슬롯은 소모하지 않음)"""
+        return self.breaker.state != "open"
+
+    async def call(self, fn, timeout: float = None):
+        """fn(동기 함수)을 스레드에서 실행, 지연 예산 안에서 결과 반환
+
+        브레이커가 열려 있거나 예산을 넘기면 UpstreamUnavailable 발생
+        """
+        if not self.breaker.allow():
+            raise UpstreamUnavailable(f"{self.name} circuit open")
+
+        budget = timeout if timeout is not None else self.timeout
+        start = time.monotonic()
+        tasks = [asyncio.create_task(asyncio.to_thread(fn))]
+
+        try:
+            hedge_after = self.latencies.percentile(self.hedge_percentile) if self.hedge else None
+            if hedge_after is not None and hedge_after < budget:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self.hedges_sent += 1
+                    print(f"[{self.name}] {hedge_after * 1000:.0f}ms 초과 → 헤지 요청 전송")
+                    tasks.append(asyncio.create_task(asyncio.to_thread(fn)))
+
+            result = await self._first_success(tasks, budget - (time.monotonic() - start))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            print(f"[{self.name}] 지연 예산 {budget:.1f}s 초과")
+            raise UpstreamUnavailable(f"{self.name} exceeded {budget:.1f}s budget")
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            # 남은 요청은 결과를 버림 (스레드는 클라이언트 타임아웃으로 정리됨)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        self.latencies.add(time.monotonic() - start)
+        self.breaker.record_success()
+        return result
+
+    async def _first_success(self, tasks: list, remaining: float):
+        """먼저 성공한 태스크의 결과 반환 (모두 실패하면 마지막 예외)"""
+        deadline = time.monotonic() + remaining
+        pending = set(tasks)
+        last_error = None
+        while pending:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise asyncio.TimeoutError()
+            done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    if len(tasks) > 1 and task is tasks[-1]:
+                        self.hedges_won += 1
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+
+    def snapshot(self) -> dict:
+        return {
+            **self.breaker.snapshot(),
+            "timeout": self.timeout,
+            "hedge": self.hedge,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "timeouts": self.timeouts
+        }
@@ -3,25 +3,157 @@
 - OpenAI Whisper API: 음성 → 텍스트 변환
 - OpenAI GPT: 의도 파악 및 명령 분류
 - 인터넷 연결 및 OpenAI API 키 필요
+- 인식 흐름은 pipeline.py (RecognitionPipeline), 이 파일은 라우팅/요청 제한/캡처/섀도와 OpenAI 연동
 """
 
 import os
+import sys
+import asyncio
 import base64
+import contextvars
+import hmac
 import tempfile
-import json
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+import threading
+import math
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, BackgroundTasks, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from openai import OpenAI
 from dotenv import load_dotenv
+from functools import lru_cache
 import time
 
+# 공용 모듈(Server/voice_common) 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voice_common.engine_router import EngineHandle, HybridRouter, wav_duration
+from voice_common.keyword_spotter import KWS_COMMANDS, REJECT_CLASS, KeywordSpotter
+from voice_common.catalog import Catalog, CatalogStore, DEFAULT_COMMANDS_PATH, DEFAULT_SKILLS_PATH
+from voice_common.shadow import ShadowRecorder, ShadowSkipped
+from voice_common.rate_limit import ClientRateLimiter, client_key, parse_trusted_proxies
+from voice_common.capture import TrafficRecorder
+from voice_common.ipc import UnixSocketServer
+from voice_common.audio import encode_wav
+from voice_common.features import take_feature_seconds
+
+from llm_client import (
+    chat_json, command_response_format, skill_response_format, usage_stats,
+    COMMAND_MAX_TOKENS, SKILL_MAX_TOKENS
+)
+from resilience import UpstreamStage
+from pipeline import RecognitionPipeline, keyword_classify, keyword_skill_match
+from audio_compress import prepare_upload
+
 # 환경 변수 로드
 load_dotenv()
 
 # OpenAI 클라이언트 생성
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# 의도 분류 / 스킬 매칭에 사용하는 GPT 모델
+LLM_MODEL = "gpt-4o-mini"
+
+# 업스트림 지연 예산 / 헤지 / 서킷 브레이커 설정
+# WHISPER_API_TIMEOUT, LLM_TIMEOUT: 단계별 지연 예산(초), 초과 시 폴백
+# HEDGE_REQUESTS=1: 최근 지연의 HEDGE_PERCENTILE 백분위수를 넘기면 중복 요청 전송
+# BREAKER_FAILURES 회 연속 실패 시 BREAKER_RESET 초 동안 업스트림 호출 생략
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+whisper_stage = UpstreamStage(
+    "whisper_api", timeout=float(os.getenv("WHISPER_API_TIMEOUT", "6.0")),
+    hedge=HEDGE_REQUESTS, hedge_percentile=HEDGE_PERCENTILE,
+    failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET
+)
+llm_stage = UpstreamStage(
+    "gpt", timeout=float(os.getenv("LLM_TIMEOUT", "3.0")),
+    hedge=HEDGE_REQUESTS, hedge_percentile=HEDGE_PERCENTILE,
+    failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET
+)
+
+# 단계 예산보다 오래 걸리는 요청은 SDK 수준에서도 끊어 스레드가 남지 않도록 함 (재시도는 헤지로 대체)
+whisper_client = client.with_options(timeout=whisper_stage.timeout, max_retries=0)
+llm_client = client.with_options(timeout=llm_stage.timeout, max_retries=0)
+
+# 하이브리드 모드: LOCAL_WHISPER_MODEL 을 지정하면 로컬 Whisper 엔진도 함께 로드해
+# 요청마다 지연/대기열/클립 길이를 보고 로컬 또는 API 중 하나로 라우팅
+# (openai-whisper, torch 설치 필요)
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "")
+HYBRID_SHORT_CLIP_SECONDS = float(os.getenv("HYBRID_SHORT_CLIP_SECONDS", "2.0"))
+HYBRID_SPILL_FACTOR = float(os.getenv("HYBRID_SPILL_FACTOR", "1.5"))
+API_CONCURRENCY = int(os.getenv("API_CONCURRENCY", "8"))
+# WEIGHT_STORE_DIR: tools/export_weights.py 로 내보낸 mmap 가중치 저장소 (없으면 체크포인트에서 로드)
+WEIGHT_STORE_DIR = os.getenv("WEIGHT_STORE_DIR", "")
+
+# Whisper API 업로드 전 압축 (무음 제거 + 16kHz 모노 + 코덱 인코딩)
+# UPLOAD_CODEC: flac(무손실), opus(저비트레이트), wav(ffmpeg 없이 다운샘플만), off(원본 업로드)
+UPLOAD_CODEC = os.getenv("UPLOAD_CODEC", "flac")
+
+# 클라이언트별 요청 제한 (접속 IP 기준 토큰 버킷, BURST가 0이면 제한 없음)
+# TRUSTED_PROXIES: 쉼표로 구분한 리버스 프록시 주소. 이 주소에서 온 요청만 X-Client-Id / X-Forwarded-For 를 믿음
+TRUSTED_PROXIES = parse_trusted_proxies(os.getenv("TRUSTED_PROXIES", ""))
+# RATE_LIMIT_ASR_BURST / RATE_LIMIT_ASR_RATE: 오디오 초 예산 / 초당 충전량 (초과 시 429)
+# RATE_LIMIT_LLM_BURST / RATE_LIMIT_LLM_RATE: GPT 호출 수 예산 / 초당 충전량 (초과 시 키워드 매칭으로 대체)
+asr_limiter = ClientRateLimiter(
+    "asr_seconds",
+    capacity=float(os.getenv("RATE_LIMIT_ASR_BURST", "0")),
+    refill_rate=float(os.getenv("RATE_LIMIT_ASR_RATE", "0.5"))
+)
+llm_limiter = ClientRateLimiter(
+    "llm_calls",
+    capacity=float(os.getenv("RATE_LIMIT_LLM_BURST", "0")),
+    refill_rate=float(os.getenv("RATE_LIMIT_LLM_RATE", "0.2"))
+)
+
+# 트래픽 캡처: /recognize 요청 중 CAPTURE_SAMPLE_RATE 비율을 오디오/필드/도착 시각/단계별 시간과 함께 기록
+# CAPTURE_DIR 에 CAPTURE_CAPACITY 개 슬롯을 돌려 씀 (가장 오래된 것부터 덮어씀), 재생은 tools/replay.py
+capture = TrafficRecorder(
+    os.getenv("CAPTURE_DIR", "captures"),
+    sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "0")),
+    capacity=int(os.getenv("CAPTURE_CAPACITY", "500"))
+)
+
+# 섀도 모드: /recognize 요청 중 SHADOW_SAMPLE_RATE 비율을 응답 후 SHADOW_ENGINE(local/api)으로 한 번 더 인식해
+# 결과를 비교 기록 (섀도 쪽 판정은 GPT 호출 없이 키워드 매칭만 사용해 API 사용량을 늘리지 않음)
+# SHADOW_ENGINE 을 비우면 로컬 모델이 설정돼 있을 때 local, 아니면 api
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+SHADOW_ENGINE = os.getenv("SHADOW_ENGINE", "") or ("local" if LOCAL_WHISPER_MODEL else "api")
+
+# 키워드 스포터(KWS): InGame_Playing 이동 명령을 Whisper 호출 전에 템플릿 DTW로 바로 인식
+# KWS_TEMPLATE_DIR/<명령>/*.wav 템플릿이 있을 때만 동작 (POST /kws/enroll 로 등록 가능, 관리자 토큰 필요)
+# KWS_TEMPLATE_DIR/_reject/*.wav: 스킬 이름/잡담 등 거부 템플릿. 없으면 활성 스킬이 있는 요청은 ASR 로 확인
+# KWS_THRESHOLD: 허용 DTW 거리 상한, KWS_MARGIN: 2순위 명령(또는 거부 클래스)과의 최소 거리 비율
+KWS_ENABLED = os.getenv("KWS_ENABLED", "1") == "1"
+keyword_spotter = KeywordSpotter(
+    os.getenv("KWS_TEMPLATE_DIR", "kws_templates"),
+    threshold=float(os.getenv("KWS_THRESHOLD", "12.0")),
+    margin=float(os.getenv("KWS_MARGIN", "1.15"))
+)
+if KWS_ENABLED:
+    keyword_spotter.load()
+
+# 관리자 엔드포인트 (POST /kws/enroll): ADMIN_TOKEN 을 설정해야 활성화, 요청 시 X-Admin-Token 헤더 필요
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 명령/스킬 카탈로그 (데이터 파일에서 로드, CATALOG_RELOAD_INTERVAL 초마다 변경 감지 후 다시 로드)
+catalog_store = CatalogStore(
+    os.getenv("COMMANDS_CATALOG_PATH", DEFAULT_COMMANDS_PATH),
+    os.getenv("SKILLS_CATALOG_PATH", DEFAULT_SKILLS_PATH)
+).load()
+catalog_store.start_watching(float(os.getenv("CATALOG_RELOAD_INTERVAL", "2")))
+
+local_engine = None
+if LOCAL_WHISPER_MODEL:
+    from voice_common.local_whisper import LocalWhisperEngine
+    # 백그라운드 로드 + 워밍업, 준비되기 전까지 라우터는 API만 사용
+    local_engine = LocalWhisperEngine(LOCAL_WHISPER_MODEL, weight_store_dir=WEIGHT_STORE_DIR)
+    local_engine.start_background()
+
+# 로컬 IPC: IPC_SOCKET 경로를 지정하면 Unix 도메인 소켓으로도 /recognize 요청을 받음 (Linux, 같은 호스트의 게임용)
+# 프로토콜은 voice_common/ipc.py
+IPC_SOCKET = os.getenv("IPC_SOCKET", "")
+
 app = FastAPI(title="Voice Command Server (Online)", version="1.0.0")
 
 # CORS 설정
@@ -47,259 +179,12 @@ class CommandResponse(BaseModel):
     confidence: float  # 신뢰도
 
 
-# 사용 가능한 함수 정의
-AVAILABLE_FUNCTIONS = [
-    {
-        "name": "OpenSettings",
-        "description": "설정창, 옵션창을 엽니다",
-        "examples": ["설정 열어", "옵션 열어줘", "세팅 보여줘", "설정창 열어", "옵션 화면"]
-    },
-    {
-        "name": "CloseSettings",
-        "description": "설정창을 닫고 인게임으로 돌아갑니다",
-        "examples": ["설정 닫아", "옵션 닫아줘", "설정창 닫아", "인게임으로 돌아가", "게임으로 돌아가", "돌아가", "뒤로가기", "뒤로", "나가기"]
-    },
-    {
-        "name": "OpenMenu",
-        "description": "게임 메뉴를 엽니다",
-        "examples": ["메뉴 열어", "메뉴 보여줘", "메뉴창 열어"]
-    },
-    {
-        "name": "CloseMenu",
-        "description": "게임 메뉴를 닫습니다",
-        "examples": ["메뉴 닫아", "메뉴 닫아줘"]
-    },
-    {
-        "name": "PauseGame",
-        "description": "게임을 일시정지합니다",
-        "examples": ["일시정지", "멈춰", "정지", "퍼즈", "게임 멈춰", "잠깐 멈춰"]
-    },
-    {
-        "name": "ResumeGame",
-        "description": "일시정지된 게임을 재개합니다 (설정창이 아닌 일시정지 상태에서)",
-        "examples": ["계속", "재개", "게임 계속", "플레이", "일시정지 해제"]
-    },
-    {
-        "name": "RestartGame",
-        "description": "게임을 재시작합니다 (게임오버 시 재도전)",
-        "examples": ["재시작", "다시 시작", "리스타트", "처음부터", "재도전", "다시 해볼래", "다시"]
-    },
-    {
-        "name": "QuitToMainMenu",
-        "description": "메인 메뉴로 나갑니다",
-        "examples": ["메인 메뉴로", "나가기", "종료", "메인으로"]
-    },
-    {
-        "name": "OpenInventory",
-        "description": "인벤토리/가방을 엽니다",
-        "examples": ["인벤토리 열어", "가방 열어", "아이템 보여줘", "소지품"]
-    },
-    {
-        "name": "CloseInventory",
-        "description": "인벤토리를 닫습니다",
-        "examples": ["인벤토리 닫아", "가방 닫아"]
-    },
-    {
-        "name": "OpenMap",
-        "description": "지도를 엽니다",
-        "examples": ["지도 열어", "맵 열어", "지도 보여줘", "위치 보여줘"]
-    },
-    {
-        "name": "CloseMap",
-        "description": "지도를 닫습니다",
-        "examples": ["지도 닫아", "맵 닫아"]
-    },
-    {
-        "name": "ShowHelp",
-        "description": "도움말을 표시합니다",
-        "examples": ["도움말", "도와줘", "뭐라고 해야해", "명령어 알려줘"]
-    },
-    {
-        "name": "StartGame",
-        "description": "게임 모드 선택 화면으로 이동합니다 (메인 메뉴에서)",
-        "examples": ["게임 시작", "플레이", "시작", "게임 모드 선택", "게임하자", "게임 할래"]
-    },
-    {
-        "name": "SelectStoryMode",
-        "description": "스토리 모드를 선택합니다",
-        "examples": ["스토리 모드", "스토리", "챕터 모드", "스토리 선택"]
-    },
-    {
-        "name": "SelectEndlessMode",
-        "description": "무한 모드를 선택합니다",
-        "examples": ["무한 모드", "엔드리스", "엔드리스 모드", "무한 선택"]
-    },
-    {
-        "name": "StartEndless",
-        "description": "무한 모드 게임을 시작합니다 (무한 모드 화면에서)",
-        "examples": ["게임 시작", "시작", "플레이", "시작해줘", "게임 시작해줘"]
-    },
-    {
-        "name": "GoBack",
-        "description": "이전 화면으로 돌아갑니다",
-        "examples": ["뒤로", "뒤로가기", "이전", "취소"]
-    },
-    {
-        "name": "GoToMainMenu",
-        "description": "메인 메뉴 화면으로 돌아갑니다",
-        "examples": ["메인 메뉴로", "메인 메뉴로 돌아가", "메인 메뉴로 가줘", "메인으로", "메인으로 돌아가"]
-    },
-    {
-        "name": "GoToGameModeSelection",
-        "description": "게임 모드 선택 화면으로 돌아갑니다",
-        "examples": ["게임 모드 선택으로", "게임 모드로 돌아가", "모드 선택으로", "모드 선택 화면으로"]
-    },
-    {
-        "name": "OpenStore",
-        "description": "상점을 엽니다",
-        "examples": ["상점", "상점 열어", "스토어", "아이템 사러 가자"]
-    },
-    {
-        "name": "SelectTutorial",
-        "description": "튜토리얼(챕터 0)을 시작합니다",
-        "examples": ["튜토리얼", "튜토리얼 시작", "튜토리얼 시작해줘", "챕터 0", "챕터 0 시작", "챕터 0 시작해줘", "챕터 영", "0챕터", "영챕터"]
-    },
-    {
-        "name": "SelectChapter1",
-        "description": "챕터 1을 선택합니다",
-        "examples": ["챕터 1", "첫번째 챕터", "1챕터", "챕터 일"]
-    },
-    {
-        "name": "SelectChapter2",
-        "description": "챕터 2를 선택합니다",
-        "examples": ["챕터 2", "두번째 챕터", "2챕터", "챕터 이"]
-    },
-    {
-        "name": "SelectChapter3",
-        "description": "챕터 3을 선택합니다",
-        "examples": ["챕터 3", "세번째 챕터", "3챕터", "챕터 삼"]
-    },
-    {
-        "name": "SelectChapter4",
-        "description": "챕터 4를 선택합니다",
-        "examples": ["챕터 4", "네번째 챕터", "4챕터", "챕터 사"]
-    },
-    {
-        "name": "SelectChapter5",
-        "description": "챕터 5를 선택합니다",
-        "examples": ["챕터 5", "다섯번째 챕터", "5챕터", "챕터 오"]
-    },
-    {
-        "name": "SelectChapter6",
-        "description": "챕터 6을 선택합니다",
-        "examples": ["챕터 6", "여섯번째 챕터", "6챕터", "챕터 육"]
-    },
-    {
-        "name": "SelectChapter7",
-        "description": "챕터 7을 선택합니다",
-        "examples": ["챕터 7", "일곱번째 챕터", "7챕터", "챕터 칠"]
-    },
-    {
-        "name": "SelectChapter8",
-        "description": "챕터 8을 선택합니다",
-        "examples": ["챕터 8", "여덟번째 챕터", "8챕터", "챕터 팔"]
-    },
-    {
-        "name": "SelectChapter9",
-        "description": "챕터 9를 선택합니다",
-        "examples": ["챕터 9", "아홉번째 챕터", "9챕터", "챕터 구"]
-    },
-    {
-        "name": "SelectChapter10",
-        "description": "챕터 10을 선택합니다",
-        "examples": ["챕터 10", "열번째 챕터", "10챕터", "챕터 십"]
-    },
-    {
-        "name": "SelectChapter11",
-        "description": "챕터 11을 선택합니다",
-        "examples": ["챕터 11", "열한번째 챕터", "11챕터"]
-    },
-    {
-        "name": "SelectChapter12",
-        "description": "챕터 12를 선택합니다",
-        "examples": ["챕터 12", "열두번째 챕터", "12챕터"]
-    },
-    # Options 탭 전환
-    {
-        "name": "ShowAudioTab",
-        "description": "설정 화면에서 오디오 탭을 엽니다",
-        "examples": ["오디오 탭", "오디오", "소리 설정", "오디오 열어"]
-    },
-    {
-        "name": "ShowGraphicsTab",
-        "description": "설정 화면에서 그래픽 탭을 엽니다",
-        "examples": ["그래픽 탭", "그래픽", "화면 설정", "그래픽 열어"]
-    },
-    {
-        "name": "ShowLanguageTab",
-        "description": "설정 화면에서 언어 탭을 엽니다",
-        "examples": ["언어 탭", "언어", "언어 설정", "언어 열어"]
-    },
-    {
-        "name": "ShowGameTab",
-        "description": "설정 화면에서 게임 탭을 엽니다",
-        "examples": ["게임 탭", "게임 설정", "게임 열어"]
-    },
-    # Options 섹션 명령
-    {
-        "name": "ExpandVoiceRecognition",
-        "description": "게임 탭에서 음성인식 섹션을 펼칩니다",
-        "examples": ["음성인식 펼쳐", "음성인식 열어", "음성인식 보여줘"]
-    },
-    {
-        "name": "CollapseVoiceRecognition",
-        "description": "게임 탭에서 음성인식 섹션을 접습니다",
-        "examples": ["음성인식 접어", "음성인식 닫아", "음성인식 숨겨"]
-    },
-    {
-        "name": "ExpandKeyBinding",
-        "description": "게임 탭에서 키설정 섹션을 펼칩니다",
-        "examples": ["키설정 펼쳐", "키설정 열어", "키바인딩 펼쳐", "키설정 보여줘"]
-    },
-    {
-        "name": "CollapseKeyBinding",
-        "description": "게임 탭에서 키설정 섹션을 접습니다",
-        "examples": ["키설정 접어", "키설정 닫아", "키바인딩 접어", "키설정 숨겨"]
-    },
-    # InGame 이동 명령
-    {
-        "name": "MoveLeft",
-        "description": "캐릭터를 왼쪽으로 이동합니다",
-        "examples": ["왼쪽", "왼쪽 이동", "왼쪽으로", "왼쪽으로 가"]
-    },
-    {
-        "name": "MoveRight",
-        "description": "캐릭터를 오른쪽으로 이동합니다",
-        "examples": ["오른쪽", "오른쪽 이동", "오른쪽으로", "오른쪽으로 가"]
-    },
-    {
-        "name": "Jump",
-        "description": "캐릭터가 점프합니다",
-        "examples": ["점프", "뛰어", "점프해", "뛰어올라"]
-    },
-    {
-        "name": "StopMove",
-        "description": "캐릭터 이동을 멈춥니다",
-        "examples": ["정지", "멈춰", "이동 멈춰", "그만"]
-    },
-    {
-        "name": "TurnLeft",
-        "description": "캐릭터가 왼쪽 방향으로 돌아봅니다 (이동 없이 방향만 전환)",
-        "examples": ["왼쪽으로 돌아", "왼쪽 돌아"]
-    },
-    {
-        "name": "TurnRight",
-        "description": "캐릭터가 오른쪽 방향으로 돌아봅니다 (이동 없이 방향만 전환)",
-        "examples": ["오른쪽으로 돌아", "오른쪽 돌아"]
-    },
-]
-
-
-def build_system_prompt() -> str:
-    """LLM용 시스템 프롬프트 생성"""
+@lru_cache(maxsize=2)
+def build_system_prompt(catalog: Catalog) -> str:
+    """LLM용 시스템 프롬프트 생성 (카탈로그 버전별로 한 번만 생성해 재사용)"""
     functions_desc = "\n".join([
         f"- {f['name']}: {f['description']} (예: {', '.join(f['examples'][:3])})"
-        for f in AVAILABLE_FUNCTIONS
+        for f in catalog.commands
     ])
 
     return f"""당신은 게임 음성 명령 분류기입니다.
@@ -317,6 +202,19 @@ def build_system_prompt() -> str:
 6. 유사한 표현도 적절히 매핑하세요."""
 
 
+@lru_cache(maxsize=1)
+def build_skill_system_prompt() -> str:
+    """스킬 매칭용 시스템 프롬프트 (스킬 목록은 사용자 메시지로 분리해 프롬프트를 고정)"""
+    return """당신은 게임 음성 명령 매칭 시스템입니다.
+사용자의 음성 인식 결과와 가장 유사한 스킬을 찾아주세요.
+
+규칙:
+1. 사용자 메시지의 "사용 가능한 스킬" 중에서만 선택하세요.
+2. 매칭되는 스킬이 없으면 matched_skill을 null로 반환하세요.
+3. candidates에는 가능성이 높은 스킬을 최대 3개까지 confidence 내림차순으로 넣으세요.
+4. confidence는 0.0~1.0 범위입니다."""
+
+
 def is_whisper_hallucination(text: str) -> bool:
     """Whisper 환각(hallucination) 감지
 
@@ -363,26 +261,141 @@ def is_whisper_hallucination(text: str) -> bool:
     return False
 
 
-async def transcribe_audio(audio_path: str, prompt: str = "") -> str:
-    """OpenAI Whisper API로 음성 인식
+async def transcribe_with_api(audio_path: str, language: str = "ko", prompt: str = "") -> str:
+    """OpenAI Whisper API로 음성 인식 (원본 텍스트 반환)"""
+    with open(audio_path, "rb") as f:
+        audio_bytes = f.read()
+
+    if UPLOAD_CODEC != "off":
+        payload, filename, stats = await asyncio.to_thread(prepare_upload, audio_bytes, UPLOAD_CODEC)
+        print(f"[Whisper] 업로드 압축 ({stats['codec']}): {stats['original_bytes']} → {stats['upload_bytes']} bytes "
+              f"(절감 {stats['saved_bytes']} bytes, 인코딩 {stats['encode_ms']}ms)")
+    else:
+        payload, filename = audio_bytes, "audio.wav"
+
+    def request():
+        return whisper_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(filename, payload),
+            language=language,
+            prompt=prompt if prompt else None
+        )
+
+    transcript = await whisper_stage.call(request)
+    return transcript.text.strip()
+
+
+# 실행 중인 로컬 섀도 작업의 취소 신호 (실제 요청이 로컬 엔진을 쓰기 시작하면 모두 설정)
+_shadow_cancel_events = set()
+
+# 처리 중인 /recognize 요청의 단계별 시간 dict (로컬 엔진 경로가 특징 추출 시간을 "features" 로 기록)
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+async def transcribe_with_local(audio_path: str, language: str = "ko", prompt: str = "") -> str:
+    """로컬 Whisper 엔진으로 음성 인식 (이벤트 루프를 막지 않도록 스레드에서 실행)"""
+    for event in list(_shadow_cancel_events):
+        event.set()
+
+    def run():
+        take_feature_seconds()
+        text = local_engine.transcribe(audio_path, language, prompt)
+        return text, take_feature_seconds()
+
+    text, feature_seconds = await asyncio.to_thread(run)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings["features"] = timings.get("features", 0.0) + feature_seconds
+    return text
+
+
+api_handle = EngineHandle("api", transcribe_with_api, capacity=API_CONCURRENCY, initial_latency=1.5)
+api_handle.available = lambda: bool(os.getenv("OPENAI_API_KEY")) and whisper_stage.is_available()
+
+local_handle = None
+if local_engine:
+    local_handle = EngineHandle(f"local:{LOCAL_WHISPER_MODEL}", transcribe_with_local, capacity=1, initial_latency=1.0)
+    local_handle.available = lambda: local_engine.ready
+
+router = HybridRouter(
+    local=local_handle, api=api_handle,
+    short_clip_seconds=HYBRID_SHORT_CLIP_SECONDS, spill_factor=HYBRID_SPILL_FACTOR
+)
+
+
+shadow = ShadowRecorder(
+    "router" if local_handle else "api", SHADOW_ENGINE,
+    sample_rate=SHADOW_SAMPLE_RATE, log_path=os.getenv("SHADOW_LOG", "shadow_log.jsonl")
+)
+
+
+async def _shadow_transcribe(audio_path: str, language: str, prompt: str) -> str:
+    """섀도 엔진 직접 호출 (EngineHandle.run 을 거치지 않아 라우터의 처리 중 수/지연 EWMA 에 섞이지 않음)
+
+    local: 로컬 엔진이 실제 요청을 처리 중이면 건너뛰고, 디코딩 도중 실제 요청이 들어오면 중단
+    """
+    if SHADOW_ENGINE != "local":
+        if not api_handle.available():
+            raise ShadowSkipped("api engine not available")
+        return await transcribe_with_api(audio_path, language, prompt)
+
+    if local_handle is None or not local_handle.available():
+        raise ShadowSkipped("local engine not available")
+    if local_handle.inflight > 0:
+        raise ShadowSkipped("local engine busy with a player request")
+    cancel_event = threading.Event()
+    _shadow_cancel_events.add(cancel_event)
+    try:
+        text = await asyncio.to_thread(
+            local_engine.transcribe_profile, audio_path, "greedy", None, language, prompt, cancel_event
+        )
+    finally:
+        _shadow_cancel_events.discard(cancel_event)
+    if cancel_event.is_set():
+        raise ShadowSkipped("preempted by a player request")
+    return text
+
+
+async def shadow_recognize(content: bytes, language: str, skills: str, prompt: str, context: str = "") -> dict:
+    """섀도 엔진으로 같은 오디오를 다시 인식하고 키워드 매칭으로 판정"""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(content)
+        temp_path = f.name
+    try:
+        start = time.time()
+        text = await _shadow_transcribe(temp_path, language, prompt)
+        latency = time.time() - start
+    finally:
+        os.unlink(temp_path)
+
+    if is_whisper_hallucination(text):
+        text = ""
+    command = fallback_classify(text, context) if text else {"command": "Unknown", "confidence": 0.0}
+    if command["command"] != "Unknown":
+        matched, confidence = f"SYSTEM:{command['command']}", command["confidence"]
+    else:
+        skill_list = [s.strip() for s in skills.split(",") if s.strip()]
+        matched, confidence, _ = fallback_skill_match(text, skill_list) if text else (None, 0.0, [])
+    return {"text": text, "matched": matched, "confidence": confidence, "latency": latency}
+
+
+async def transcribe_audio(audio_path: str, prompt: str = "", context: str = "") -> str:
+    """음성 인식 (Whisper API, 하이브리드 모드에서는 라우터가 엔진 선택)
 
     prompt: 예상되는 단어들을 제공하면 인식률이 향상됨
+    context: 현재 게임 화면 상태 (라우팅 힌트)
     """
     try:
-        # 오디오 파일 크기 확인
-        import os
-        file_size = os.path.getsize(audio_path)
-        print(f"[Whisper] 오디오 파일 크기: {file_size} bytes")
-
-        with open(audio_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="ko",
-                prompt=prompt if prompt else None
-            )
-        result = transcript.text.strip()
-        print(f"[Whisper] 원본 결과: '{result}' (길이: {len(result)})")
+        # 오디오 파일 크기 / 길이 확인
+        with open(audio_path, "rb") as f:
+            audio_bytes = f.read()
+        duration = wav_duration(audio_bytes)
+        print(f"[Whisper] 오디오 파일 크기: {len(audio_bytes)} bytes ({duration:.2f}s)")
+
+        result, engine_name = await router.transcribe(
+            audio_path, duration, context=context, language="ko", prompt=prompt
+        )
+        print(f"[Whisper] 원본 결과 ({engine_name}): '{result}' (길이: {len(result)})")
 
         # 환각 감지
         if is_whisper_hallucination(result):
@@ -391,43 +404,54 @@ async def transcribe_audio(audio_path: str, prompt: str = "") -> str:
 
         return result
     except Exception as e:
-        print(f"Whisper API 오류: {e}")
+        print(f"Whisper 오류: {e}")
         raise e
 
 
-async def classify_intent(text: str) -> dict:
-    """LLM을 사용해 사용자 의도를 파악"""
+def admit_asr(http_request: Request, audio_bytes: bytes):
+    """클라이언트 음성 인식 예산에서 오디오 길이만큼 차감, 부족하면 바로 429"""
+    allowed, retry_after = asr_limiter.try_acquire(client_key(http_request, TRUSTED_PROXIES), wav_duration(audio_bytes))
+    if not allowed:
+        raise HTTPException(
+            status_code=429, detail="ASR budget exceeded",
+            headers={"Retry-After": str(math.ceil(min(retry_after, 3600)))}
+        )
+
+
+def admit_llm(client: str, purpose: str) -> bool:
+    """클라이언트 GPT 호출 예산에서 1회 차감 (부족하면 False → 호출 측은 키워드 폴백)"""
+    allowed, _ = llm_limiter.try_acquire(client, 1.0)
+    if not allowed:
+        print(f"[{purpose}] LLM 예산 초과 ({client}), 키워드 매칭 사용")
+    return allowed
+
+
+async def classify_intent(text: str, client: str = "", context: str = "") -> dict:
+    """LLM을 사용해 사용자 의도를 파악 (context: 게임 컨텍스트, 키워드 매칭에 사용)"""
 
     # 먼저 키워드 기반 분류 시도 (더 정확함)
-    fallback_result = fallback_classify(text)
+    fallback_result = fallback_classify(text, context)
     if fallback_result["command"] != "Unknown":
         print(f"[classify_intent] Keyword match: {fallback_result}")
         return fallback_result
 
-    # 키워드 매칭 실패 시 LLM 사용
-    if not os.getenv("OPENAI_API_KEY"):
+    # 키워드 매칭 실패 시 LLM 사용 (업스트림 장애 중이면 바로 폴백)
+    if not os.getenv("OPENAI_API_KEY") or not llm_stage.is_available():
+        return fallback_result
+    if not admit_llm(client, "classify_intent"):
         return fallback_result
 
+    catalog = catalog_store.current
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        result = await llm_stage.call(lambda: chat_json(
+            llm_client, LLM_MODEL, "classify_intent",
             messages=[
-                {"role": "system", "content": build_system_prompt()},
+                {"role": "system", "content": build_system_prompt(catalog)},
                 {"role": "user", "content": f"음성 인식 결과: \"{text}\""}
             ],
-            temperature=0,
-            max_tokens=100
-        )
-
-        result_text = response.choices[0].message.content.strip()
-
-        # JSON 파싱
-        if "```" in result_text:
-            result_text = result_text.split("```")[1]
-            if result_text.startswith("json"):
-                result_text = result_text[4:]
-
-        result = json.loads(result_text)
+            response_format=command_response_format(catalog.command_names),
+            max_tokens=COMMAND_MAX_TOKENS
+        ))
         return {
             "command": result.get("command", "Unknown"),
             "confidence": result.get("confidence", 0.5)
@@ -438,145 +462,9 @@ async def classify_intent(text: str) -> dict:
         return fallback_result
 
 
-def fallback_classify(text: str) -> dict:
-    """키워드 기반 폴백 분류 (시스템 명령만 - 스킬은 별도 처리)"""
-    text_lower = text.lower()
-
-    # 긴 키워드를 먼저 매칭하도록 순서 조정!
-    keyword_map = {
-        # 메인 메뉴 관련 (긴 것 먼저)
-        "메인 메뉴": "GoToMainMenu",
-        "메인메뉴": "GoToMainMenu",
-        "메인으로": "GoToMainMenu",
-        # 게임 시작 관련 (긴 것 먼저)
-        "게임 시작": "StartGame",
-        "게임시작": "StartGame",
-        # 스토리 모드 관련 (긴 것 먼저)
-        "스토리 모드": "SelectStoryMode",
-        "스토리모드": "SelectStoryMode",
-        "스토리": "SelectStoryMode",
-        # 무한 모드 관련 (긴 것 먼저)
-        "무한 모드": "SelectEndlessMode",
-        "무한모드": "SelectEndlessMode",
-        "무한": "SelectEndlessMode",
-        "엔드리스": "SelectEndlessMode",
-        # 뒤로가기 관련 (긴 것 먼저)
-        "뒤로가기": "GoBack",
-        "뒤로": "GoBack",
-        # 일반 명령어
-        "설정": "OpenSettings",
-        "옵션": "OpenSettings",
-        "세팅": "OpenSettings",
-        "메뉴": "OpenMenu",
-        "일시정지": "PauseGame",
-        "퍼즈": "PauseGame",
-        "계속": "ResumeGame",
-        "재개": "ResumeGame",
-        "재시작": "RestartGame",
-        "재도전": "RestartGame",
-        "인벤토리": "OpenInventory",
-        "가방": "OpenInventory",
-        "지도": "OpenMap",
-        "맵": "OpenMap",
-        "도움말": "ShowHelp",
-        "도와": "ShowHelp",
-        "상점": "OpenStore",
-        "스토어": "OpenStore",
-        "플레이": "StartGame",
-        "시작": "StartGame",
-        "종료": "QuitGame",
-        "끝내기": "QuitGame",
-        "나가기": "QuitGame",
-        "메인": "GoToMainMenu",
-        "닫기": "CloseSettings",
-        # Options 탭 전환 (구체적인 것 먼저)
-        "오디오 탭": "ShowAudioTab",
-        "오디오탭": "ShowAudioTab",
-        "오디오": "ShowAudioTab",
-        "그래픽 탭": "ShowGraphicsTab",
-        "그래픽탭": "ShowGraphicsTab",
-        "그래픽": "ShowGraphicsTab",
-        "언어 탭": "ShowLanguageTab",
-        "언어탭": "ShowLanguageTab",
-        "언어": "ShowLanguageTab",
-        "게임 탭": "ShowGameTab",
-        "게임탭": "ShowGameTab",
-        # Options 섹션 명령
-        "음성인식 펼쳐": "ExpandVoiceRecognition",
-        "음성인식 열어": "ExpandVoiceRecognition",
-        "음성인식 접어": "CollapseVoiceRecognition",
-        "음성인식 닫아": "CollapseVoiceRecognition",
-        "키설정 펼쳐": "ExpandKeyBinding",
-        "키설정 열어": "ExpandKeyBinding",
-        "키바인딩 펼쳐": "ExpandKeyBinding",
-        "키설정 접어": "CollapseKeyBinding",
-        "키설정 닫아": "CollapseKeyBinding",
-        "키바인딩 접어": "CollapseKeyBinding",
-        # 튜토리얼 및 챕터 선택
-        "튜토리얼": "SelectTutorial",
-        "챕터 0": "SelectTutorial",
-        # 챕터명 (7대 죄악)
-        "교만": "SelectChapter1",
-        "탐욕": "SelectChapter2",
-        "색욕": "SelectChapter3",
-        "질투": "SelectChapter4",
-        "폭식": "SelectChapter5",
-        "분노": "SelectChapter6",
-        "나태": "SelectChapter7",
-        # 챕터 번호 (숫자가 큰 것 먼저, 공백 있음/없음 모두)
-        "챕터12": "SelectChapter12",
-        "챕터 12": "SelectChapter12",
-        "챕터11": "SelectChapter11",
-        "챕터 11": "SelectChapter11",
-        "챕터10": "SelectChapter10",
-        "챕터 10": "SelectChapter10",
-        "챕터9": "SelectChapter9",
-        "챕터 9": "SelectChapter9",
-        "챕터8": "SelectChapter8",
-        "챕터 8": "SelectChapter8",
-        "챕터7": "SelectChapter7",
-        "챕터 7": "SelectChapter7",
-        "챕터6": "SelectChapter6",
-        "챕터 6": "SelectChapter6",
-        "챕터5": "SelectChapter5",
-        "챕터 5": "SelectChapter5",
-        "챕터4": "SelectChapter4",
-        "챕터 4": "SelectChapter4",
-        "챕터3": "SelectChapter3",
-        "챕터 3": "SelectChapter3",
-        "챕터2": "SelectChapter2",
-        "챕터 2": "SelectChapter2",
-        "챕터1": "SelectChapter1",
-        "챕터 1": "SelectChapter1",
-        "챕터0": "SelectTutorial",
-        # InGame 방향 전환 명령 (이동보다 먼저 체크해야 함)
-        "왼쪽으로 돌아": "TurnLeft",
-        "왼쪽 돌아": "TurnLeft",
-        "오른쪽으로 돌아": "TurnRight",
-        "오른쪽 돌아": "TurnRight",
-        # InGame 이동 명령 (긴 것 먼저)
-        "왼쪽으로 이동": "MoveLeft",
-        "왼쪽 이동": "MoveLeft",
-        "왼쪽으로 가": "MoveLeft",
-        "왼쪽으로": "MoveLeft",
-        "왼쪽": "MoveLeft",
-        "오른쪽으로 이동": "MoveRight",
-        "오른쪽 이동": "MoveRight",
-        "오른쪽으로 가": "MoveRight",
-        "오른쪽으로": "MoveRight",
-        "오른쪽": "MoveRight",
-        "점프": "Jump",
-        "뛰어": "Jump",
-        "정지": "StopMove",
-        "멈춰": "StopMove",
-        "그만": "StopMove",
-    }
-
-    for keyword, command in keyword_map.items():
-        if keyword in text_lower:
-            return {"command": command, "confidence": 0.7}
-
-    return {"command": "Unknown", "confidence": 0.0}
+def fallback_classify(text, context: str = "") -> dict:
+    """키워드 기반 폴백 분류 (현재 카탈로그, pipeline.keyword_classify)"""
+    return keyword_classify(text, catalog_store.current, context)
 
 
 @app.get("/")
@@ -586,18 +474,90 @@ async def root():
         "status": "running",
         "message": "Voice Command Server (Online) is running",
         "version": "online",
-        "openai_available": bool(os.getenv("OPENAI_API_KEY"))
+        "openai_available": bool(os.getenv("OPENAI_API_KEY")),
+        "circuit_breakers": {
+            "whisper_api": whisper_stage.snapshot(),
+            "gpt": llm_stage.snapshot()
+        },
+        "local_whisper_model": local_engine.readiness() if local_engine else None,
+        "keyword_spotter": keyword_spotter.snapshot() if KWS_ENABLED else None,
+        "ipc": ipc_server.snapshot() if ipc_server else None
     }
 
 
+@app.get("/router")
+async def get_router_status():
+    """하이브리드 라우터 상태 (엔진별 대기열, 지연 EWMA, 선택 통계)"""
+    return router.snapshot()
+
+
+def require_admin(x_admin_token: str = Header("")):
+    """관리자 토큰 확인 (ADMIN_TOKEN 미설정 시 엔드포인트 비활성화)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="admin endpoints disabled")
+    if not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+
+@app.post("/kws/enroll", dependencies=[Depends(require_admin)])
+async def enroll_kws_template(audio: UploadFile = File(...), command: str = Form(...)):
+    """이동 명령 키워드 스포터 템플릿 등록 (녹음한 WAV 한 개, command=_reject 면 거부 템플릿)"""
+    if command not in KWS_COMMANDS and command != REJECT_CLASS:
+        raise HTTPException(
+            status_code=400, detail=f"command must be one of {', '.join(KWS_COMMANDS + (REJECT_CLASS,))}"
+        )
+    try:
+        path = await asyncio.to_thread(keyword_spotter.enroll, command, await audio.read())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"invalid audio: {e}")
+    return {"saved": path, "keyword_spotter": keyword_spotter.snapshot()}
+
+
+@app.get("/catalog")
+async def get_catalog_status():
+    """명령/스킬 카탈로그 상태 (버전, 로드 시각, 항목 수, 중복 경고)"""
+    return catalog_store.snapshot()
+
+
+@app.post("/catalog/reload")
+async def reload_catalog():
+    """카탈로그 파일 즉시 다시 로드 (로컬 모델 등은 그대로)"""
+    catalog_store.load()
+    return catalog_store.snapshot()
+
+
+@app.get("/capture")
+async def get_capture_status():
+    """트래픽 캡처 상태"""
+    return capture.snapshot()
+
+
+@app.get("/rate_limits")
+async def get_rate_limits():
+    """클라이언트별 토큰 버킷 잔량 (잔량이 적은 순)"""
+    return {"asr_seconds": asr_limiter.snapshot(), "llm_calls": llm_limiter.snapshot()}
+
+
+@app.get("/shadow")
+async def get_shadow_status():
+    """섀도 모드 비교 통계 (전사/판정 일치율, 양쪽 지연 백분위수)"""
+    return shadow.snapshot()
+
+
 @app.get("/commands")
 async def get_commands():
     """사용 가능한 명령어 목록 반환"""
-    return {"commands": AVAILABLE_FUNCTIONS}
+    return {"commands": catalog_store.current.commands}
+
+
+@app.get("/llm/usage")
+async def get_llm_usage():
+    """GPT 호출별 토큰 사용량 / 지연 시간 통계"""
+    return {"model": LLM_MODEL, "usage": usage_stats.snapshot()}
 
 
 @app.post("/voice_command", response_model=CommandResponse)
-async def process_voice_command(request: AudioRequest):
+async def process_voice_command(request: AudioRequest, http_request: Request):
     """
     음성 명령 처리
     1. Base64 디코딩 → WAV 파일
@@ -608,6 +568,7 @@ async def process_voice_command(request: AudioRequest):
     try:
         # 1. Base64 디코딩
         audio_bytes = base64.b64decode(request.audioData)
+        admit_asr(http_request, audio_bytes)
 
         # 2. 임시 WAV 파일로 저장
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
@@ -631,7 +592,7 @@ async def process_voice_command(request: AudioRequest):
             )
 
         # 6. LLM으로 의도 파악
-        classification = await classify_intent(transcribed_text)
+        classification = await classify_intent(transcribed_text, client_key(http_request, TRUSTED_PROXIES))
 
         return CommandResponse(
             text=transcribed_text,
@@ -639,16 +600,19 @@ async def process_voice_command(request: AudioRequest):
             confidence=classification["confidence"]
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error processing voice command: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/transcribe")
-async def transcribe_only(request: AudioRequest):
+async def transcribe_only(request: AudioRequest, http_request: Request):
     """음성 인식만 수행 (명령 분류 없이)"""
     try:
         audio_bytes = base64.b64decode(request.audioData)
+        admit_asr(http_request, audio_bytes)
 
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
             f.write(audio_bytes)
@@ -659,205 +623,142 @@ async def transcribe_only(request: AudioRequest):
 
         return {"text": transcribed_text}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# 컨텍스트 키워드가 없을 때 사용하는 전역 시스템 명령 키워드 (하위 호환성 유지)
+GLOBAL_SYSTEM_KEYWORDS = "설정, 옵션, 메뉴, 일시정지, 멈춰, 계속, 재시작, 재도전, 인벤토리, 지도, 게임 시작, 플레이, 스토리 모드, 무한 모드, 엔드리스, 뒤로, 상점, 튜토리얼, 메인 메뉴, 챕터 0, 챕터 1, 챕터 2, 챕터 3, 챕터 4, 챕터 5, 챕터 6, 챕터 7, 챕터 8, 챕터 9, 챕터 10, 챕터 11, 챕터 12"
+
+
+def whisper_prompt(skills: str, context_keywords: str) -> str:
+    """Whisper 인식 힌트 프롬프트 (컨텍스트별 키워드가 있으면 사용, 아니면 전역 키워드)"""
+    system_keywords = context_keywords or GLOBAL_SYSTEM_KEYWORDS
+    if skills:
+        return f"게임 음성 명령입니다. 시스템 명령: {system_keywords}. 스킬: {skills}"
+    return f"게임 음성 명령입니다. 시스템 명령: {system_keywords}"
+
+
 @app.post("/recognize")
 async def recognize_skill(
+    http_request: Request,
+    background_tasks: BackgroundTasks,
     audio: UploadFile = File(...),
     language: str = Form("ko"),
     skills: str = Form(""),
     context: str = Form(""),
-    context_keywords: str = Form("")
+    context_keywords: str = Form(""),
+    multi: bool = Form(False)
 ):
     """
     기존 Unity VoiceServerClient와 호환되는 스킬 인식 엔드포인트
     시스템 명령(설정, 메뉴 등)과 스킬 모두 인식
     context: 현재 게임 화면 상태 (예: Menu_MainMenu, InGame_Playing 등)
     context_keywords: 현재 화면에서 사용 가능한 시스템 명령 키워드
+    multi: 연속 명령 발화("왼쪽으로 이동 점프")용. 명령 하나만 인식하는 키워드 스포터를 건너뜀
+    응답의 sequence: 발화 순서의 명령/스킬 목록 (항목별 신뢰도, 어절 범위)
     """
-    import time
-    start_time = time.time()
+    arrival = time.time()
+    content = await audio.read()
+    admit_asr(http_request, content)
+    timings = {}
+    result = await recognize_audio(
+        content, language, skills, context, context_keywords, client_key(http_request, TRUSTED_PROXIES), timings, multi
+    )
+    # 단계별 시간(초): kws, asr(로컬 엔진이면 features 포함), classify, skill_match
+    result["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+
+    # 섀도 모드: 응답을 보낸 뒤 다른 엔진으로 다시 처리해 비교 기록 (KWS 빠른 경로는 제외)
+    if result.get("success") and not result.get("fast_path") and shadow.should_sample():
+        primary = {"text": result["text"], "matched": result["matched_skill"],
+                   "confidence": result["confidence"], "latency": result["processing_time"]}
+        background_tasks.add_task(
+            shadow.run, primary,
+            lambda: shadow_recognize(content, language, skills, whisper_prompt(skills, context_keywords), context),
+            {"context": context, "skills": skills}
+        )
 
-    try:
-        # 1. 오디오 파일 저장
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            content = await audio.read()
-            f.write(content)
-            temp_path = f.name
+    # 트래픽 캡처: 재생 도구(tools/replay.py)로 같은 요청을 같은 간격으로 다시 보낼 수 있도록 기록
+    if capture.should_sample():
+        fields = {"language": language, "skills": skills, "context": context, "context_keywords": context_keywords,
+                  "multi": multi}
+        background_tasks.add_task(
+            capture.record, arrival, fields, content, result, timings, client_key(http_request, TRUSTED_PROXIES)
+        )
+    return result
 
-        print(f"[/recognize] Audio saved, Language: {language}, Context: {context}, Skills: {skills}")
 
-        # 2. Whisper API로 음성 인식
-        # 컨텍스트별 키워드가 제공되면 해당 키워드 사용, 아니면 전체 키워드 사용 (하위 호환성)
-        if context_keywords:
-            system_keywords = context_keywords
-            print(f"[/recognize] Using context-specific keywords: {system_keywords}")
-        else:
-            # 기존 전역 키워드 (하위 호환성 유지)
-            system_keywords = "설정, 옵션, 메뉴, 일시정지, 멈춰, 계속, 재시작, 재도전, 인벤토리, 지도, 게임 시작, 플레이, 스토리 모드, 무한 모드, 엔드리스, 뒤로, 상점, 튜토리얼, 메인 메뉴, 챕터 0, 챕터 1, 챕터 2, 챕터 3, 챕터 4, 챕터 5, 챕터 6, 챕터 7, 챕터 8, 챕터 9, 챕터 10, 챕터 11, 챕터 12"
-            print(f"[/recognize] Using global keywords (no context provided)")
+async def recognize_ipc(header: dict, samples) -> dict:
+    """Unix 소켓 요청 처리 (/recognize 와 같은 판정, 같은 호스트의 신뢰된 클라이언트라 요청 제한/캡처 없음)
 
-        skill_prompt = f"게임 음성 명령입니다. 시스템 명령: {system_keywords}. 스킬: {skills}" if skills else f"게임 음성 명령입니다. 시스템 명령: {system_keywords}"
-        transcribed_text = await transcribe_audio(temp_path, prompt=skill_prompt)
-        print(f"[/recognize] Transcribed: {transcribed_text}")
+    Whisper API 업로드용 WAV 가 필요하므로 샘플을 16kHz WAV 로 다시 감쌈 (HTTP 멀티파트 파싱은 생략)
+    """
+    return await recognize_audio(
+        encode_wav(samples), header.get("language", "ko"), header.get("skills", ""),
+        header.get("context", ""), header.get("context_keywords", ""), "ipc", multi=bool(header.get("multi"))
+    )
 
-        # 3. 임시 파일 삭제
-        os.unlink(temp_path)
 
-        # 3-1. 환각 등으로 텍스트가 비어있으면 실패 반환
-        if not transcribed_text:
-            processing_time = time.time() - start_time
-            return {
-                "success": False,
-                "text": "",
-                "matched_skill": None,
-                "confidence": 0.0,
-                "candidates": [],
-                "processing_time": processing_time,
-                "is_system_command": False,
-                "error": "No speech detected or hallucination filtered"
-            }
-
-        # 스킬 목록 파싱 (먼저 정의해야 InGame_Playing 최적화에서 사용 가능)
-        skill_list = [s.strip() for s in skills.split(",") if s.strip()] if skills else []
-
-        # 4. 인게임 플레이 중에는 이동 명령만 빠르게 확인 후 스킬 매칭
-        if context == "InGame_Playing" and skill_list:
-            # 먼저 이동/점프/정지/방향전환 명령인지 확인 (키워드 매칭)
-            movement_result = fallback_classify(transcribed_text)
-            if movement_result["command"] in ["MoveLeft", "MoveRight", "TurnLeft", "TurnRight", "Jump", "StopMove", "PauseGame", "OpenMenu"]:
-                print(f"[/recognize] InGame_Playing: 이동/시스템 명령 감지: {movement_result}")
-                processing_time = time.time() - start_time
-                return {
-                    "success": True,
-                    "text": transcribed_text,
-                    "matched_skill": f"SYSTEM:{movement_result['command']}",
-                    "confidence": movement_result["confidence"],
-                    "candidates": [{"name": f"SYSTEM:{movement_result['command']}", "confidence": movement_result["confidence"]}],
-                    "processing_time": processing_time,
-                    "is_system_command": True
-                }
-
-            # 이동 명령이 아니면 스킬 매칭 (GPT 분류 건너뛰기)
-            print(f"[/recognize] InGame_Playing: 스킬 매칭만 수행")
-            matched_skill, confidence, candidates = fallback_skill_match(transcribed_text, skill_list)
-            processing_time = time.time() - start_time
-            return {
-                "success": True,
-                "text": transcribed_text,
-                "matched_skill": matched_skill,
-                "confidence": confidence,
-                "candidates": candidates,
-                "processing_time": processing_time,
-                "is_system_command": False
-            }
-
-        # 4-1. 메뉴 컨텍스트에서는 키워드 기반 매칭 먼저 시도 (GPT 오분류 방지)
-        if context and context.startswith("Menu_"):
-            keyword_result = fallback_classify(transcribed_text)
-            if keyword_result["command"] != "Unknown" and keyword_result["confidence"] >= 0.7:
-                print(f"[/recognize] {context}: 키워드 매칭 성공: {keyword_result}")
-                processing_time = time.time() - start_time
-                return {
-                    "success": True,
-                    "text": transcribed_text,
-                    "matched_skill": f"SYSTEM:{keyword_result['command']}",
-                    "confidence": keyword_result["confidence"],
-                    "candidates": [{"name": f"SYSTEM:{keyword_result['command']}", "confidence": keyword_result["confidence"]}],
-                    "processing_time": processing_time,
-                    "is_system_command": True
-                }
-
-        # 4-2. 키워드 매칭 실패 시 GPT 분류
-        system_result = await classify_intent(transcribed_text)
-        print(f"[/recognize] System command check: {system_result}")
-
-        # 시스템 명령이 감지되면 (Unknown이 아니고 신뢰도가 0.5 이상)
-        if system_result["command"] != "Unknown" and system_result["confidence"] >= 0.5:
-            processing_time = time.time() - start_time
-            return {
-                "success": True,
-                "text": transcribed_text,
-                "matched_skill": f"SYSTEM:{system_result['command']}",
-                "confidence": system_result["confidence"],
-                "candidates": [{"name": f"SYSTEM:{system_result['command']}", "confidence": system_result["confidence"]}],
-                "processing_time": processing_time,
-                "is_system_command": True
-            }
-
-        # 5. 시스템 명령이 아니면 스킬 매칭
-        skill_list = [s.strip() for s in skills.split(",") if s.strip()]
-        matched_skill, confidence, candidates = await match_skill_with_llm(
-            transcribed_text, skill_list, language
-        )
+ipc_server = UnixSocketServer(IPC_SOCKET, recognize_ipc) if IPC_SOCKET else None
 
-        processing_time = time.time() - start_time
 
-        return {
-            "success": True,
-            "text": transcribed_text,
-            "matched_skill": matched_skill,
-            "confidence": confidence,
-            "candidates": candidates,
-            "processing_time": processing_time,
-            "is_system_command": False
-        }
+@app.on_event("startup")
+async def start_ipc_server():
+    if ipc_server is not None:
+        try:
+            await ipc_server.start()
+        except Exception as e:
+            print(f"[IPC] Unix 소켓을 열 수 없음 ({IPC_SOCKET}): {e}")
 
-    except Exception as e:
-        import time
-        print(f"[/recognize] Error: {e}")
-        return {
-            "success": False,
-            "text": "",
-            "matched_skill": None,
-            "confidence": 0.0,
-            "candidates": [],
-            "processing_time": time.time() - start_time,
-            "error": str(e)
-        }
+
+@app.on_event("shutdown")
+async def stop_ipc_server():
+    if ipc_server is not None:
+        await ipc_server.stop()
+
+
+async def recognize_audio(content: bytes, language: str, skills: str, context: str, context_keywords: str,
+                          client: str = "", timings: dict = None, multi: bool = False) -> dict:
+    """/recognize 처리 본문 (오디오 바이트 → 인식 결과), timings에 단계별 소요 시간(초) 기록
+
+    인식 자체는 pipeline.recognize (키워드 스포터 빠른 경로 → ASR → 키워드/GPT 판정)
+    multi: 연속 명령 발화. 키워드 스포터 빠른 경로를 쓰지 않고 전사 전체를 명령/스킬 목록으로 분리
+    """
+    timings = timings if timings is not None else {}
+    _request_timings.set(timings)
+    # 컨텍스트별 키워드가 제공되면 해당 키워드 사용, 아니면 전체 키워드 사용 (하위 호환성)
+    print(f"[/recognize] Using {'context-specific' if context_keywords else 'global'} keywords")
+    return await pipeline.recognize(
+        content, language, skills, context, whisper_prompt(skills, context_keywords), client, timings, multi
+    )
 
 
-async def match_skill_with_llm(text: str, skills: list, language: str) -> tuple:
+async def match_skill_with_llm(text: str, skills: list, language: str, client: str = "") -> tuple:
     """LLM을 사용해 텍스트와 가장 유사한 스킬 매칭"""
 
     if not skills:
         return None, 0.0, []
 
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") or not llm_stage.is_available():
+        return fallback_skill_match(text, skills)
+    if not admit_llm(client, "match_skill_with_llm"):
         return fallback_skill_match(text, skills)
 
     try:
         skills_str = ", ".join(skills)
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        # 고정 시스템 프롬프트 → 스킬 목록(세션 단위로 불변) → 발화 순서 (프롬프트가 짧아 제공자 캐시 대상은 아님)
+        result = await llm_stage.call(lambda: chat_json(
+            llm_client, LLM_MODEL, "match_skill",
             messages=[
-                {
-                    "role": "system",
-                    "content": f"""당신은 게임 음성 명령 매칭 시스템입니다.
-사용자의 음성 인식 결과와 가장 유사한 스킬을 찾아주세요.
-
-사용 가능한 스킬: {skills_str}
-
-응답 형식 (JSON만):
-{{"matched_skill": "스킬명 또는 null", "confidence": 0.0~1.0, "candidates": [{{"name": "스킬명", "confidence": 0.9}}]}}"""
-                },
-                {"role": "user", "content": f"음성: \"{text}\""}
+                {"role": "system", "content": build_skill_system_prompt()},
+                {"role": "user", "content": f"사용 가능한 스킬: {skills_str}\n음성: \"{text}\""}
             ],
-            temperature=0,
-            max_tokens=200
-        )
-
-        result_text = response.choices[0].message.content.strip()
-
-        if "```" in result_text:
-            result_text = result_text.split("```")[1]
-            if result_text.startswith("json"):
-                result_text = result_text[4:]
-
-        result = json.loads(result_text)
+            response_format=skill_response_format(tuple(skills)),
+            max_tokens=SKILL_MAX_TOKENS
+        ))
         return result.get("matched_skill"), result.get("confidence", 0.0), result.get("candidates", [])
 
     except Exception as e:
@@ -865,63 +766,21 @@ async def match_skill_with_llm(text: str, skills: list, language: str) -> tuple:
         return fallback_skill_match(text, skills)
 
 
-def fallback_skill_match(text: str, skills: list) -> tuple:
-    """단순 키워드 매칭 폴백"""
-    print(f"[fallback_skill_match] Text: '{text}', Skills: {skills}")
-    text_lower = text.lower()
-    candidates = []
-
-    # 스킬 별칭 (공백 차이, 짧은 형태 등)
-    skill_aliases = {
-        # 매직 미사일
-        "매직미사일": "매직 미사일",
-        "미사일": "매직 미사일",
-        "magic missile": "매직 미사일",
-        # 매직 실드
-        "매직실드": "매직 실드",
-        "실드": "매직 실드",
-        "magic shield": "매직 실드",
-        # 토네이도
-        "회오리": "토네이도",
-        "tornado": "토네이도",
-        # 슬래시
-        "slash": "슬래시",
-        # 익스플로전
-        "폭발": "익스플로전",
-        "explosion": "익스플로전",
-        # 큐어 힐
-        "큐어힐": "큐어 힐",
-        "힐": "큐어 힐",
-        "cure": "큐어 힐",
-    }
+def fallback_skill_match(text, skills: list) -> tuple:
+    """단순 키워드 매칭 폴백 (현재 카탈로그, pipeline.keyword_skill_match)"""
+    return keyword_skill_match(text, skills, catalog_store.current)
 
-    # 별칭으로 먼저 매칭 시도
-    for alias, target_skill in skill_aliases.items():
-        if alias in text_lower:
-            # 대상 스킬이 활성 스킬 목록에 있는지 확인
-            for skill in skills:
-                if skill.lower() == target_skill.lower() or target_skill.lower() in skill.lower():
-                    candidates.append({"name": skill, "confidence": 0.9})
-                    break
 
-    # 직접 매칭
-    for skill in skills:
-        if skill.lower() in text_lower or text_lower in skill.lower():
-            # 이미 candidates에 있으면 건너뛰기
-            if not any(c["name"] == skill for c in candidates):
-                candidates.append({"name": skill, "confidence": 0.8})
-
-    if candidates:
-        # 가장 높은 confidence 순으로 정렬
-        candidates.sort(key=lambda x: x["confidence"], reverse=True)
-        print(f"[fallback_skill_match] Matched: {candidates[0]['name']} (confidence: {candidates[0]['confidence']})")
-        return candidates[0]["name"], candidates[0]["confidence"], candidates
-
-    print(f"[fallback_skill_match] No match found")
-    return None, 0.0, []
+# 인식 파이프라인: 키워드 스포터 → ASR(라우터) → 키워드 매칭 → GPT 분류/스킬 매칭 (요청 제한은 admit_llm)
+pipeline = RecognitionPipeline(
+    transcribe_audio, catalog_store, keyword_spotter if KWS_ENABLED else None,
+    classify=classify_intent, match_skill=match_skill_with_llm
+)
 
 
 if __name__ == "__main__":
     import uvicorn
-    print("Starting Voice Command Server (Online) on port 8000...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # 같은 호스트에서 두 서버를 함께 띄울 때는 PORT로 구분
+    port = int(os.getenv("PORT", "8000"))
+    print(f"Starting Voice Command Server (Online) on port {port}...")
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,66 @@
+"""
+오프라인 배치 인식 도구
+- 오디오 파일 목록(디렉터리 또는 파일 경로)을 서버 없이 RecognitionPipeline.recognize_batch 로 처리
+- 결과는 /recognize 응답과 같은 필드 + 파일 이름 + 단계별 시간, 한 줄에 클립 하나 (JSONL)
+
+사용 예:
+    python batch_recognize.py ./clips --skills "매직 미사일,매직 실드" --context InGame_Playing > results.jsonl
+    python batch_recognize.py a.wav b.wav --model tiny --multi
+"""
+
+import argparse
+import json
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, "VoiceCommand_Offline"))
+
+from pipeline import RecognitionPipeline
+
+AUDIO_EXTENSIONS = (".wav", ".ogg", ".mp3", ".flac", ".m4a")
+
+
+def collect(paths: list) -> list:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="오프라인 배치 인식")
+    parser.add_argument("paths", nargs="+", help="오디오 파일 또는 디렉터리")
+    parser.add_argument("--model", default="base", help="Whisper 모델 크기")
+    parser.add_argument("--weights", default="", help="mmap 가중치 저장소 디렉터리 (tools/export_weights.py)")
+    parser.add_argument("--language", default="ko")
+    parser.add_argument("--skills", default="", help="쉼표로 구분한 활성 스킬")
+    parser.add_argument("--context", default="")
+    parser.add_argument("--context-keywords", default="")
+    parser.add_argument("--multi", action="store_true", help="연속 명령 발화 (조기 종료 없이 끝까지 전사)")
+    parser.add_argument("--short-context", action="store_true", help="클립 길이에 맞는 구간만 인코딩")
+    parser.add_argument("--vad", action="store_true", help="ASR 전에 앞뒤 무음 제거")
+    args = parser.parse_args()
+
+    files = collect(args.paths)
+    pipeline = RecognitionPipeline(
+        model_size=args.model, weight_store_dir=args.weights, short_context=args.short_context, vad=args.vad
+    ).ensure_loaded()
+    timings = []
+    results = pipeline.recognize_batch(
+        files, args.language, [s.strip() for s in args.skills.split(",") if s.strip()],
+        args.context, args.context_keywords, args.multi, timings=timings
+    )
+    for path, result, clip_timings in zip(files, results, timings):
+        line = {"audio": os.path.basename(path), **result,
+                "timings": {stage: round(seconds, 4) for stage, seconds in clip_timings.items()}}
+        print(json.dumps(line, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+오프라인 인식 정확도 / 지연 평가 도구
+- 라벨링된 클립 코퍼스를 /recognize 와 같은 판정 로직(commands.resolve_text)으로 HTTP 없이 처리
+- Whisper 모델 크기(tiny, base, small) × 디코딩 설정 조합을 프로세스 풀로 병렬 평가
+- 명령 정확도, 스킬 정확도, 클립별 지연을 보고하고 목표 정확도를 만족하는 가장 빠른 설정 추천
+- 짧은 클립 모드(잘린 인코딩 구간)와 30초 창의 전사 일치율(parity) 비교
+
+코퍼스 디렉터리에는 manifest.jsonl 이 있어야 함 (한 줄에 클립 하나):
+    {"audio": "jump_01.wav", "command": "Jump"}
+    {"audio": "missile_03.wav", "skill": "매직 미사일", "skills": "매직 미사일,매직 실드"}
+    {"audio": "noise_02.wav"}                       # 아무 것도 인식되지 않아야 하는 클립
+skills를 생략하면 코퍼스에 라벨된 스킬 전체를 활성 스킬로 사용
+
+사용 예:
+    python evaluate.py ./corpus --models tiny,base,small --profiles greedy,early_exit --workers 4
+    python evaluate.py ./corpus --models base --profiles full_ctx,short_ctx      # 짧은 클립 모드 parity
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, "VoiceCommand_Offline"))
+
+from voice_common.local_whisper import DECODE_PROFILES, LocalWhisperEngine
+from commands import build_spotter, resolve_text
+
+# 같은 디코딩 경로에서 인코딩 구간만 다른 설정 쌍 (30초 창, 짧은 구간)
+PARITY_PAIRS = (("full_ctx", "short_ctx"), ("early_exit", "early_exit_short"))
+
+_engine = None
+
+
+def _init_worker(model_size: str, threads: int):
+    """작업자 프로세스 초기화: 모델 로드 + 워밍업 (첫 호출 비용이 지연 측정에 섞이지 않도록)"""
+    import numpy as np
+    import torch
+
+    global _engine
+    torch.set_num_threads(threads)
+    _engine = LocalWhisperEngine(model_size).load()
+    _engine.transcribe(np.zeros(16000, dtype=np.float32))
+
+
+def _evaluate_clip(job: dict) -> dict:
+    import whisper
+
+    skills = job["skills"]
+    duration = len(whisper.load_audio(job["path"])) / 16000.0
+
+    start = time.perf_counter()
+    text = _engine.transcribe_profile(
+        job["path"], job["profile"], build_spotter(tuple(skills)).match, language=job["language"]
+    )
+    resolved = resolve_text(text, skills) if text else {"matched_skill": None, "confidence": 0.0}
+    latency = time.perf_counter() - start
+
+    matched = resolved["matched_skill"]
+    return {
+        "audio": job["audio"],
+        "expected": job["expected"],
+        "kind": job["kind"],
+        "text": text,
+        "matched": matched,
+        "confidence": resolved["confidence"],
+        "correct": matched == job["expected"],
+        "latency": latency,
+        "duration": duration
+    }
+
+
+def load_corpus(corpus_dir: str, language: str) -> list:
+    with open(os.path.join(corpus_dir, "manifest.jsonl"), encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    all_skills = sorted({e["skill"] for e in entries if e.get("skill")})
+    clips = []
+    for entry in entries:
+        if entry.get("command"):
+            expected, kind = f"SYSTEM:{entry['command']}", "command"
+        elif entry.get("skill"):
+            expected, kind = entry["skill"], "skill"
+        else:
+            expected, kind = None, "none"
+        skills = [s.strip() for s in entry["skills"].split(",") if s.strip()] if entry.get("skills") else all_skills
+        clips.append({
+            "audio": entry["audio"],
+            "path": os.path.join(corpus_dir, entry["audio"]),
+            "expected": expected,
+            "kind": kind,
+            "skills": skills,
+            "language": entry.get("language", language)
+        })
+    return clips
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+def accuracy(results: list, kind: str = None):
+    subset = [r for r in results if kind is None or r["kind"] == kind]
+    return sum(r["correct"] for r in subset) / len(subset) if subset else None
+
+
+def summarize(model: str, profile: str, results: list) -> dict:
+    latencies = [r["latency"] for r in results]
+    audio_seconds = sum(r["duration"] for r in results)
+    return {
+        "model": model,
+        "profile": profile,
+        "clips": len(results),
+        "command_accuracy": accuracy(results, "command"),
+        "skill_accuracy": accuracy(results, "skill"),
+        "overall_accuracy": accuracy(results),
+        "mean_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_latency": percentile(latencies, 0.50),
+        "p95_latency": percentile(latencies, 0.95),
+        "rtf": sum(latencies) / audio_seconds if audio_seconds else 0.0
+    }
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def parity(model: str, reference: str, candidate: str, reference_results: list, candidate_results: list) -> dict:
+    """두 설정의 클립별 전사 비교 (공백 무시 문자 오류율, 판정 일치율)"""
+    by_audio = {r["audio"]: r for r in candidate_results}
+    same_text = same_decision = errors = chars = 0
+    mismatches = []
+    for ref in reference_results:
+        cand = by_audio[ref["audio"]]
+        ref_text, cand_text = ref["text"].replace(" ", ""), cand["text"].replace(" ", "")
+        distance = edit_distance(ref_text, cand_text)
+        errors += distance
+        chars += max(1, len(ref_text))
+        same_text += distance == 0
+        same_decision += ref["matched"] == cand["matched"]
+        if ref["matched"] != cand["matched"]:
+            mismatches.append({"audio": ref["audio"], reference: ref["text"], candidate: cand["text"]})
+    n = len(reference_results)
+    return {
+        "model": model,
+        "reference": reference,
+        "candidate": candidate,
+        "text_match": same_text / n if n else None,
+        "cer": errors / chars if chars else None,
+        "decision_match": same_decision / n if n else None,
+        "decision_mismatches": mismatches
+    }
+
+
+def print_parity(report: dict):
+    print(f"[parity] {report['model']} {report['candidate']} vs {report['reference']}: "
+          f"text {report['text_match'] * 100:.1f}%, CER {report['cer'] * 100:.2f}%, "
+          f"decision {report['decision_match'] * 100:.1f}%")
+    for mismatch in report["decision_mismatches"][:10]:
+        print(f"    {mismatch}")
+
+
+def print_summaries(summaries: list):
+    def pct(value):
+        return "   -  " if value is None else f"{value * 100:6.1f}"
+
+    header = f"{'model':<8}{'profile':<12}{'clips':>6}{'cmd%':>8}{'skill%':>8}{'all%':>8}{'p50ms':>9}{'p95ms':>9}{'RTF':>7}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(f"{s['model']:<8}{s['profile']:<12}{s['clips']:>6}  {pct(s['command_accuracy'])}  {pct(s['skill_accuracy'])}"
+              f"  {pct(s['overall_accuracy'])}{s['p50_latency'] * 1000:>9.0f}{s['p95_latency'] * 1000:>9.0f}{s['rtf']:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="오프라인 인식 정확도/지연 평가")
+    parser.add_argument("corpus", help="manifest.jsonl 이 있는 코퍼스 디렉터리")
+    parser.add_argument("--models", default="tiny,base,small")
+    parser.add_argument("--profiles", default="greedy,early_exit", help=f"디코딩 설정: {', '.join(DECODE_PROFILES)}")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads", type=int, default=0, help="작업자당 torch 스레드 수 (0=코어 수/작업자 수)")
+    parser.add_argument("--language", default="ko")
+    parser.add_argument("--target", type=float, default=0.9, help="추천 기준 전체 정확도")
+    parser.add_argument("--output", default="", help="클립별 결과를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    clips = load_corpus(args.corpus, args.language)
+    threads = args.threads or max(1, (os.cpu_count() or 2) // args.workers)
+    profiles = [p for p in args.profiles.split(",") if p in DECODE_PROFILES]
+    print(f"{len(clips)} clips, {args.workers} workers × {threads} threads")
+
+    summaries, details, parity_reports = [], [], []
+    for model in [m.strip() for m in args.models.split(",") if m.strip()]:
+        results_by_profile = {}
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(model, threads)) as pool:
+            for profile in profiles:
+                jobs = [{**clip, "profile": profile} for clip in clips]
+                results = list(pool.map(_evaluate_clip, jobs))
+                results_by_profile[profile] = results
+                summaries.append(summarize(model, profile, results))
+                details.extend({"model": model, "profile": profile, **r} for r in results)
+                print_summaries(summaries[-1:])
+
+        for reference, candidate in PARITY_PAIRS:
+            if reference in results_by_profile and candidate in results_by_profile:
+                parity_reports.append(parity(
+                    model, reference, candidate, results_by_profile[reference], results_by_profile[candidate]
+                ))
+                print_parity(parity_reports[-1])
+
+    print()
+    print_summaries(summaries)
+
+    passing = [s for s in summaries if s["overall_accuracy"] is not None and s["overall_accuracy"] >= args.target]
+    if passing:
+        best = min(passing, key=lambda s: s["p50_latency"])
+        print(f"\n추천: {best['model']} / {best['profile']} "
+              f"(정확도 {best['overall_accuracy'] * 100:.1f}%, p50 {best['p50_latency'] * 1000:.0f}ms)")
+    else:
+        print(f"\n목표 정확도 {args.target * 100:.0f}% 를 만족하는 설정이 없습니다")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summaries": summaries, "parity": parity_reports, "clips": details}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
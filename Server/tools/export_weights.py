@@ -0,0 +1,61 @@
+"""
+Whisper 가중치 → mmap 저장소 내보내기 도구
+- whisper.load_model 로 체크포인트를 한 번 로드해 voice_common.weight_store 형식(<모델>.bin + <모델>.json)으로 저장
+- 서버는 WEIGHT_STORE_DIR 에 저장소가 있으면 체크포인트 대신 mmap 으로 로드
+- CPU 추론용 float32 로 저장 (로드 시 변환 없이 파일 페이지를 그대로 사용)
+
+사용 예:
+    python export_weights.py base --out ../weights
+    python export_weights.py tiny,base --out ../weights --verify
+"""
+
+import argparse
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from voice_common.weight_store import export_store, load_store, store_paths
+
+
+def verify(model, directory: str, name: str):
+    """mmap 로드 결과가 원본 state_dict 와 같은지 확인, 로드 시간 반환"""
+    import torch
+
+    start = time.time()
+    loaded = load_store(directory, name)
+    elapsed = time.time() - start
+    expected = model.state_dict()
+    actual = loaded.state_dict()
+    mismatched = [key for key in expected if key not in actual or not torch.equal(expected[key], actual[key])]
+    if mismatched:
+        raise SystemExit(f"{name}: {len(mismatched)} tensors differ (e.g. {mismatched[0]})")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Whisper weights to a memory-mapped store")
+    parser.add_argument("models", help="쉼표로 구분한 모델 크기 (예: tiny,base)")
+    parser.add_argument("--out", default="weights", help="저장소 디렉터리")
+    parser.add_argument("--verify", action="store_true", help="내보낸 뒤 mmap 으로 다시 로드해 텐서 비교")
+    args = parser.parse_args()
+
+    import whisper
+
+    for name in [m.strip() for m in args.models.split(",") if m.strip()]:
+        start = time.time()
+        model = whisper.load_model(name, device="cpu").float()
+        load_seconds = time.time() - start
+        export_store(model, name, args.out)
+        _, data_path = store_paths(args.out, name)
+        size_mb = os.path.getsize(data_path) / (1024 * 1024)
+        line = f"{name}: {data_path} ({size_mb:.1f} MB), checkpoint load {load_seconds:.2f}s"
+        if args.verify:
+            line += f", mmap load {verify(model, args.out, name):.3f}s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+/recognize 부하 생성기
+- WAV 클립 디렉터리(실제 녹음 또는 합성)를 Unity VoiceServerClient와 같은
+  멀티파트 필드(audio, language, skills, context, context_keywords)로 재생
+- 동시성(closed-loop) 및 도착률(open-loop, 포아송) 단계별로 처리량,
+  p50/p95/p99 지연, 오류율, 버림(shed) 비율 보고
+- 오프라인/온라인 서버 모두 대상 가능 (온라인 서버는 tools/mock_openai.py 로 로컬 모의 가능)
+
+사용 예:
+    python loadgen.py --url http://127.0.0.1:8000 --audio-dir ./clips --concurrency 1,2,4,8
+    python loadgen.py --url http://127.0.0.1:8001 --synthetic 20 --rates 1,2,5 --duration 20
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import struct
+import sys
+import time
+import wave
+
+import httpx
+
+DEFAULT_SKILLS = "매직 미사일,매직 실드,슬래시,토네이도,익스플로전,큐어 힐"
+
+
+def synthetic_clip(seconds: float, seed: int, sample_rate: int = 16000) -> bytes:
+    """합성 음성 대용 클립 (음절 길이의 톤 버스트 + 앞뒤 무음), 16kHz 16bit mono WAV"""
+    rng = random.Random(seed)
+    total = int(seconds * sample_rate)
+    samples = [0] * total
+    position = int(0.2 * sample_rate)
+    while position < total - int(0.2 * sample_rate):
+        burst = int(rng.uniform(0.12, 0.25) * sample_rate)
+        freq = rng.uniform(120, 300)
+        for i in range(min(burst, total - position)):
+            envelope = math.sin(math.pi * i / burst)
+            samples[position + i] = int(8000 * envelope * math.sin(2 * math.pi * freq * i / sample_rate))
+        position += burst + int(rng.uniform(0.03, 0.1) * sample_rate)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f"<{total}h", *samples))
+    return buffer.getvalue()
+
+
+def load_clips(audio_dir: str, synthetic: int) -> list:
+    """(이름, WAV 바이트) 목록"""
+    clips = []
+    if audio_dir:
+        for name in sorted(os.listdir(audio_dir)):
+            if name.lower().endswith(".wav"):
+                with open(os.path.join(audio_dir, name), "rb") as f:
+                    clips.append((name, f.read()))
+    for i in range(synthetic):
+        clips.append((f"synthetic_{i}.wav", synthetic_clip(random.Random(i).uniform(0.8, 3.0), seed=i)))
+    return clips
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+class LevelResult:
+    """부하 단계 하나의 결과 집계"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.latencies = []
+        self.ok = 0
+        self.errors = 0
+        self.shed = 0
+        self.started = time.monotonic()
+        self.finished = self.started
+
+    def add(self, latency: float, outcome: str):
+        self.latencies.append(latency)
+        if outcome == "ok":
+            self.ok += 1
+        elif outcome == "shed":
+            self.shed += 1
+        else:
+            self.errors += 1
+
+    def summary(self) -> dict:
+        total = self.ok + self.errors + self.shed
+        elapsed = max(1e-9, self.finished - self.started)
+        return {
+            "level": self.label,
+            "requests": total,
+            "throughput": round(self.ok / elapsed, 2),
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 1),
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "shed_rate": round(self.shed / total, 4) if total else 0.0
+        }
+
+
+async def send_one(client: httpx.AsyncClient, args, clip: tuple) -> tuple:
+    """/recognize 요청 하나 전송, (지연, 결과 종류) 반환"""
+    name, audio = clip
+    data = {
+        "language": args.language,
+        "skills": args.skills,
+        "context": args.context,
+        "context_keywords": args.context_keywords
+    }
+    start = time.monotonic()
+    try:
+        response = await client.post(
+            f"{args.url}/recognize",
+            files={"audio": ("recording.wav", audio, "audio/wav")},
+            data=data
+        )
+        latency = time.monotonic() - start
+        if response.status_code in (429, 503):
+            return latency, "shed"
+        if response.status_code != 200:
+            return latency, "error"
+        body = response.json()
+        if body.get("shed") or body.get("rejected"):
+            return latency, "shed"
+        # 음성 없음/환각 필터는 서버가 정상 처리한 것이므로 오류로 세지 않음
+        if not body.get("success") and "error" in body and "No speech" not in str(body.get("error")):
+            return latency, "error"
+        return latency, "ok"
+    except Exception:
+        return time.monotonic() - start, "error"
+
+
+async def run_closed_loop(client, args, clips: list, concurrency: int) -> LevelResult:
+    """동시성 고정: 작업자 N개가 응답을 받는 즉시 다음 요청 전송"""
+    result = LevelResult(f"concurrency={concurrency}")
+    deadline = time.monotonic() + args.duration
+    counter = {"sent": 0}
+
+    async def worker(index: int):
+        while time.monotonic() < deadline and (not args.requests or counter["sent"] < args.requests):
+            counter["sent"] += 1
+            clip = clips[(index + counter["sent"]) % len(clips)]
+            latency, outcome = await send_one(client, args, clip)
+            result.add(latency, outcome)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    result.finished = time.monotonic()
+    return result
+
+
+async def run_open_loop(client, args, clips: list, rate: float) -> LevelResult:
+    """도착률 고정: 응답과 무관하게 포아송 간격으로 요청 전송"""
+    result = LevelResult(f"rate={rate}/s")
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.duration
+    tasks = []
+    sent = 0
+
+    async def fire(clip):
+        latency, outcome = await send_one(client, args, clip)
+        result.add(latency, outcome)
+
+    while time.monotonic() < deadline and (not args.requests or sent < args.requests):
+        tasks.append(asyncio.create_task(fire(clips[sent % len(clips)])))
+        sent += 1
+        await asyncio.sleep(rng.expovariate(rate))
+
+    await asyncio.gather(*tasks)
+    result.finished = time.monotonic()
+    return result
+
+
+def print_table(summaries: list):
+    header = f"{'level':<18}{'reqs':>6}{'thrpt/s':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'err%':>7}{'shed%':>7}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(f"{s['level']:<18}{s['requests']:>6}{s['throughput']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}"
+              f"{s['p99_ms']:>9}{s['error_rate'] * 100:>7.1f}{s['shed_rate'] * 100:>7.1f}")
+
+
+def parse_list(value: str, cast) -> list:
+    return [cast(v) for v in value.split(",") if v.strip()] if value else []
+
+
+async def main_async(args) -> list:
+    clips = load_clips(args.audio_dir, args.synthetic)
+    if not clips:
+        sys.exit("재생할 클립이 없습니다 (--audio-dir 또는 --synthetic 지정)")
+    print(f"{len(clips)} clips → {args.url}/recognize (context={args.context or '-'})")
+
+    summaries = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for concurrency in parse_list(args.concurrency, int):
+            summaries.append((await run_closed_loop(client, args, clips, concurrency)).summary())
+            print_table(summaries[-1:])
+        for rate in parse_list(args.rates, float):
+            summaries.append((await run_open_loop(client, args, clips, rate)).summary())
+            print_table(summaries[-1:])
+
+    print()
+    print_table(summaries)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/recognize 부하 생성기")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--audio-dir", default="", help="재생할 WAV 클립 디렉터리")
+    parser.add_argument("--synthetic", type=int, default=0, help="추가할 합성 클립 수")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="closed-loop 동시성 단계 (쉼표 구분, 빈 값이면 생략)")
+    parser.add_argument("--rates", default="", help="open-loop 도착률 단계 req/s (쉼표 구분)")
+    parser.add_argument("--duration", type=float, default=15.0, help="단계별 실행 시간(초)")
+    parser.add_argument("--requests", type=int, default=0, help="단계별 최대 요청 수 (0=제한 없음)")
+    parser.add_argument("--language", default="ko")
+    parser.add_argument("--skills", default=DEFAULT_SKILLS)
+    parser.add_argument("--context", default="InGame_Playing")
+    parser.add_argument("--context-keywords", default="")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="", help="결과를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    summaries = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+OpenAI API 로컬 모의 서버 (부하 테스트용)
+- /v1/audio/transcriptions: 오디오 해시로 정해지는 고정 명령 문구 반환
+- /v1/chat/completions: 요청한 JSON 스키마에 맞는 응답 반환
+- 지연은 로그정규 분포 (중앙값 --latency-ms, 꼬리 --sigma)
+
+사용 예:
+    python mock_openai.py --port 9000 --latency-ms 400
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=mock python ../VoiceCommand_Online/server.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse
+import uvicorn
+
+PHRASES = [
+    "점프", "왼쪽으로 이동", "오른쪽", "멈춰", "매직 미사일", "파이어볼", "매직 실드",
+    "슬래시", "설정", "메인 메뉴", "게임 시작", "챕터 3", "일시정지", "뒤로가기"
+]
+
+app = FastAPI(title="Mock OpenAI")
+settings = {"latency_ms": 400.0, "sigma": 0.4, "error_rate": 0.0}
+
+
+async def simulated_latency():
+    delay = random.lognormvariate(0, settings["sigma"]) * settings["latency_ms"] / 1000.0
+    await asyncio.sleep(delay)
+    return random.random() < settings["error_rate"]
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(
+    file: UploadFile = File(...),
+    model: str = Form("whisper-1"),
+    language: str = Form("ko"),
+    prompt: str = Form("")
+):
+    content = await file.read()
+    if await simulated_latency():
+        return _error(500, "mock upstream error")
+    index = int(hashlib.md5(content).hexdigest(), 16) % len(PHRASES)
+    return {"text": PHRASES[index]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if await simulated_latency():
+        return _error(500, "mock upstream error")
+
+    schema = (body.get("response_format") or {}).get("json_schema", {}).get("schema", {})
+    properties = schema.get("properties", {})
+    if "command" in properties:
+        content = {"command": "Unknown", "confidence": 0.3}
+    else:
+        skills = [s for s in properties.get("matched_skill", {}).get("enum", []) if s]
+        skill = skills[0] if skills else None
+        content = {
+            "matched_skill": skill,
+            "confidence": 0.6 if skill else 0.0,
+            "candidates": [{"name": skill, "confidence": 0.6}] if skill else []
+        }
+
+    prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 2
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 20,
+            "total_tokens": prompt_tokens + 20,
+            "prompt_tokens_details": {"cached_tokens": 0}
+        }
+    }
+
+
+def _error(status: int, message: str):
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": "server_error"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI API 로컬 모의 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="지연 중앙값(ms)")
+    parser.add_argument("--sigma", type=float, default=0.4, help="로그정규 꼬리 두께")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="5xx 응답 비율")
+    args = parser.parse_args()
+
+    settings.update(latency_ms=args.latency_ms, sigma=args.sigma, error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+캡처된 /recognize 트래픽 재생기
+- 서버의 트래픽 캡처(CAPTURE_SAMPLE_RATE, voice_common/capture.py)가 남긴 슬롯 파일을 읽어
+  원래 도착 간격 그대로 같은 오디오/폼 필드로 다시 전송 (다른 서버 빌드에서 지연 회귀 재현)
+- 요청은 도착 순서대로, 첫 요청 기준 절대 시각에 맞춰 전송 (응답을 기다리지 않는 open-loop)
+- 캡처 당시 지연/판정과 재생 결과를 요청별로 비교하고 p50/p95/p99 보고
+
+사용 예:
+    python replay.py --capture-dir ../VoiceCommand_Offline/captures --url http://127.0.0.1:8000
+    python replay.py --capture-dir ./captures --url http://127.0.0.1:8001 --speed 2 --json replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+# 공용 모듈(Server/voice_common) 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voice_common.capture import load_captures
+from loadgen import percentile
+
+
+async def replay_one(client: httpx.AsyncClient, args, header: dict, audio: bytes) -> dict:
+    """캡처 하나 재전송, 원래 결과와 비교한 dict 반환"""
+    headers = {"X-Client-Id": header["client"]} if args.keep_client and header.get("client") else {}
+    original = header.get("result") or {}
+    entry = {
+        "seq": header["seq"],
+        "offset": header["offset"],
+        "context": header["fields"].get("context", ""),
+        "original_latency": original.get("processing_time"),
+        "original_matched": original.get("matched_skill"),
+        "original_timings": header.get("timings", {})
+    }
+    start = time.monotonic()
+    try:
+        response = await client.post(
+            f"{args.url}/recognize",
+            files={"audio": ("recording.wav", audio, "audio/wav")},
+            data={key: str(value) for key, value in header["fields"].items()},
+            headers=headers
+        )
+        entry["latency"] = time.monotonic() - start
+        entry["status"] = response.status_code
+        if response.status_code == 200:
+            body = response.json()
+            entry["matched"] = body.get("matched_skill")
+            entry["success"] = body.get("success", False)
+            entry["shed"] = bool(body.get("shed"))
+    except Exception as e:
+        entry["latency"] = time.monotonic() - start
+        entry["status"] = None
+        entry["error"] = str(e)
+    entry["decision_match"] = entry.get("matched") == entry["original_matched"]
+    return entry
+
+
+async def replay(args, captures: list) -> list:
+    """첫 요청 기준 (도착 시각 차이 / speed) 에 맞춰 전송 (sleep 누적 오차 없이 절대 시각 기준)"""
+    first_arrival = captures[0][0]["arrival"]
+    for header, _ in captures:
+        header["offset"] = round(header["arrival"] - first_arrival, 4)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.monotonic()
+        tasks = []
+        for header, audio in captures:
+            delay = started + header["offset"] / args.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(replay_one(client, args, header, audio)))
+        return await asyncio.gather(*tasks)
+
+
+def summarize(entries: list) -> dict:
+    latencies = [e["latency"] for e in entries]
+    original = [e["original_latency"] for e in entries if e["original_latency"] is not None]
+
+    def ms(values, q):
+        return round(percentile(values, q) * 1000, 1)
+
+    return {
+        "requests": len(entries),
+        "errors": sum(1 for e in entries if e["status"] != 200),
+        "shed": sum(1 for e in entries if e.get("shed")),
+        "decision_match_rate": round(sum(e["decision_match"] for e in entries) / len(entries), 4),
+        "replay_ms": {"p50": ms(latencies, 0.50), "p95": ms(latencies, 0.95), "p99": ms(latencies, 0.99)},
+        "original_ms": {"p50": ms(original, 0.50), "p95": ms(original, 0.95), "p99": ms(original, 0.99)}
+    }
+
+
+def print_entries(entries: list):
+    header = f"{'seq':>6}{'offset':>9}  {'context':<18}{'orig ms':>9}{'replay ms':>11}  {'match':<6}matched"
+    print(header)
+    print("-" * len(header))
+    for e in entries:
+        original_ms = f"{e['original_latency'] * 1000:.0f}" if e["original_latency"] is not None else "-"
+        print(f"{e['seq']:>6}{e['offset']:>9.2f}  {e['context'][:17]:<18}{original_ms:>9}"
+              f"{e['latency'] * 1000:>11.0f}  {'yes' if e['decision_match'] else 'NO':<6}"
+              f"{e.get('matched') or e.get('error') or e['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="캡처된 /recognize 트래픽 재생")
+    parser.add_argument("--capture-dir", required=True, help="서버 CAPTURE_DIR (slot_*.vcap)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 배속 (2=간격을 절반으로)")
+    parser.add_argument("--limit", type=int, default=0, help="앞에서부터 재생할 최대 요청 수 (0=전부)")
+    parser.add_argument("--keep-client", action="store_true",
+                        help="캡처된 클라이언트 키를 X-Client-Id 로 보냄 (클라이언트별 요청 제한 재현, "
+                             "서버 TRUSTED_PROXIES 에 재생 호스트 주소가 있어야 적용됨)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--quiet", action="store_true", help="요청별 표 생략")
+    parser.add_argument("--json", default="", help="요청별 결과와 요약을 저장할 JSON 파일")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        sys.exit("--speed 는 0보다 커야 합니다")
+
+    captures = load_captures(args.capture_dir)
+    if args.limit:
+        captures = captures[:args.limit]
+    if not captures:
+        sys.exit(f"재생할 캡처가 없습니다: {args.capture_dir}")
+    span = captures[-1][0]["arrival"] - captures[0][0]["arrival"]
+    print(f"{len(captures)} captures ({span:.1f}s, x{args.speed}) → {args.url}/recognize")
+
+    entries = asyncio.run(replay(args, captures))
+    if not args.quiet:
+        print_entries(entries)
+    summary = summarize(entries)
+    print()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "requests": entries}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+음성 명령 서버 공용 모듈 (오프라인 / 온라인 서버가 함께 사용)
+"""
@@ -0,0 +1,102 @@
+"""
+오디오 공용 유틸리티
+- WAV 파싱, 모노 다운믹스 + 16kHz 리샘플, 앞뒤 무음 제거, WAV 인코딩
+- 다운샘플 전에 저역 통과 필터(windowed-sinc FIR)로 8kHz 이상을 걸러 음성 대역으로 접히는 에일리어싱 방지
+"""
+
+import io
+import wave
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+
+# 무음 판정: 20ms 프레임 RMS가 최대 RMS의 SILENCE_RATIO 미만이면서 SILENCE_FLOOR 미만
+FRAME_SECONDS = 0.02
+SILENCE_RATIO = 0.05
+SILENCE_FLOOR = 500
+# 발화 앞뒤로 남겨둘 여유 (자음 시작/끝이 잘리지 않도록)
+PAD_SECONDS = 0.15
+
+# 다운샘플용 저역 통과 필터: 차단 주파수 = 목표 나이퀴스트(8kHz) × LOWPASS_CUTOFF, 출력 샘플 기준 LOWPASS_ZEROS 개 영점
+LOWPASS_CUTOFF = 0.9
+LOWPASS_ZEROS = 16
+
+
+def read_wav(audio_bytes: bytes) -> tuple:
+    """WAV 바이트 → (float32 [-1, 1] 샘플 (frames, channels), 샘플레이트)"""
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"지원하지 않는 샘플 크기: {width} bytes")
+
+    return samples.reshape(-1, channels), rate
+
+
+def lowpass_kernel(rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """rate 샘플에 적용할 저역 통과 FIR (Hann 창 sinc, 차단 = target_rate / 2 × LOWPASS_CUTOFF, DC 이득 1)"""
+    cutoff = LOWPASS_CUTOFF * target_rate / 2 / rate  # 입력 샘플레이트 대비 정규화 (사이클/샘플)
+    half = int(np.ceil(LOWPASS_ZEROS * rate / target_rate))
+    taps = np.arange(-half, half + 1)
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hanning(len(taps))
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def to_mono_16k(samples: np.ndarray, rate: int) -> np.ndarray:
+    """모노 다운믹스 후 16kHz로 리샘플 (다운샘플이면 저역 통과 필터 후 선형 보간)"""
+    mono = samples.mean(axis=1)
+    if rate == TARGET_SAMPLE_RATE or len(mono) == 0:
+        return mono
+    if rate > TARGET_SAMPLE_RATE:
+        mono = np.convolve(mono, lowpass_kernel(rate), mode="same")
+    target_len = int(round(len(mono) * TARGET_SAMPLE_RATE / rate))
+    positions = np.linspace(0, len(mono) - 1, target_len)
+    return np.interp(positions, np.arange(len(mono)), mono).astype(np.float32)
+
+
+def trim_silence(mono: np.ndarray, rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """앞뒤 무음 구간 제거 (전체가 무음이면 원본 유지)"""
+    frame = int(rate * FRAME_SECONDS)
+    n_frames = len(mono) // frame
+    if n_frames == 0:
+        return mono
+
+    pcm = mono[:n_frames * frame].reshape(n_frames, frame) * 32768.0
+    rms = np.sqrt(np.mean(pcm * pcm, axis=1))
+    threshold = min(rms.max() * SILENCE_RATIO, SILENCE_FLOOR)
+    voiced = np.nonzero(rms > threshold)[0]
+    if len(voiced) == 0:
+        return mono
+
+    pad = int(rate * PAD_SECONDS)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(mono), (voiced[-1] + 1) * frame + pad)
+    return mono[start:end]
+
+
+def encode_wav(mono: np.ndarray, rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    """float32 모노 → 16bit PCM WAV 바이트"""
+    pcm = (np.clip(mono, -1.0, 1.0) * 32767.0).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def load_wav_16k(audio_bytes: bytes) -> np.ndarray:
+    """WAV 바이트 → 16kHz 모노 float32 샘플"""
+    samples, rate = read_wav(audio_bytes)
+    return to_mono_16k(samples, rate)
@@ -0,0 +1,133 @@
+"""
+/recognize 트래픽 캡처 (성능 문제 재현용)
+- 샘플링된 요청의 오디오, 폼 필드, 도착 시각과 단계별 소요 시간, 결과를 디스크에 기록
+- 고정 개수의 슬롯 파일을 돌려 쓰는 링 버퍼 (가장 오래된 캡처부터 덮어씀, 디스크 사용량 상한)
+- 재생은 tools/replay.py (원래 도착 간격 그대로 다른 서버 빌드에 다시 전송)
+
+슬롯 파일 형식 (slot_0000.vcap):
+    MAGIC(4) + 헤더 길이(4, big-endian) + 헤더 JSON(UTF-8) + 원본 WAV 바이트
+"""
+
+import asyncio
+import json
+import os
+import random
+import struct
+import threading
+
+MAGIC = b"VCAP"
+SLOT_SUFFIX = ".vcap"
+
+
+def write_capture(path: str, header: dict, audio: bytes):
+    """캡처 하나를 임시 파일에 쓴 뒤 교체 (재생 도구가 반쯤 쓰인 파일을 읽지 않도록)"""
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC + struct.pack(">I", len(encoded)) + encoded + audio)
+    os.replace(temp_path, path)
+
+
+def read_capture(path: str) -> tuple:
+    """슬롯 파일 → (헤더 dict, WAV 바이트)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"not a capture file: {path}")
+    (length,) = struct.unpack(">I", data[4:8])
+    header = json.loads(data[8:8 + length].decode("utf-8"))
+    return header, data[8 + length:]
+
+
+def load_captures(directory: str) -> list:
+    """디렉터리의 캡처를 도착 순서로 정렬해 [(헤더, WAV 바이트)] 반환 (읽을 수 없는 파일은 건너뜀)"""
+    captures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SLOT_SUFFIX):
+            continue
+        try:
+            captures.append(read_capture(os.path.join(directory, name)))
+        except Exception as e:
+            print(f"[Capture] {name} 읽기 실패: {e}")
+    captures.sort(key=lambda item: (item[0]["arrival"], item[0]["seq"]))
+    return captures
+
+
+class TrafficRecorder:
+    """요청 샘플링 + 링 버퍼 슬롯 기록 (sample_rate가 0이면 비활성)
+
+    서버가 다시 시작되면 기존 슬롯 중 가장 오래된 것부터 이어서 덮어씀
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, capacity: int = 500):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._next_slot = None
+        self.recorded = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def should_sample(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def _slot_path(self, slot: int) -> str:
+        return os.path.join(self.directory, f"slot_{slot:04d}{SLOT_SUFFIX}")
+
+    def _resume_slot(self) -> int:
+        """빈 슬롯이 있으면 첫 빈 슬롯, 모두 차 있으면 수정 시각이 가장 오래된 슬롯"""
+        os.makedirs(self.directory, exist_ok=True)
+        oldest, oldest_mtime = 0, None
+        for slot in range(self.capacity):
+            path = self._slot_path(slot)
+            if not os.path.exists(path):
+                return slot
+            mtime = os.path.getmtime(path)
+            if oldest_mtime is None or mtime < oldest_mtime:
+                oldest, oldest_mtime = slot, mtime
+        return oldest
+
+    def _write(self, header: dict, audio: bytes):
+        with self._lock:
+            if self._next_slot is None:
+                self._next_slot = self._resume_slot()
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.capacity
+            self._seq += 1
+            header = {"seq": self._seq, **header}
+            write_capture(self._slot_path(slot), header, audio)
+            self.recorded += 1
+
+    async def record(self, arrival: float, fields: dict, audio: bytes, result: dict,
+                     timings: dict = None, client: str = ""):
+        """캡처 기록 (응답 전송 후 BackgroundTasks에서 호출, 파일 쓰기는 스레드에서)
+
+        arrival: 요청 도착 시각 (time.time()), timings: 단계 이름 → 초
+        """
+        header = {
+            "arrival": arrival,
+            "client": client,
+            "fields": fields,
+            "timings": {stage: round(seconds, 4) for stage, seconds in (timings or {}).items()},
+            "result": result
+        }
+        try:
+            await asyncio.to_thread(self._write, header, audio)
+        except Exception as e:
+            self.errors += 1
+            print(f"[Capture] 기록 실패: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "capacity": self.capacity,
+            "recorded": self.recorded,
+            "errors": self.errors
+        }
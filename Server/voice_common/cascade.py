@@ -0,0 +1,111 @@
+"""
+신뢰도 기반 모델 캐스케이드
+- 모든 클립을 작은 모델(tiny 등)로 먼저 한 번 디코딩
+- 디코딩 신뢰도(avg_logprob)가 낮거나, 전사가 명령/스킬에 매칭되지 않거나, 무음/반복 의심이면
+  큰 모델(base, small 등)로 다시 디코딩
+- 확실한 무음은 승격 없이 빈 결과로 채택
+- 단계별 채택/승격 수와 승격 사유, 단계별 지연을 집계 (/cascade 로 노출)
+"""
+
+import math
+import threading
+from collections import deque
+
+from voice_common.local_whisper import COMPRESSION_RATIO_THRESHOLD, LOGPROB_THRESHOLD, NO_SPEECH_THRESHOLD
+
+ESCALATION_REASONS = ("long_audio", "no_speech", "low_logprob", "repetition", "no_match", "low_confidence")
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+class CascadeGate:
+    """1단계(작은 모델) 결과 채택 여부 판정 + 통계
+
+    min_logprob: 1단계 avg_logprob 하한, min_confidence: 명령/스킬 판정 신뢰도 하한
+    """
+
+    def __init__(self, first_model: str, second_model: str, min_logprob: float = -0.6,
+                 min_confidence: float = 0.7, window: int = 1000):
+        self.first_model = first_model
+        self.second_model = second_model
+        self.min_logprob = min_logprob
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.escalated = 0
+        self.reasons = {reason: 0 for reason in ESCALATION_REASONS}
+        self._recent = deque(maxlen=window)
+        self._first_latencies = deque(maxlen=window)
+        self._second_latencies = deque(maxlen=window)
+
+    @staticmethod
+    def is_silence(decoded: dict) -> bool:
+        """transcribe() 와 같은 무음 기준 (큰 모델로 다시 디코딩하지 않고 빈 결과로 채택)"""
+        return decoded["no_speech_prob"] > NO_SPEECH_THRESHOLD and decoded["avg_logprob"] < LOGPROB_THRESHOLD
+
+    def decide(self, decoded: dict, resolved: dict) -> str:
+        """승격 사유 반환, 1단계 결과를 채택하면 None
+
+        decoded: LocalWhisperEngine.decode_once() 결과, resolved: 전사 텍스트의 명령/스킬 판정
+        조기 종료로 확정된 결과는 카탈로그 구문이 이미 포함된 것이므로 신뢰도 기준 없이 채택
+        """
+        if decoded["matched"]:
+            return None
+        if not decoded["text"] or decoded["no_speech_prob"] > NO_SPEECH_THRESHOLD:
+            return "no_speech"
+        if decoded["avg_logprob"] < self.min_logprob:
+            return "low_logprob"
+        if decoded["compression_ratio"] > COMPRESSION_RATIO_THRESHOLD:
+            return "repetition"
+        if not resolved["matched_skill"]:
+            return "no_match"
+        if resolved["confidence"] < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def record(self, reason: str, first_latency: float = None, second_latency: float = None):
+        """한 요청의 결과 기록 (reason이 None이면 1단계 채택)"""
+        with self._lock:
+            self._recent.append(reason is not None)
+            if reason is None:
+                self.accepted += 1
+            else:
+                self.escalated += 1
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            if first_latency is not None:
+                self._first_latencies.append(first_latency)
+            if second_latency is not None:
+                self._second_latencies.append(second_latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.accepted + self.escalated
+            recent = list(self._recent)
+            first_latencies = list(self._first_latencies)
+            second_latencies = list(self._second_latencies)
+            reasons = dict(self.reasons)
+        return {
+            "first_model": self.first_model,
+            "second_model": self.second_model,
+            "min_logprob": self.min_logprob,
+            "min_confidence": self.min_confidence,
+            "requests": total,
+            "accepted": self.accepted,
+            "escalated": self.escalated,
+            "escalation_rate": round(self.escalated / total, 4) if total else None,
+            "recent_escalation_rate": round(sum(recent) / len(recent), 4) if recent else None,
+            "reasons": reasons,
+            "first_latency": {
+                "p50": round(_percentile(first_latencies, 0.50), 3),
+                "p95": round(_percentile(first_latencies, 0.95), 3)
+            },
+            "second_latency": {
+                "p50": round(_percentile(second_latencies, 0.50), 3),
+                "p95": round(_percentile(second_latencies, 0.95), 3)
+            }
+        }
@@ -0,0 +1,248 @@
+"""
+데이터 기반 명령 / 스킬 카탈로그
+- 시스템 명령: voice_common/data/commands.json (이름, 설명, LLM 예시, 키워드, 컨텍스트별 키워드)
+  context_keywords: 특정 게임 컨텍스트에서만 이 명령으로 판정하는 키워드 (같은 키워드의 전역 명령보다 우선)
+  예: "정지" → InGame_Playing 에서는 StopMove, 그 외 PauseGame
+- 스킬: 게임 데이터 Assets/Data/Resources/GameData/Skills.json
+  (voiceKeyword, skillName, skillNameEn, voiceAliases, elementVariants 이름 → voiceKeyword)
+- 로드 시 매칭용 색인으로 컴파일, 파일이 바뀌면 모델 재로드 없이 교체 (CatalogStore.start_watching)
+- 매칭은 정규형(voice_common.normalize) 기준: 키워드는 띄어쓰기/숫자 표기/영어 표기별로 나열하지 않고 한 형태만
+  어절 경계를 지켜 매칭 (어절 중간에서 시작하는 키워드는 무시, breaks(정규형) = 키워드 자체의 띄어쓰기 위치)
+"""
+
+import json
+import os
+import threading
+import time
+
+from voice_common.normalize import canonical, normalize, word_breaks
+
+_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_COMMANDS_PATH = os.path.join(_SERVER_DIR, "voice_common", "data", "commands.json")
+DEFAULT_SKILLS_PATH = os.path.join(
+    os.path.dirname(_SERVER_DIR), "Assets", "Data", "Resources", "GameData", "Skills.json"
+)
+
+
+def _longest_first(entries: dict) -> list:
+    return sorted(entries.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+def _phrase_variants(phrase: str) -> list:
+    """소문자 + 공백 없는 형태 ("매직 미사일" → "매직미사일")"""
+    lowered = phrase.strip().lower()
+    if not lowered:
+        return []
+    compact = lowered.replace(" ", "")
+    return [lowered] if compact == lowered else [lowered, compact]
+
+
+class Catalog:
+    """컴파일된 카탈로그 (불변, 다시 로드하면 새 객체로 교체)
+
+    command_keywords: (키워드, 명령 이름) 표기형(소문자 + 공백 없는 형태), 키워드 길이 내림차순
+    skill_aliases: (별칭, voiceKeyword) 표기형, 별칭 길이 내림차순
+    표기형은 Whisper 출력 형태가 필요한 곳(문법 제한 디코딩 구문, 조기 종료 구문)에서 사용
+    command_index / skill_index: 같은 항목의 정규형 (정규형 길이 내림차순 → 가장 긴 키워드 우선), 텍스트 매칭용
+    컨텍스트별 키워드가 반영된 목록은 keywords_for(context) / index_for(context)
+    """
+
+    def __init__(self, commands: list, skills: list, version: int = 1):
+        self.version = version
+        self.loaded_at = time.time()
+        self.commands = commands
+        self.command_names = tuple(c["name"] for c in commands)
+        self.skills = skills
+        self.warnings = []
+        self._breaks = {}
+
+        keywords = {}
+        index = {}
+        for command in commands:
+            for keyword in command.get("keywords", []):
+                key = self._compile(keyword)
+                if not key:
+                    continue
+                if key in index and index[key] != command["name"]:
+                    self.warnings.append(f"keyword '{keyword}': {index[key]} / {command['name']}")
+                    continue
+                index[key] = command["name"]
+                for variant in _phrase_variants(keyword):
+                    keywords.setdefault(variant, command["name"])
+        self.command_keywords = _longest_first(keywords)
+        self.command_index = _longest_first(index)
+
+        # 컨텍스트별 키워드: 전역 색인에 덮어쓴 컨텍스트 전용 색인
+        context_keywords = {}
+        context_index = {}
+        for command in commands:
+            for context, words in (command.get("context_keywords") or {}).items():
+                overrides = context_index.setdefault(context, {})
+                for keyword in words:
+                    key = self._compile(keyword)
+                    if not key:
+                        continue
+                    if overrides.setdefault(key, command["name"]) != command["name"]:
+                        self.warnings.append(f"keyword '{keyword}' ({context}): {overrides[key]} / {command['name']}")
+                        continue
+                    for variant in _phrase_variants(keyword):
+                        context_keywords.setdefault(context, {}).setdefault(variant, command["name"])
+        self._context_keywords = {
+            context: _longest_first({**keywords, **overrides}) for context, overrides in context_keywords.items()
+        }
+        self._context_index = {
+            context: _longest_first({**index, **overrides}) for context, overrides in context_index.items()
+        }
+
+        aliases = {}
+        skill_index = {}
+        for skill in skills:
+            target = skill.get("voiceKeyword") or skill.get("skillName")
+            if not target:
+                continue
+            phrases = [target, skill.get("skillName"), skill.get("skillNameEn"), *(skill.get("voiceAliases") or [])]
+            phrases += [variant.get("name") for variant in (skill.get("elementVariants") or {}).values()]
+            for phrase in phrases:
+                key = self._compile(phrase or "")
+                if not key:
+                    continue
+                if skill_index.setdefault(key, target) != target:
+                    self.warnings.append(f"alias '{phrase}': {skill_index[key]} / {target}")
+                    continue
+                for alias in _phrase_variants(phrase):
+                    aliases.setdefault(alias, target)
+        self.skill_aliases = _longest_first(aliases)
+        self.skill_index = _longest_first(skill_index)
+
+    def _compile(self, phrase: str) -> str:
+        """키워드/별칭 → 정규형, 띄어쓰기 위치를 breaks 에 누적 ("메인 메뉴"/"메인메뉴" → 같은 정규형, 경계 {2})"""
+        key = canonical(phrase)
+        if key:
+            self._breaks[key] = self._breaks.get(key, frozenset()) | word_breaks(phrase)
+        return key
+
+    def breaks(self, key: str) -> frozenset:
+        """정규형 키워드/별칭 안에서 전사가 띄어 써도 되는 위치"""
+        return self._breaks.get(key, frozenset())
+
+    def keywords_for(self, context: str = "") -> list:
+        """컨텍스트 키워드를 반영한 (표기형 키워드, 명령 이름) 목록"""
+        return self._context_keywords.get(context, self.command_keywords)
+
+    def index_for(self, context: str = "") -> list:
+        """컨텍스트 키워드를 반영한 (정규형 키워드, 명령 이름) 목록"""
+        return self._context_index.get(context, self.command_index)
+
+    def match_command(self, text, context: str = "") -> tuple:
+        """텍스트(문자열 또는 NormalizedText)에 어절 경계에 맞게 포함된 가장 긴 명령 키워드 → (명령 이름, 정규형 키워드)
+
+        context: 게임 컨텍스트 (컨텍스트별 키워드 우선), 없으면 (None, None)
+        """
+        normalized = normalize(text)
+        for keyword, command in self.index_for(context):
+            if normalized.contains(keyword, self.breaks(keyword)):
+                return command, keyword
+        return None, None
+
+    def mentioned_skills(self, text) -> list:
+        """텍스트(문자열 또는 NormalizedText)에 별칭이 포함된 스킬의 voiceKeyword 목록 (긴 별칭 순, 중복 제거)"""
+        normalized = normalize(text)
+        found = []
+        for alias, target in self.skill_index:
+            if target not in found and normalized.contains(alias, self.breaks(alias)):
+                found.append(target)
+        return found
+
+    def snapshot(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "commands": len(self.commands),
+            "command_keywords": len(self.command_index),
+            "skills": len(self.skills),
+            "skill_aliases": len(self.skill_index),
+            "warnings": self.warnings
+        }
+
+
+class CatalogStore:
+    """카탈로그 파일 로드 + 변경 감지 재로드
+
+    다시 로드에 실패하면 (JSON 오류 등) 이전 카탈로그를 그대로 사용
+    """
+
+    def __init__(self, commands_path: str = DEFAULT_COMMANDS_PATH, skills_path: str = DEFAULT_SKILLS_PATH):
+        self.commands_path = commands_path
+        self.skills_path = skills_path
+        self.current = None
+        self.last_error = None
+        self._mtimes = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def _file_mtimes(self) -> tuple:
+        return tuple(
+            os.path.getmtime(path) if os.path.exists(path) else None
+            for path in (self.commands_path, self.skills_path)
+        )
+
+    def load(self):
+        """카탈로그 로드 (첫 로드 실패는 예외, 이후 실패는 로그만 남기고 이전 카탈로그 유지)"""
+        with self._lock:
+            mtimes = self._file_mtimes()
+            try:
+                with open(self.commands_path, encoding="utf-8-sig") as f:
+                    commands = json.load(f)["commands"]
+                skills = []
+                if os.path.exists(self.skills_path):
+                    with open(self.skills_path, encoding="utf-8-sig") as f:
+                        skills = json.load(f)["skills"]
+                else:
+                    print(f"[Catalog] 스킬 데이터 없음: {self.skills_path}")
+                version = self.current.version + 1 if self.current else 1
+                catalog = Catalog(commands, skills, version)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self.current is None:
+                    raise
+                print(f"[Catalog] 다시 로드 실패, 이전 카탈로그 유지: {self.last_error}")
+                self._mtimes = mtimes
+                return self
+
+            self.current = catalog
+            self.last_error = None
+            self._mtimes = mtimes
+        for warning in catalog.warnings:
+            print(f"[Catalog] 중복 키워드/별칭 (앞의 것 사용): {warning}")
+        print(f"[Catalog] v{catalog.version} 로드: 명령 {len(catalog.commands)}개, 스킬 {len(catalog.skills)}개")
+        return self
+
+    def reload_if_changed(self) -> bool:
+        if self._file_mtimes() == self._mtimes:
+            return False
+        self.load()
+        return True
+
+    def start_watching(self, interval: float = 2.0):
+        """interval초마다 파일 수정 시각을 확인해 바뀌면 다시 로드 (0이면 감시 안 함)"""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"[Catalog] 변경 감지 오류: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="catalog-watch", daemon=True)
+        self._watcher.start()
+
+    def snapshot(self) -> dict:
+        return {
+            "commands_path": self.commands_path,
+            "skills_path": self.skills_path,
+            "last_error": self.last_error,
+            **(self.current.snapshot() if self.current else {})
+        }
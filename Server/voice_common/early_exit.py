@@ -0,0 +1,59 @@
+"""
+조기 종료(early-exit) 판정
+- 디코딩 중인 부분 전사 텍스트에 활성 카탈로그(시스템 명령 키워드 + 스킬 이름)의
+  구문이 모호하지 않게 포함되었는지 판정
+- 모호함: 서로 다른 대상을 가리키는 구문이 동시에 포함되었거나,
+  포함된 구문이 다른 대상의 더 긴 구문 일부일 때 (예: "메뉴" → "메뉴 닫" 가능)
+- 구문과 부분 전사 모두 정규형(voice_common.normalize)으로 비교, 어절 경계에 맞는 출현만 인정
+"""
+
+from voice_common.normalize import NormalizedText, canonical, word_breaks
+
+
+class CommandSpotter:
+    """구문 → 대상(명령/스킬) 사전으로 부분 전사 텍스트의 확정 매칭을 찾음"""
+
+    def __init__(self, phrases: dict):
+        self._phrases = []
+        self._breaks = {}
+        for phrase, target in phrases.items():
+            normalized = canonical(phrase)
+            if normalized:
+                self._phrases.append((normalized, target))
+                self._breaks[normalized] = self._breaks.get(normalized, frozenset()) | word_breaks(phrase)
+
+        # 다른 대상의 더 긴 구문에 포함되는 구문은 단독으로 확정할 수 없음
+        self._ambiguous = set()
+        for phrase, target in self._phrases:
+            for other, other_target in self._phrases:
+                if other_target != target and other != phrase and phrase in other:
+                    self._ambiguous.add(phrase)
+                    break
+
+    def match(self, text: str):
+        """확정된 대상 반환 (없거나 모호하면 None)"""
+        # 디코딩 스텝마다 바뀌는 부분 전사라 정규화 캐시를 거치지 않음
+        text = NormalizedText(text)
+        normalized = text.compact
+        if not normalized:
+            return None
+
+        # 마지막 어절은 아직 이어질 수 있으므로 어절 끝으로 보지 않음 ("점 프" → "점 프린트" 일 수 있음)
+        hits = [(phrase, target) for phrase, target in self._phrases
+                if text.contains(phrase, self._breaks[phrase], open_end=True)]
+        if not hits:
+            return None
+
+        longest, target = max(hits, key=lambda h: len(h[0]))
+        if longest in self._ambiguous:
+            return None
+        # 숫자로 끝나는 구문이 부분 전사 끝에 있으면 수가 더 이어질 수 있음 ("챕터 십" → "챕터 십이")
+        if longest[-1].isdigit() and normalized.endswith(longest):
+            return None
+
+        # 가장 긴 구문에 포함되지 않는 다른 대상의 구문이 있으면 명령이 둘 이상
+        for phrase, other_target in hits:
+            if other_target != target and phrase not in longest:
+                return None
+
+        return target
@@ -0,0 +1,157 @@
+"""
+지연 인식(latency-aware) 하이브리드 라우터
+- 로컬 Whisper / Whisper API 등 여러 음성 인식 엔진 중 요청마다 하나를 선택
+- 선택 기준: 최근 관측 지연(EWMA), 대기열 깊이(처리 중 요청 수), 클립 길이, 게임 컨텍스트
+- 선호 엔진이 포화 상태이면 여유 있는 엔진으로 넘김(spill over)
+- 사용 가능한(로드 완료, 서킷 브레이커 닫힘) 엔진만 선택, 없으면 NoEngineAvailable
+- 선택한 엔진이 실패하면 다른 엔진이 사용 가능할 때 한 번 재시도
+"""
+
+import io
+import threading
+import time
+import wave
+
+
+class NoEngineAvailable(Exception):
+    """사용 가능한 음성 인식 엔진이 없음 (로컬 모델 로드 중 + API 서킷 브레이커 열림 등)"""
+    pass
+
+
+def wav_duration(audio_bytes: bytes) -> float:
+    """WAV 바이트의 재생 길이(초) (헤더 파싱 실패 시 16kHz 16bit mono로 추정)"""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except Exception:
+        return max(0.0, (len(audio_bytes) - 44) / 32000.0)
+
+
+class EngineHandle:
+    """라우팅 대상 엔진 하나의 상태 (처리 중 요청 수, 지연 EWMA)"""
+
+    def __init__(self, name: str, transcribe, capacity: int, initial_latency: float, alpha: float = 0.2):
+        self.name = name
+        self.transcribe = transcribe  # async (audio_path, language, prompt) -> str
+        self.capacity = capacity
+        self.alpha = alpha
+        self.available = lambda: True
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._ewma_latency = initial_latency
+        self._requests = 0
+        self._errors = 0
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def has_capacity(self) -> bool:
+        return self._inflight < self.capacity
+
+    def estimated_latency(self) -> float:
+        """지금 요청을 보냈을 때 예상 완료 시간 (대기 + 처리)"""
+        queued_rounds = self._inflight // self.capacity
+        return self._ewma_latency * (queued_rounds + 1)
+
+    async def run(self, audio_path: str, language: str, prompt: str) -> str:
+        with self._lock:
+            self._inflight += 1
+            self._requests += 1
+        start = time.monotonic()
+        try:
+            result = await self.transcribe(audio_path, language, prompt)
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+        latency = time.monotonic() - start
+        with self._lock:
+            self._ewma_latency = self.alpha * latency + (1 - self.alpha) * self._ewma_latency
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "available": self.available(),
+            "inflight": self._inflight,
+            "capacity": self.capacity,
+            "ewma_latency": round(self._ewma_latency, 3),
+            "requests": self._requests,
+            "errors": self._errors
+        }
+
+
+class HybridRouter:
+    """짧은 전투 발화는 로컬, 긴 메뉴 발화는 API로 보내되 부하에 따라 넘김
+
+    short_clip_seconds 이하 클립과 fast_contexts 컨텍스트는 local 선호, 나머지는 api 선호
+    선호 엔진의 예상 지연이 다른 엔진보다 spill_factor 배 이상 크면 다른 엔진 사용
+    """
+
+    def __init__(self, local: EngineHandle = None, api: EngineHandle = None,
+                 short_clip_seconds: float = 2.0, spill_factor: float = 1.5,
+                 fast_contexts: tuple = ("InGame_Playing",)):
+        self.local = local
+        self.api = api
+        self.short_clip_seconds = short_clip_seconds
+        self.spill_factor = spill_factor
+        self.fast_contexts = fast_contexts
+        self.decisions = {}
+
+    def engines(self) -> list:
+        return [e for e in (self.local, self.api) if e is not None]
+
+    def choose(self, duration: float, context: str = "") -> tuple:
+        """(엔진, 선택 이유) 반환"""
+        candidates = [e for e in self.engines() if e.available()]
+        if not candidates:
+            raise NoEngineAvailable(
+                "no speech engine available (" + ", ".join(e.name for e in self.engines()) + ")"
+            )
+        if len(candidates) == 1:
+            return candidates[0], "only_available"
+
+        prefer_local = context in self.fast_contexts or duration <= self.short_clip_seconds
+        preferred, other = (self.local, self.api) if prefer_local else (self.api, self.local)
+        reason = "short_or_combat" if prefer_local else "long_or_menu"
+
+        if not preferred.has_capacity() and other.has_capacity():
+            return other, "spill_capacity"
+        if preferred.estimated_latency() > other.estimated_latency() * self.spill_factor:
+            return other, "spill_latency"
+        return preferred, reason
+
+    async def transcribe(self, audio_path: str, duration: float, context: str = "",
+                         language: str = "ko", prompt: str = "") -> tuple:
+        """엔진을 골라 음성 인식 수행, (텍스트, 엔진 이름) 반환
+
+        선택한 엔진이 실패하면 다른 엔진이 사용 가능할 때 그 엔진으로 한 번 재시도
+        """
+        engine, reason = self.choose(duration, context)
+        self._count(engine, reason)
+        print(f"[Router] {duration:.2f}s clip, context={context or '-'} → {engine.name} ({reason})")
+        try:
+            return await engine.run(audio_path, language, prompt), engine.name
+        except Exception as e:
+            other = next((c for c in self.engines() if c is not engine and c.available()), None)
+            if other is None:
+                raise
+            self._count(other, "retry")
+            print(f"[Router] {engine.name} 실패 ({e}) → {other.name} 재시도")
+            return await other.run(audio_path, language, prompt), other.name
+
+    def _count(self, engine: EngineHandle, reason: str):
+        key = f"{engine.name}:{reason}"
+        self.decisions[key] = self.decisions.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            "engines": {e.name: e.snapshot() for e in self.engines()},
+            "short_clip_seconds": self.short_clip_seconds,
+            "spill_factor": self.spill_factor,
+            "decisions": dict(self.decisions)
+        }
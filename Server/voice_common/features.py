@@ -0,0 +1,167 @@
+"""
+log-mel 특징 추출 (Whisper 인코더 입력)
+- whisper.log_mel_spectrogram 과 같은 값 (STFT 400/160, Hann 창, 멜 필터, log10, 최대값 - 8 클램프)
+- Hann 창과 멜 필터뱅크는 장치별로 한 번만 만들어 재사용 (whisper 는 호출마다 창을 새로 만듦)
+- 길이가 제각각인 클립 여러 개를 0 패딩한 (B, n_samples) 배치 하나로 묶어 STFT/필터 적용을 한 번에 계산
+- n_samples 는 임의 길이 (짧은 클립 모드 구간, VAD 가 자른 길이, 30초 창)
+- prepared(): 배치 작업에서 클립 전체의 특징을 n_samples 별로 미리 한 번에 계산해 두고,
+  이후 클립별 디코딩의 compute() 는 계산 없이 결과를 돌려줌 (배치 시간은 클립 수로 나눠 클립별 "features" 에 기록)
+- 스레드별 누적 소요 시간 → 요청 지표의 "features" 단계 (take_feature_seconds)
+  whisper 의 model.transcribe() 가 내부에서 부르는 log_mel_spectrogram 도 같은 누적값에 기록 (instrument_whisper)
+"""
+
+import contextlib
+import math
+import threading
+import time
+from collections import deque
+
+# whisper.audio 와 같은 값
+N_FFT = 400
+HOP_LENGTH = 160
+
+_local = threading.local()
+
+
+def take_feature_seconds() -> float:
+    """현재 스레드에서 마지막 호출 이후 특징 추출에 쓴 시간(초)을 반환하고 0으로 초기화"""
+    seconds = getattr(_local, "seconds", 0.0)
+    _local.seconds = 0.0
+    return seconds
+
+
+def _add_feature_seconds(seconds: float):
+    _local.seconds = getattr(_local, "seconds", 0.0) + seconds
+
+
+_instrumented = False
+_instrument_lock = threading.Lock()
+
+
+def instrument_whisper():
+    """whisper.transcribe 모듈의 log_mel_spectrogram 을 소요 시간을 기록하는 래퍼로 교체 (한 번만)
+
+    온도 폴백 경로(LocalWhisperEngine.transcribe)는 특징 추출을 whisper 내부에서 하므로
+    감싸지 않으면 "features" 단계가 0으로 기록됨
+    """
+    global _instrumented
+    import importlib
+
+    with _instrument_lock:
+        if _instrumented:
+            return
+        module = importlib.import_module("whisper.transcribe")
+        original = module.log_mel_spectrogram
+
+        def timed_log_mel_spectrogram(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                _add_feature_seconds(time.perf_counter() - start)
+
+        module.log_mel_spectrogram = timed_log_mel_spectrogram
+        _instrumented = True
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+class LogMelFrontend:
+    """모델(n_mels, 장치)별 log-mel 특징 추출기"""
+
+    def __init__(self, n_mels: int = 80, device="cpu", window: int = 1000):
+        self.n_mels = n_mels
+        self.device = device
+        self._window = None
+        self._filters = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.clips = 0
+        self._latencies = deque(maxlen=window)
+
+    def _constants(self) -> tuple:
+        if self._window is None:
+            import torch
+            from whisper.audio import mel_filters
+
+            self._filters = mel_filters(self.device, self.n_mels)
+            self._window = torch.hann_window(N_FFT, device=self.device)
+        return self._window, self._filters
+
+    def compute(self, clips: list, n_samples: int):
+        """16kHz float32 클립 목록 → (B, n_mels, n_samples // HOP_LENGTH) log-mel
+
+        각 클립은 n_samples 로 자르거나 0 패딩 (whisper.pad_or_trim 과 같음), 정규화는 클립별 최대값 기준
+        prepared() 블록 안에서 미리 계산한 클립 하나를 요청하면 저장된 결과를 반환
+        """
+        if len(clips) == 1:
+            entry = getattr(_local, "prepared", {}).pop((id(self), id(clips[0]), n_samples), None)
+            if entry is not None:
+                mel, seconds = entry
+                _add_feature_seconds(seconds)
+                return mel
+        mel, elapsed = self._compute(clips, n_samples)
+        _add_feature_seconds(elapsed)
+        return mel
+
+    @contextlib.contextmanager
+    def prepared(self, clips: list, n_samples_for):
+        """clips 의 특징을 n_samples_for(클립 길이) 값별로 묶어 한 번씩 계산, 블록 안의 compute() 가 재사용
+
+        클립은 객체 동일성으로 찾으므로 디코딩 경로에 같은 배열 객체가 전달돼야 함 (블록 동안 clips 가 참조 유지)
+        """
+        groups = {}
+        for clip in clips:
+            groups.setdefault(n_samples_for(len(clip)), []).append(clip)
+        prepared = {}
+        for n_samples, group in groups.items():
+            mel, elapsed = self._compute(group, n_samples)
+            for i, clip in enumerate(group):
+                prepared[(id(self), id(clip), n_samples)] = (mel[i:i + 1], elapsed / len(group))
+        _local.prepared = prepared
+        try:
+            yield
+        finally:
+            _local.prepared = {}
+
+    def _compute(self, clips: list, n_samples: int) -> tuple:
+        """(log-mel, 소요 시간) — 스레드별 누적값에는 기록하지 않음"""
+        import torch
+
+        start = time.perf_counter()
+        window, filters = self._constants()
+        batch = torch.zeros(len(clips), n_samples, device=self.device)
+        for i, clip in enumerate(clips):
+            clip = torch.as_tensor(clip[:n_samples], dtype=torch.float32)
+            batch[i, :clip.shape[0]] = clip
+
+        stft = torch.stft(batch, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+        magnitudes = stft[..., :-1].abs() ** 2
+        log_spec = torch.clamp(filters @ magnitudes, min=1e-10).log10()
+        peak = log_spec.amax(dim=(1, 2), keepdim=True)
+        mel = (torch.maximum(log_spec, peak - 8.0) + 4.0) / 4.0
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.clips += len(clips)
+            self._latencies.append(elapsed)
+        return mel, elapsed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+        return {
+            "n_mels": self.n_mels,
+            "calls": self.calls,
+            "clips": self.clips,
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 0.50) * 1000, 2),
+                "p95": round(_percentile(latencies, 0.95) * 1000, 2)
+            }
+        }
@@ -0,0 +1,90 @@
+"""
+문법 제한 디코딩 (닫힌 명령 집합용)
+- 허용 구문(메뉴 화면의 명령 키워드, 전투 중 스킬 + 이동 명령)을 Whisper 토큰의 접두사 트라이로 만들고
+  디코딩 스텝마다 트라이에서 이어질 수 있는 토큰만 남김 → 카탈로그 구문만 출력, 구문이 끝나면 바로 EOT
+- 제한된 분포는 항상 어떤 구문이든 만들어내므로, 제한 전 원래 분포에서의 토큰 logprob를 따로 누적해
+  모델이 실제로 그 구문을 들었는지 판단 (raw_avg_logprob 가 낮으면 호출 측이 일반 디코딩으로 폴백)
+"""
+
+import math
+
+
+class PhraseTrie:
+    """구문 → 대상 사전을 토큰 트라이로 변환
+
+    구문마다 앞 공백이 있는 형태(" 설정")와 없는 형태("설정")를 모두 넣음 (Whisper 첫 토큰은 대개 앞 공백 포함)
+    node: {"children": {토큰: node}, "target": 대상 또는 None}
+    """
+
+    def __init__(self, phrases: dict, tokenizer):
+        self.root = {"children": {}, "target": None}
+        self.max_depth = 0
+        self.size = 0
+        for phrase, target in phrases.items():
+            phrase = phrase.strip()
+            if not phrase:
+                continue
+            for variant in (" " + phrase, phrase):
+                tokens = tokenizer.encode(variant)
+                node = self.root
+                for token in tokens:
+                    node = node["children"].setdefault(token, {"children": {}, "target": None})
+                if node["target"] is None:
+                    node["target"] = target
+                    self.size += 1
+                self.max_depth = max(self.max_depth, len(tokens))
+
+    def walk(self, tokens: list):
+        """토큰 경로의 노드 (트라이를 벗어나면 None)"""
+        node = self.root
+        for token in tokens:
+            node = node["children"].get(token)
+            if node is None:
+                return None
+        return node
+
+
+class GrammarFilter:
+    """트라이 밖 토큰을 막는 logit 필터 (greedy 디코딩 전용, whisper LogitFilter 인터페이스)
+
+    막기 전 log-softmax 에서 실제로 고른 토큰의 logprob를 누적 (raw_avg_logprob)
+    """
+
+    def __init__(self, trie: PhraseTrie, eot: int, sample_begin: int):
+        self.trie = trie
+        self.eot = eot
+        self.sample_begin = sample_begin
+        self.steps = 0
+        self.raw_logprob_sum = 0.0
+        self._raw_previous = None
+
+    def apply(self, logits, tokens):
+        import torch
+
+        self.steps += 1
+        sampled = tokens[0, self.sample_begin:].tolist()
+        if self._raw_previous is not None and sampled:
+            self.raw_logprob_sum += float(self._raw_previous[sampled[-1]])
+        self._raw_previous = torch.log_softmax(logits[0].float(), dim=-1)
+
+        node = self.trie.walk(sampled)
+        allowed = list(node["children"]) if node is not None else []
+        if node is not None and node["target"] is not None:
+            allowed.append(self.eot)
+
+        mask = torch.full_like(logits[0], float("-inf"))
+        if allowed:
+            index = torch.tensor(allowed, device=logits.device)
+            mask[index] = logits[0, index]
+        if not allowed or torch.isinf(mask).all():
+            # 트라이를 벗어났거나 허용 토큰이 다른 필터(빈 출력 억제 등)에 모두 막힘 → 종료
+            mask[:] = float("-inf")
+            mask[self.eot] = 0
+        logits[0] = mask
+
+    def raw_avg_logprob(self, n_tokens: int) -> float:
+        """고른 토큰 + 마지막 EOT 의 제한 전 평균 logprob (DecodingResult.avg_logprob 과 같은 정규화)"""
+        total = self.raw_logprob_sum
+        if self._raw_previous is not None:
+            total += float(self._raw_previous[self.eot])
+        return total / (n_tokens + 1) if n_tokens else -math.inf
@@ -0,0 +1,174 @@
+"""
+Unix 도메인 소켓 로컬 IPC (게임과 음성 서버가 같은 Linux 호스트에서 실행될 때)
+- HTTP/멀티파트, WAV 임시 파일 없이 PCM 을 그대로 전달하는 프레임 바이너리 프로토콜
+- 한 연결로 요청을 여러 번 주고받을 수 있음 (요청 → 응답 순서대로)
+
+요청 프레임:
+    b"VCQ1" + 헤더 길이(u32, big-endian) + PCM 길이(u32) + 헤더 JSON(UTF-8) + PCM
+    헤더: {"sample_rate": 16000, "channels": 1, "language", "skills", "context", "context_keywords", "deadline_ms", "multi"}
+    PCM: 16bit signed little-endian, 채널 인터리브
+응답 프레임:
+    b"VCR1" + 본문 길이(u32) + 결과 JSON(UTF-8) (HTTP /recognize 응답과 같은 필드)
+"""
+
+import asyncio
+import json
+import os
+import socket
+import stat
+import struct
+
+import numpy as np
+
+from voice_common.audio import to_mono_16k
+
+REQUEST_MAGIC = b"VCQ1"
+RESPONSE_MAGIC = b"VCR1"
+MAX_HEADER_BYTES = 64 * 1024
+# 48kHz 스테레오 60초 (Whisper 30초 창보다 넉넉하게)
+MAX_PCM_BYTES = 48000 * 2 * 2 * 60
+
+
+class ProtocolError(Exception):
+    """잘못된 프레임 (연결을 끊음)"""
+
+
+def encode_request(header: dict, pcm: bytes) -> bytes:
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return REQUEST_MAGIC + struct.pack(">II", len(encoded), len(pcm)) + encoded + pcm
+
+
+def encode_response(body: dict) -> bytes:
+    encoded = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    return RESPONSE_MAGIC + struct.pack(">I", len(encoded)) + encoded
+
+
+def decode_pcm(header: dict, pcm: bytes) -> np.ndarray:
+    """PCM 바이트 → 16kHz 모노 float32 샘플"""
+    channels = int(header.get("channels", 1))
+    rate = int(header.get("sample_rate", 16000))
+    if channels < 1 or rate <= 0 or len(pcm) % (2 * channels):
+        raise ProtocolError(f"invalid PCM layout (channels={channels}, sample_rate={rate}, bytes={len(pcm)})")
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    return to_mono_16k(samples.reshape(-1, channels), rate)
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple:
+    """요청 프레임 하나 → (헤더 dict, PCM 바이트), 연결이 깔끔하게 닫혔으면 None"""
+    try:
+        prefix = await reader.readexactly(12)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("truncated frame header")
+    if prefix[:4] != REQUEST_MAGIC:
+        raise ProtocolError("bad magic")
+    header_len, pcm_len = struct.unpack(">II", prefix[4:])
+    if header_len > MAX_HEADER_BYTES or pcm_len > MAX_PCM_BYTES:
+        raise ProtocolError(f"frame too large (header={header_len}, pcm={pcm_len})")
+    try:
+        header = json.loads((await reader.readexactly(header_len)).decode("utf-8"))
+        pcm = await reader.readexactly(pcm_len)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("truncated frame body")
+    except ValueError as e:
+        raise ProtocolError(f"bad header: {e}")
+    return header, pcm
+
+
+class UnixSocketServer:
+    """요청마다 handler(헤더, 16kHz 모노 샘플) → 결과 dict 를 호출하는 Unix 소켓 서버
+
+    기존 소켓 파일이 남아 있으면 지우고 다시 만듦 (일반 파일이면 지우지 않고 오류)
+    """
+
+    def __init__(self, path: str, handler, mode: int = 0o660):
+        self.path = path
+        self.handler = handler
+        self.mode = mode
+        self._server = None
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    async def start(self):
+        if not hasattr(asyncio, "start_unix_server"):
+            raise RuntimeError("Unix domain sockets are not supported on this platform")
+        if os.path.exists(self.path):
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                raise RuntimeError(f"{self.path} exists and is not a socket")
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        os.chmod(self.path, self.mode)
+        print(f"[IPC] Unix 소켓 대기: {self.path}")
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    frame = await read_request(reader)
+                except ProtocolError as e:
+                    self.errors += 1
+                    print(f"[IPC] 프로토콜 오류, 연결 종료: {e}")
+                    writer.write(encode_response({"success": False, "error": f"protocol error: {e}"}))
+                    break
+                if frame is None:
+                    break
+                header, pcm = frame
+                self.requests += 1
+                try:
+                    result = await self.handler(header, decode_pcm(header, pcm))
+                except Exception as e:
+                    self.errors += 1
+                    result = {"success": False, "error": str(e)}
+                writer.write(encode_response(result))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def snapshot(self) -> dict:
+        return {
+            "path": self.path,
+            "listening": self._server is not None,
+            "connections": self.connections,
+            "requests": self.requests,
+            "errors": self.errors
+        }
+
+
+def recognize_over_socket(path: str, pcm: bytes, sample_rate: int = 16000, channels: int = 1,
+                          timeout: float = 60.0, **fields) -> dict:
+    """동기 클라이언트 (도구/테스트용, 게임 클라이언트 구현 시 프로토콜 참고)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(encode_request({"sample_rate": sample_rate, "channels": channels, **fields}, pcm))
+        prefix = _recv_exactly(sock, 8)
+        if prefix[:4] != RESPONSE_MAGIC:
+            raise ProtocolError("bad response magic")
+        (length,) = struct.unpack(">I", prefix[4:])
+        return json.loads(_recv_exactly(sock, length).decode("utf-8"))
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ProtocolError("connection closed")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
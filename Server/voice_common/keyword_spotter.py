@@ -0,0 +1,238 @@
+"""
+이동 명령용 초저지연 키워드 스포터 (KWS)
+- 닫힌 명령 집합(MoveLeft, Jump 등)을 Whisper 없이 오디오에서 직접 인식
+- MFCC 특징 + 명령별 녹음 템플릿과의 DTW 거리
+- 확신이 없으면 None 을 반환해 전체 음성 인식으로 넘김
+- 거부 클래스(_reject): 스킬 이름, 잡담, 숨소리 등 이동 명령이 아닌 녹음. 가장 가까우면 거부하고,
+  아니어도 이동 명령과의 거리 비율(margin) 비교에 포함 → 짧은 스킬 발화가 이동 명령으로 넘어가지 않음
+- 발화 길이가 가장 가까운 템플릿 길이와 크게 다르면(MAX_LENGTH_RATIO) 거부
+
+템플릿 디렉터리 구조 (명령 이름별 하위 디렉터리에 16kHz WAV 몇 개씩):
+    kws_templates/Jump/01.wav
+    kws_templates/MoveLeft/01.wav ...
+    kws_templates/_reject/fireball_01.wav ...
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from voice_common.audio import TARGET_SAMPLE_RATE, load_wav_16k, trim_silence
+
+# MFCC 설정 (25ms 창, 10ms 이동)
+FRAME_LENGTH = 400
+FRAME_STEP = 160
+N_FFT = 512
+N_MELS = 26
+N_MFCC = 13
+PRE_EMPHASIS = 0.97
+
+# 이동 명령은 짧은 단어이므로 무음 제거 후 이보다 길면 스포팅하지 않음
+MAX_UTTERANCE_SECONDS = 1.6
+# 발화 프레임 수 / 가장 가까운 템플릿 프레임 수 허용 범위 (1/비율 ~ 비율)
+MAX_LENGTH_RATIO = 1.6
+
+KWS_COMMANDS = ("MoveLeft", "MoveRight", "TurnLeft", "TurnRight", "Jump", "StopMove", "PauseGame", "OpenMenu")
+# 이동 명령이 아닌 발화의 템플릿 디렉터리 이름
+REJECT_CLASS = "_reject"
+
+
+def _mel_filterbank() -> np.ndarray:
+    """(N_MELS, N_FFT // 2 + 1) 삼각 멜 필터뱅크"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0), hz_to_mel(TARGET_SAMPLE_RATE / 2), N_MELS + 2)
+    bins = np.floor((N_FFT + 1) * mel_to_hz(mel_points) / TARGET_SAMPLE_RATE).astype(int)
+    filters = np.zeros((N_MELS, N_FFT // 2 + 1), dtype=np.float32)
+    for m in range(1, N_MELS + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        for k in range(left, center):
+            filters[m - 1, k] = (k - left) / max(1, center - left)
+        for k in range(center, right):
+            filters[m - 1, k] = (right - k) / max(1, right - center)
+    return filters
+
+
+def _dct_matrix() -> np.ndarray:
+    """(N_MFCC, N_MELS) DCT-II 행렬 (직교 정규화)"""
+    n = np.arange(N_MELS)
+    k = np.arange(N_MFCC)[:, None]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * N_MELS)) * np.sqrt(2.0 / N_MELS)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+# 창/필터뱅크/DCT 는 한 번만 계산
+_WINDOW = np.hamming(FRAME_LENGTH).astype(np.float32)
+_MEL_FILTERS = _mel_filterbank()
+_DCT = _dct_matrix()
+
+
+def mfcc(samples: np.ndarray) -> np.ndarray:
+    """16kHz 모노 샘플 → (프레임 수, N_MFCC) MFCC (발화 단위 평균 정규화)"""
+    if len(samples) < FRAME_LENGTH:
+        samples = np.pad(samples, (0, FRAME_LENGTH - len(samples)))
+    emphasized = np.append(samples[0], samples[1:] - PRE_EMPHASIS * samples[:-1])
+    n_frames = 1 + (len(emphasized) - FRAME_LENGTH) // FRAME_STEP
+    indices = np.arange(FRAME_LENGTH)[None, :] + FRAME_STEP * np.arange(n_frames)[:, None]
+    frames = emphasized[indices] * _WINDOW
+    power = np.abs(np.fft.rfft(frames, N_FFT)) ** 2 / N_FFT
+    log_mel = np.log(power @ _MEL_FILTERS.T + 1e-10)
+    features = log_mel @ _DCT.T
+    return (features - features.mean(axis=0)).astype(np.float32)
+
+
+def batched_dtw(query: np.ndarray, templates: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """질의 하나와 템플릿 여러 개의 DTW 거리 (경로 길이로 정규화)
+
+    query: (n, d), templates: (t, m, d) 길이 m으로 패딩, lengths: (t,) 실제 길이
+    행 단위로 진행하며 같은 행 안의 가로 이동은 min-plus 누적(최솟값 누적)으로 벡터화:
+    D[i, j] = S[j] + min_{k<=j}(A[k] - S[k]),  A = c[i] + min(D[i-1, j], D[i-1, j-1]),  S = cumsum(c[i])
+    """
+    n = query.shape[0]
+    cost = np.sqrt(((query[None, :, None, :] - templates[:, None, :, :]) ** 2).sum(axis=-1))  # (t, n, m)
+
+    previous = np.cumsum(cost[:, 0, :], axis=1)
+    for i in range(1, n):
+        row = cost[:, i, :]
+        diagonal = np.concatenate([np.full((row.shape[0], 1), np.inf, dtype=row.dtype), previous[:, :-1]], axis=1)
+        from_above = row + np.minimum(previous, diagonal)
+        prefix = np.cumsum(row, axis=1)
+        previous = prefix + np.minimum.accumulate(from_above - prefix, axis=1)
+
+    distances = previous[np.arange(len(lengths)), lengths - 1]
+    return distances / (n + lengths)
+
+
+class KeywordSpotter:
+    """명령별 템플릿을 로드해 짧은 클립을 DTW로 분류
+
+    threshold: 최적 거리 상한 (초과하면 확신 없음)
+    margin: 두 번째로 가까운 다른 명령(또는 거부 클래스) 거리 / 최적 거리 하한 (구분이 확실해야 함)
+    """
+
+    def __init__(self, template_dir: str, threshold: float = 12.0, margin: float = 1.15):
+        self.template_dir = template_dir
+        self.threshold = threshold
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._commands = []
+        self._templates = None
+        self._lengths = None
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._templates is not None
+
+    @property
+    def can_reject(self) -> bool:
+        """거부 클래스 템플릿이 있는지 (없으면 짧은 스킬 발화와 이동 명령을 구분할 근거가 없음)"""
+        return REJECT_CLASS in self._commands
+
+    def load(self):
+        """템플릿 디렉터리에서 명령별 WAV 를 읽어 MFCC 템플릿 구성"""
+        commands, features = [], []
+        if os.path.isdir(self.template_dir):
+            for command in sorted(os.listdir(self.template_dir)):
+                command_dir = os.path.join(self.template_dir, command)
+                if (command not in KWS_COMMANDS and command != REJECT_CLASS) or not os.path.isdir(command_dir):
+                    continue
+                for name in sorted(os.listdir(command_dir)):
+                    if not name.lower().endswith(".wav"):
+                        continue
+                    with open(os.path.join(command_dir, name), "rb") as f:
+                        commands.append(command)
+                        features.append(mfcc(trim_silence(load_wav_16k(f.read()))))
+
+        with self._lock:
+            if not features:
+                self._commands, self._templates, self._lengths = [], None, None
+            else:
+                max_len = max(len(f) for f in features)
+                padded = np.zeros((len(features), max_len, N_MFCC), dtype=np.float32)
+                for i, f in enumerate(features):
+                    padded[i, :len(f)] = f
+                self._commands = commands
+                self._templates = padded
+                self._lengths = np.array([len(f) for f in features])
+
+        print(f"[KWS] 템플릿 {len(features)}개 로드 ({len(set(commands))}개 명령) from {self.template_dir}")
+        return self
+
+    def enroll(self, command: str, audio_bytes: bytes) -> str:
+        """명령(또는 거부 클래스) 템플릿 추가 (WAV 저장 후 다시 로드)"""
+        if command not in KWS_COMMANDS and command != REJECT_CLASS:
+            raise ValueError(f"unknown KWS command: {command}")
+        load_wav_16k(audio_bytes)  # 잘못된 WAV 가 저장되어 이후 로드가 깨지지 않도록 먼저 검증
+        command_dir = os.path.join(self.template_dir, command)
+        os.makedirs(command_dir, exist_ok=True)
+        path = os.path.join(command_dir, f"{int(time.time() * 1000)}.wav")
+        with open(path, "wb") as f:
+            f.write(audio_bytes)
+        self.load()
+        return path
+
+    def spot(self, audio_bytes: bytes):
+        """(명령, 신뢰도, 소요 ms) 반환, 확신이 없으면 명령은 None"""
+        start = time.perf_counter()
+        with self._lock:
+            templates, lengths, commands = self._templates, self._lengths, self._commands
+        if templates is None:
+            return None, 0.0, 0.0
+
+        try:
+            speech = trim_silence(load_wav_16k(audio_bytes))
+        except Exception:
+            return None, 0.0, (time.perf_counter() - start) * 1000
+        if len(speech) > MAX_UTTERANCE_SECONDS * TARGET_SAMPLE_RATE:
+            return None, 0.0, (time.perf_counter() - start) * 1000
+
+        query = mfcc(speech)
+        distances = batched_dtw(query, templates, lengths)
+
+        # 명령별 최소 거리와 그 템플릿 길이
+        best_by_command = {}
+        for command, distance, length in zip(commands, distances, lengths):
+            if distance < best_by_command.get(command, (np.inf, 0))[0]:
+                best_by_command[command] = (float(distance), int(length))
+        reject = best_by_command.pop(REJECT_CLASS, (np.inf, 0))[0]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if not best_by_command:
+            return None, 0.0, elapsed_ms
+        ranked = sorted(best_by_command.items(), key=lambda item: item[1][0])
+        best_command, (best, best_length) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else np.inf
+
+        if best > self.threshold or runner_up / max(best, 1e-6) < self.margin:
+            self.misses += 1
+            return None, 0.0, elapsed_ms
+        length_ratio = len(query) / max(best_length, 1)
+        if reject / max(best, 1e-6) < self.margin or not 1 / MAX_LENGTH_RATIO <= length_ratio <= MAX_LENGTH_RATIO:
+            self.rejected += 1
+            return None, 0.0, elapsed_ms
+
+        self.hits += 1
+        confidence = float(min(0.95, 0.6 + 0.35 * (1.0 - best / self.threshold)))
+        return best_command, confidence, elapsed_ms
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "templates": len(self._commands),
+            "reject_templates": self._commands.count(REJECT_CLASS),
+            "commands": sorted(set(self._commands) - {REJECT_CLASS}),
+            "threshold": self.threshold,
+            "margin": self.margin,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,506 @@
+"""
+로컬 Whisper 엔진
+- 오프라인 서버와 하이브리드(온라인) 서버가 공용으로 사용
+- whisper / torch 는 load() 시점에 import (온라인 전용 설치 환경에서도 모듈 import 가능)
+"""
+
+import threading
+import time
+import warnings
+
+from voice_common.features import LogMelFrontend, instrument_whisper
+from voice_common.grammar import GrammarFilter, PhraseTrie
+from voice_common.weight_store import has_store, load_store
+
+# Whisper 경고 숨기기
+warnings.filterwarnings("ignore", category=UserWarning)
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# transcribe()와 동일한 품질 기준 (조기 종료 경로에서 무음/실패 판정에 사용)
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+# 짧은 클립 모드: 30초 창 대신 클립 길이에 맞는 구간(초)만 인코딩 (인코더 비용이 길이에 비례)
+# 클립 길이 + 여유를 넘는 가장 작은 구간 사용, 가장 큰 구간보다 길면 30초 창
+SHORT_CONTEXT_BUCKETS = (2.0, 4.0, 8.0, 15.0)
+SHORT_CONTEXT_PAD_SECONDS = 0.5
+
+# 문법 제한 디코딩 트라이 캐시 크기 (컨텍스트 + 스킬 조합별)
+GRAMMAR_CACHE_SIZE = 32
+
+# 디코딩 설정 (평가 도구, 섀도 모드에서 이름으로 선택)
+# transcribe: transcribe() 인자 / 그 외: transcribe_until() 경로 (조기 종료, 짧은 클립 모드 여부)
+DECODE_PROFILES = {
+    "greedy": {"transcribe": {}},
+    "beam5": {"transcribe": {"beam_size": 5, "best_of": 5}},
+    "early_exit": {"early_exit": True},
+    "full_ctx": {"early_exit": False},
+    "short_ctx": {"early_exit": False, "short_context": True},
+    "early_exit_short": {"early_exit": True, "short_context": True},
+}
+
+
+def load_audio(audio):
+    """파일 경로면 16kHz float32 로 디코딩 (ffmpeg), 이미 샘플 배열이면 그대로 (IPC 등 파일 없는 경로)"""
+    import whisper
+
+    if isinstance(audio, str):
+        return whisper.load_audio(audio)
+    return audio
+
+
+class EarlyExitFilter:
+    """매 디코딩 스텝마다 부분 전사를 검사해 확정되면 EOT를 강제하는 logit 필터
+
+    whisper.decoding.LogitFilter 와 같은 apply(logits, tokens) 인터페이스
+    cancel_event가 설정되면(클라이언트 연결 종료 등) 즉시 EOT를 강제해 디코딩 중단
+    """
+
+    def __init__(self, tokenizer, sample_begin: int, stop_when=None, cancel_event=None):
+        self.tokenizer = tokenizer
+        self.sample_begin = sample_begin
+        self.stop_when = stop_when
+        self.cancel_event = cancel_event
+        self.matched = None
+        self.cancelled = False
+        self.steps = 0
+
+    def apply(self, logits, tokens):
+        self.steps += 1
+        eot = self.tokenizer.eot
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.cancelled = True
+            logits[:, :] = float("-inf")
+            logits[:, eot] = 0
+            return
+        if self.stop_when is None:
+            return
+        for i in range(tokens.shape[0]):
+            sampled = [t for t in tokens[i, self.sample_begin:].tolist() if t < eot]
+            if not sampled:
+                continue
+            matched = self.stop_when(self.tokenizer.decode(sampled))
+            if matched:
+                self.matched = matched
+                logits[i, :] = float("-inf")
+                logits[i, eot] = 0
+
+
+class _CapturingRanker:
+    """whisper SequenceRanker 래퍼: rank() 입력(오디오별 가설 토큰, 누적 logprob)을 보관"""
+
+    def __init__(self, ranker):
+        self.ranker = ranker
+        self.tokens = None
+        self.sum_logprobs = None
+
+    def rank(self, tokens, sum_logprobs):
+        self.tokens = tokens
+        self.sum_logprobs = sum_logprobs
+        return self.ranker.rank(tokens, sum_logprobs)
+
+
+class LocalWhisperEngine:
+    """로컬 Whisper 모델 래퍼
+
+    모델 추론은 CPU를 모두 사용하므로 한 번에 하나씩만 실행 (lock)
+    state: idle → loading → warming → ready (실패 시 failed)
+    """
+
+    def __init__(self, model_size: str = "base", short_context_buckets: tuple = SHORT_CONTEXT_BUCKETS,
+                 weight_store_dir: str = ""):
+        self.model_size = model_size
+        self.weight_store_dir = weight_store_dir
+        self.weights = None
+        self.short_context_buckets = tuple(sorted(short_context_buckets))
+        self.model = None
+        self.frontend = None
+        self.state = "idle"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._grammar_cache = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        """Whisper 모델 로드 (weight_store_dir 에 내보낸 저장소가 있으면 mmap, 없으면 체크포인트)"""
+        import whisper
+
+        print(f"Loading Whisper model: {self.model_size}")
+        self.state = "loading"
+        start = time.time()
+        if has_store(self.weight_store_dir, self.model_size):
+            self.model = load_store(self.weight_store_dir, self.model_size)
+            self.weights = "mmap"
+        else:
+            if self.weight_store_dir:
+                print(f"가중치 저장소 없음 ({self.weight_store_dir}/{self.model_size}.bin), 체크포인트에서 로드")
+            self.model = whisper.load_model(self.model_size)
+            self.weights = "checkpoint"
+        self.frontend = LogMelFrontend(self.model.dims.n_mels, self.model.device)
+        instrument_whisper()
+        self.load_seconds = time.time() - start
+        self.state = "loaded"
+        print(f"Whisper model '{self.model_size}' loaded successfully! ({self.weights}, {self.load_seconds:.1f}s)")
+        return self
+
+    def ensure_loaded(self):
+        """아직 로드를 시작하지 않았으면(idle) 지금 로드 (워밍업 없이 ready), 이미 로드 중/완료면 그대로 둠
+
+        여러 스레드가 동시에 불러도 한 번만 로드 (배치 작업, 서버 없이 쓰는 파이프라인)
+        """
+        with self._load_lock:
+            if self.state != "idle":
+                return self
+            try:
+                self.load()
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                raise
+            self.state = "ready"
+        return self
+
+    def warm_up(self, seconds: float = 1.0):
+        """합성 오디오로 추론을 한 번 수행 (메모리 할당, 첫 호출 커널 선택 비용을 미리 지불)"""
+        import numpy as np
+
+        self.state = "warming"
+        start = time.time()
+        # 완전한 무음은 디코딩이 바로 끝나므로 약한 잡음 사용
+        audio = (np.random.default_rng(0).standard_normal(int(16000 * seconds)) * 0.01).astype(np.float32)
+        self.transcribe(audio, temperature=0.0)
+        # 특징 추출기의 창/멜 필터 캐시도 미리 생성
+        self.frontend.compute([audio], len(audio))
+        self.warmup_seconds = time.time() - start
+        self.state = "ready"
+        print(f"Whisper model '{self.model_size}' warmed up ({self.warmup_seconds:.1f}s)")
+        return self
+
+    def start_background(self, warmup: bool = True) -> threading.Thread:
+        """백그라운드 스레드에서 로드 + 워밍업 (서버는 바로 포트를 열고 readiness로 상태 보고)"""
+        def run():
+            try:
+                self.load()
+                if warmup:
+                    self.warm_up()
+                else:
+                    self.state = "ready"
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                print(f"Whisper model '{self.model_size}' 로드 실패: {e}")
+
+        with self._load_lock:
+            self.state = "loading"
+        thread = threading.Thread(target=run, name="whisper-load", daemon=True)
+        thread.start()
+        return thread
+
+    def readiness(self) -> dict:
+        return {
+            "state": self.state,
+            "model": self.model_size,
+            "weights": self.weights,
+            "frontend": self.frontend.snapshot() if self.frontend else None,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 2) if self.warmup_seconds is not None else None,
+            "error": self.error
+        }
+
+    def transcribe(self, audio, language: str = "ko", prompt: str = None, **decode_options) -> str:
+        """로컬 Whisper 모델로 음성 인식 (audio: 파일 경로 또는 16kHz float32 배열)
+
+        decode_options: beam_size, best_of 등 whisper DecodingOptions 인자
+        """
+        with self._lock:
+            result = self.model.transcribe(
+                audio,
+                language=language,
+                initial_prompt=prompt or None,
+                fp16=False,  # CPU에서는 False 권장
+                **decode_options
+            )
+        return result["text"].strip()
+
+    def context_seconds(self, n_samples: int):
+        """짧은 클립 모드에서 사용할 인코딩 구간(초), 해당 구간이 없으면 None (30초 창)"""
+        needed = n_samples / 16000.0 + SHORT_CONTEXT_PAD_SECONDS
+        for bucket in self.short_context_buckets:
+            if needed <= bucket:
+                return bucket
+        return None
+
+    @staticmethod
+    def feature_samples(context_seconds: float = None) -> int:
+        """인코딩 구간(초) → log-mel 을 계산할 샘플 수 (없으면 30초 창)"""
+        import whisper
+
+        return int(context_seconds * 16000) if context_seconds else whisper.audio.N_SAMPLES
+
+    def prepare_features(self, clips: list, short_context: bool = False):
+        """배치 디코딩 전에 clips 의 log-mel 을 인코딩 구간별로 한 번에 계산 (컨텍스트 매니저, 블록 안의 encode() 가 재사용)"""
+        return self.frontend.prepared(
+            clips, lambda n: self.feature_samples(self.context_seconds(n) if short_context else None)
+        )
+
+    def encode(self, audio, context_seconds: float = None):
+        """오디오 → 인코더 출력 (1, 프레임, 차원)
+
+        context_seconds가 있으면 그 길이로 자른 log-mel만 인코딩하고 위치 임베딩도 앞부분만 사용
+        (디코더의 cross-attention은 길이에 무관하므로 그대로 사용 가능)
+        """
+        import torch.nn.functional as F
+        from torch.profiler import record_function
+
+        n_samples = self.feature_samples(context_seconds)
+        with record_function("voice.log_mel"):
+            mel = self.frontend.compute([audio], n_samples)
+
+        with record_function("voice.encode"):
+            if not context_seconds:
+                return self.model.embed_audio(mel)
+            encoder = self.model.encoder
+            x = F.gelu(encoder.conv1(mel))
+            x = F.gelu(encoder.conv2(x)).permute(0, 2, 1)
+            x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+            for block in encoder.blocks:
+                x = block(x)
+            return encoder.ln_post(x)
+
+    def transcribe_until(self, audio_path: str, stop_when, language: str = "ko", prompt: str = None,
+                         on_early_exit=None, cancel_event=None, short_context: bool = False) -> tuple:
+        """부분 전사가 확정 매칭되면 디코딩을 조기 종료하는 음성 인식
+
+        audio_path: 파일 경로 또는 16kHz float32 샘플 배열
+        stop_when: 부분 텍스트 → 확정 대상(없으면 None, 조기 종료 없이 한 번 디코딩)
+        on_early_exit: 조기 종료 시 샘플 배열로 호출 (전체 전사 기록을 백그라운드 작업으로 예약하는 용도)
+        cancel_event: 설정되면 디코딩을 중단하고 빈 텍스트 반환
+        short_context: 클립 길이에 맞는 구간만 인코딩 (짧은 명령 음성용)
+        반환: (텍스트, 확정 대상 또는 None)
+        30초를 넘는 오디오나 품질 기준 미달 결과는 일반 transcribe()로 처리
+        """
+        import whisper
+        from torch.profiler import record_function
+
+        # record_function 구간 이름은 torch 프로파일(/admin/profile)에서 단계 구분용
+        with record_function("voice.load_audio"):
+            audio = load_audio(audio_path)
+        if len(audio) > whisper.audio.N_SAMPLES:
+            return self.transcribe(audio, language, prompt), None
+
+        decoded = self.decode_once(audio, stop_when, language, prompt, cancel_event, short_context)
+
+        if decoded["cancelled"]:
+            print(f"[EarlyExit] 취소됨 ({decoded['steps']} steps)")
+            return "", None
+
+        if decoded["matched"]:
+            print(f"[EarlyExit] '{decoded['text']}' → {decoded['matched']} ({decoded['steps']} steps)")
+            if on_early_exit is not None:
+                on_early_exit(audio)
+            return decoded["text"], decoded["matched"]
+
+        if decoded["no_speech_prob"] > NO_SPEECH_THRESHOLD and decoded["avg_logprob"] < LOGPROB_THRESHOLD:
+            return "", None
+
+        if decoded["avg_logprob"] < LOGPROB_THRESHOLD or decoded["compression_ratio"] > COMPRESSION_RATIO_THRESHOLD:
+            # 온도 폴백이 필요한 결과는 transcribe()와 동일한 경로로 재처리
+            return self.transcribe(audio, language, prompt), None
+
+        return decoded["text"], None
+
+    def decode_once(self, audio, stop_when=None, language: str = "ko", prompt: str = None, cancel_event=None,
+                    short_context: bool = False) -> dict:
+        """온도 폴백 없이 greedy 로 한 번만 디코딩 (30초 이하 16kHz 샘플 배열)
+
+        반환: {"text", "matched", "avg_logprob", "no_speech_prob", "compression_ratio", "cancelled", "steps"}
+        품질 기준 판정은 호출 측에서 (transcribe_until, 모델 캐스케이드)
+        """
+        from torch.profiler import record_function
+        from whisper.decoding import DecodingOptions, DecodingTask
+
+        with self._lock:
+            audio_features = self.encode(audio, self.context_seconds(len(audio)) if short_context else None)
+            options = DecodingOptions(
+                task="transcribe",
+                language=language,
+                prompt=prompt or None,
+                temperature=0.0,
+                without_timestamps=True,
+                fp16=False
+            )
+            task = DecodingTask(self.model, options)
+            # 인코딩은 위에서 끝냈으므로 (잘린 길이 포함) 그대로 사용
+            task._get_audio_features = lambda _: audio_features
+            early_exit = EarlyExitFilter(task.tokenizer, task.sample_begin, stop_when, cancel_event)
+            task.logit_filters.append(early_exit)
+            with record_function("voice.decode"):
+                result = task.run(audio_features)[0]
+
+        return {
+            "text": result.text.strip(),
+            "matched": early_exit.matched,
+            "avg_logprob": result.avg_logprob,
+            "no_speech_prob": result.no_speech_prob,
+            "compression_ratio": result.compression_ratio,
+            "cancelled": early_exit.cancelled,
+            "steps": early_exit.steps
+        }
+
+    def transcribe_nbest(self, audio_path: str, n: int = 4, language: str = "ko", prompt: str = None,
+                         cancel_event=None, short_context: bool = False) -> list:
+        """빔 서치로 가설 n개를 디코딩해 [{"text", "avg_logprob"}] 반환 (디코더 순위 순, 같은 텍스트는 하나만)
+
+        무음이거나 취소되면 빈 목록, 30초를 넘는 오디오는 일반 transcribe() 결과 하나
+        """
+        import whisper
+        from torch.profiler import record_function
+        from whisper.decoding import DecodingOptions, DecodingTask
+
+        with record_function("voice.load_audio"):
+            audio = load_audio(audio_path)
+        if len(audio) > whisper.audio.N_SAMPLES:
+            return [{"text": self.transcribe(audio, language, prompt), "avg_logprob": 0.0}]
+
+        with self._lock:
+            audio_features = self.encode(audio, self.context_seconds(len(audio)) if short_context else None)
+            options = DecodingOptions(
+                task="transcribe",
+                language=language,
+                prompt=prompt or None,
+                temperature=0.0,
+                beam_size=n,
+                without_timestamps=True,
+                fp16=False
+            )
+            task = DecodingTask(self.model, options)
+            task._get_audio_features = lambda _: audio_features
+            # 최종 선택 직전의 빔 가설 전체를 가로챔 (기본 ranker 결과는 그대로 사용)
+            ranker = _CapturingRanker(task.sequence_ranker)
+            task.sequence_ranker = ranker
+            cancel = EarlyExitFilter(task.tokenizer, task.sample_begin, None, cancel_event)
+            task.logit_filters.append(cancel)
+            with record_function("voice.decode"):
+                result = task.run(audio_features)[0]
+
+        if cancel.cancelled:
+            print(f"[N-best] 취소됨 ({cancel.steps} steps)")
+            return []
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return []
+
+        hypotheses = {}
+        eot = task.tokenizer.eot
+        for tokens, sum_logprob in zip(ranker.tokens[0], ranker.sum_logprobs[0]):
+            tokens = [t for t in tokens.tolist() if t < eot]
+            text = task.tokenizer.decode(tokens).strip()
+            avg_logprob = sum_logprob / (len(tokens) + 1)  # DecodingResult.avg_logprob 과 같은 정규화
+            if text not in hypotheses or avg_logprob > hypotheses[text]:
+                hypotheses[text] = avg_logprob
+        ranked = sorted(hypotheses.items(), key=lambda item: item[1], reverse=True)
+        return [{"text": text, "avg_logprob": avg_logprob} for text, avg_logprob in ranked]
+
+    def grammar_trie(self, phrases: dict, tokenizer) -> PhraseTrie:
+        """구문 사전 → 토큰 트라이 (같은 구문 집합은 캐시 재사용, 최근 GRAMMAR_CACHE_SIZE개)"""
+        key = tuple(sorted(phrases.items()))
+        trie = self._grammar_cache.pop(key, None)
+        if trie is None:
+            trie = PhraseTrie(phrases, tokenizer)
+            if len(self._grammar_cache) >= GRAMMAR_CACHE_SIZE:
+                self._grammar_cache.pop(next(iter(self._grammar_cache)))
+        self._grammar_cache[key] = trie
+        return trie
+
+    def transcribe_grammar(self, audio_path: str, phrases: dict, language: str = "ko", cancel_event=None,
+                           short_context: bool = False):
+        """허용 구문만 출력하도록 제한한 greedy 디코딩
+
+        phrases: 구문 → 대상 (예: "설정 열어" → "SYSTEM:OpenSettings")
+        반환: {"text", "target", "raw_avg_logprob", "steps"}, 무음/취소/30초 초과면 None
+        raw_avg_logprob: 제한 전 분포 기준 평균 logprob (호출 측에서 기준 미달이면 일반 디코딩으로 폴백)
+        """
+        import whisper
+        from torch.profiler import record_function
+        from whisper.decoding import DecodingOptions, DecodingTask
+
+        with record_function("voice.load_audio"):
+            audio = load_audio(audio_path)
+        if len(audio) > whisper.audio.N_SAMPLES:
+            return None
+
+        with self._lock:
+            audio_features = self.encode(audio, self.context_seconds(len(audio)) if short_context else None)
+            task = DecodingTask(self.model, DecodingOptions(
+                task="transcribe", language=language, temperature=0.0, without_timestamps=True, fp16=False
+            ))
+            trie = self.grammar_trie(phrases, task.tokenizer)
+            if not trie.size:
+                return None
+            # 가장 긴 구문 + EOT 까지만 디코딩
+            task.sample_len = trie.max_depth + 1
+            task._get_audio_features = lambda _: audio_features
+            cancel = EarlyExitFilter(task.tokenizer, task.sample_begin, None, cancel_event)
+            grammar = GrammarFilter(trie, task.tokenizer.eot, task.sample_begin)
+            task.logit_filters += [cancel, grammar]
+            with record_function("voice.decode"):
+                result = task.run(audio_features)[0]
+
+        if cancel.cancelled or result.no_speech_prob > NO_SPEECH_THRESHOLD:
+            return None
+        node = trie.walk(result.tokens)
+        return {
+            "text": result.text.strip(),
+            "target": node["target"] if node is not None else None,
+            "raw_avg_logprob": grammar.raw_avg_logprob(len(result.tokens)),
+            "steps": grammar.steps
+        }
+
+    def transcribe_profile(self, audio_path: str, profile: str, stop_when=None, language: str = "ko",
+                           prompt: str = None, cancel_event=None) -> str:
+        """DECODE_PROFILES 의 이름으로 디코딩 설정을 골라 음성 인식 (전체 전사 백그라운드 기록 없음)
+
+        cancel_event가 주어지면 transcribe() 설정도 취소 가능한 한 번 디코딩으로 처리
+        (greedy → 조기 종료 없는 transcribe_until, 빔 서치 → transcribe_nbest 1위, 온도 폴백은 품질 미달일 때만)
+        """
+        options = DECODE_PROFILES[profile]
+        if "transcribe" in options:
+            if cancel_event is None:
+                return self.transcribe(audio_path, language, prompt, **options["transcribe"])
+            beam_size = options["transcribe"].get("beam_size")
+            if beam_size:
+                hypotheses = self.transcribe_nbest(audio_path, beam_size, language, prompt, cancel_event)
+                return hypotheses[0]["text"] if hypotheses else ""
+            text, _ = self.transcribe_until(audio_path, None, language, prompt, cancel_event=cancel_event)
+            return text
+        text, _ = self.transcribe_until(
+            audio_path, stop_when if options["early_exit"] else None, language=language, prompt=prompt,
+            cancel_event=cancel_event, short_context=options.get("short_context", False)
+        )
+        return text
+
+    def log_full_transcript(self, audio, language: str = "ko", prompt: str = None, cancel_event=None):
+        """조기 종료된 클립의 전체 전사를 로그로 남김 (greedy 한 번, 온도 폴백 없음)
+
+        스케줄러의 background 작업으로 실행, cancel_event가 설정되면(더 급한 요청 도착 등) 중단
+        """
+        try:
+            decoded = self.decode_once(audio, None, language, prompt, cancel_event)
+        except Exception as e:
+            print(f"[EarlyExit] full transcript 오류: {e}")
+            return None
+        if decoded["cancelled"]:
+            print(f"[EarlyExit] full transcript 취소됨 ({decoded['steps']} steps)")
+            return None
+        print(f"[EarlyExit] full transcript: '{decoded['text']}'")
+        return decoded["text"]
@@ -0,0 +1,40 @@
+"""
+N-best 가설 재채점
+- 로컬 디코더의 빔 가설(LocalWhisperEngine.transcribe_nbest) 각각을 활성 문법(시스템 명령 + 요청 스킬)으로 판정
+- 판정 신뢰도 + 음향 점수 차이(1위 가설 대비 avg_logprob 손실)로 다시 순위를 매겨
+  1위 가설이 살짝 틀렸어도 문법에 맞는 가설을 로컬에서 고름 (LLM 왕복 / Unknown 방지)
+"""
+
+
+def rescore(hypotheses: list, resolve, weight: float = 1.0, max_gap: float = 1.0) -> dict:
+    """가설 목록 재채점
+
+    hypotheses: [{"text", "avg_logprob"}] 디코더 순위 순 (1위가 맨 앞)
+    resolve: 텍스트 → {"matched_skill", "confidence", ...} 판정 함수
+    weight: 음향 점수 손실 가중치, max_gap: 1위보다 avg_logprob가 이만큼 넘게 낮은 가설은 제외
+    반환: {"text", "resolved", "rank"(선택된 가설 순위, 0=1위), "hypotheses"(가설별 판정/점수)}
+    """
+    if not hypotheses:
+        return {"text": "", "resolved": resolve(""), "rank": 0, "hypotheses": []}
+
+    best_logprob = hypotheses[0]["avg_logprob"]
+    scored = []
+    chosen = None
+    for rank, hypothesis in enumerate(hypotheses):
+        gap = best_logprob - hypothesis["avg_logprob"]
+        if rank > 0 and gap > max_gap:
+            break
+        resolved = resolve(hypothesis["text"])
+        score = (resolved["confidence"] if resolved["matched_skill"] else 0.0) - weight * max(0.0, gap)
+        scored.append({
+            "text": hypothesis["text"],
+            "avg_logprob": round(hypothesis["avg_logprob"], 4),
+            "matched": resolved["matched_skill"],
+            "confidence": resolved["confidence"],
+            "score": round(score, 4)
+        })
+        if chosen is None or score > chosen[0]:
+            chosen = (score, rank, resolved)
+
+    _, rank, resolved = chosen
+    return {"text": hypotheses[rank]["text"], "resolved": resolved, "rank": rank, "hypotheses": scored}
@@ -0,0 +1,204 @@
+"""
+한국어 전사 텍스트 정규화 (모든 키워드/별칭 매칭 앞 단계)
+- 전사 하나당 한 번 normalize() → NormalizedText, 매처들은 같은 객체를 공유
+  (문자열로 받는 매처도 최근 결과 캐시로 같은 전사를 다시 정규화하지 않음)
+- 정규형(compact): 어절별 정규화 결과를 공백 없이 이어 붙인 문자열
+  카탈로그 키워드/별칭도 같은 canonical() 로 컴파일 → "메인 메뉴"/"메인메뉴", "챕터 1"/"챕터 일"/"chapter 1" 이 한 항목
+
+단계:
+1. 유니코드 NFKC + 소문자 (전각 문자, 영어 대소문자)
+2. 문장 부호 제거 ("점프!" → "점프")
+3. 외래어 정리: 영어 단어 → 카탈로그의 한글 표기 ("menu" → "메뉴"), 흔한 한글 표기 변형 ("쉴드" → "실드")
+4. 숫자: 단위어(챕터, 번째 등) 앞뒤의 한자어/고유어 수사 → 아라비아 숫자 ("챕터 일" → "챕터1", "두 번째" → "2번째")
+5. 공백 접기: 어절 사이 공백 제거 (어절 위치는 word_at 으로 되찾음)
+
+매칭(find/contains)은 어절 경계를 지킴: 구문은 어절 시작에서만 시작하고("바다 시원하다" ≠ "다시"),
+구문이 어절 경계를 넘는 곳은 구문 자체의 띄어쓰기 위치이거나 구문이 어절 끝에서 끝나야 함
+("매직 미사일을" = "매직 미사일", "파이어 볼" = "파이어볼", "나 점 프린트" ≠ "점프")
+"""
+
+import bisect
+import re
+import unicodedata
+from functools import lru_cache
+
+_PUNCTUATION = re.compile(r"[^\w]")
+
+# 영어 단어 → 카탈로그(commands.json, Skills.json)에서 쓰는 한글 표기
+# 번역이 필요한 단어(settings → 설정 등)는 카탈로그에 영어 키워드로 남겨 둠
+LOANWORDS = {
+    "menu": "메뉴", "main": "메인", "chapter": "챕터", "story": "스토리", "mode": "모드",
+    "tutorial": "튜토리얼", "inventory": "인벤토리", "map": "맵", "store": "스토어",
+    "audio": "오디오", "graphic": "그래픽", "graphics": "그래픽", "tab": "탭", "game": "게임",
+    "endless": "엔드리스", "restart": "리스타트", "pause": "퍼즈", "option": "옵션", "options": "옵션",
+    "setting": "세팅", "settings": "세팅", "key": "키", "play": "플레이", "skill": "스킬",
+    "magic": "매직", "missile": "미사일", "shield": "실드", "slash": "슬래시", "explosion": "익스플로전",
+    "tornado": "토네이도", "cure": "큐어", "heal": "힐", "fireball": "파이어볼", "jump": "점프",
+}
+
+# 같은 외래어의 한글 표기 변형 → 카탈로그 표기 (어절 안 부분 문자열 치환)
+SPELLING_VARIANTS = {
+    "쉴드": "실드", "셋팅": "세팅", "매뉴": "메뉴", "튜토리알": "튜토리얼", "그래픽스": "그래픽",
+    "미싸일": "미사일", "스토아": "스토어",
+}
+
+# 수사 앞에 오는 단위어 ("챕터 일") / 뒤에 오는 단위어 ("일 번", "두 번째")
+PREFIX_COUNTERS = ("챕터", "스테이지", "레벨", "단계")
+SUFFIX_COUNTERS = ("번째", "번", "챕터", "단계")
+# 수사 + 단위어 형태지만 수가 아닌 말 ("이번 스킬")
+NOT_NUMERALS = {"이번"}
+
+_SINO_DIGITS = {"일": 1, "이": 2, "삼": 3, "사": 4, "오": 5, "육": 6, "칠": 7, "팔": 8, "구": 9}
+_NATIVE_UNITS = {
+    "하나": 1, "한": 1, "둘": 2, "두": 2, "셋": 3, "세": 3, "석": 3, "넷": 4, "네": 4,
+    "다섯": 5, "여섯": 6, "일곱": 7, "여덟": 8, "아홉": 9,
+}
+_NATIVE_TENS = {"열": 10, "스물": 20, "스무": 20}
+
+
+def numeral_value(word: str):
+    """한자어("십이")/고유어("열두", "첫") 수사 또는 아라비아 숫자 → 정수, 수사가 아니면 None"""
+    if word.isdigit():
+        return int(word)
+    if word in ("영", "공"):
+        return 0
+    if word == "첫":
+        return 1
+    if word in _NATIVE_UNITS:
+        return _NATIVE_UNITS[word]
+    for tens, value in _NATIVE_TENS.items():
+        if word == tens:
+            return value
+        if word.startswith(tens) and word[len(tens):] in _NATIVE_UNITS:
+            return value + _NATIVE_UNITS[word[len(tens):]]
+
+    match = re.fullmatch(r"(?:([일이삼사오육칠팔구])?(십))?([일이삼사오육칠팔구])?", word)
+    if not word or not match:
+        return None
+    tens_digit, ten, unit = match.groups()
+    value = (_SINO_DIGITS[tens_digit] if tens_digit else 1) * 10 if ten else 0
+    return value + (_SINO_DIGITS[unit] if unit else 0)
+
+
+def _fold_word(word: str) -> str:
+    """한 어절: 문장 부호 제거 + 외래어 정리 (숫자는 앞뒤 어절을 봐야 하므로 따로)"""
+    word = _PUNCTUATION.sub("", word).replace("_", "")
+    if word in LOANWORDS:
+        return LOANWORDS[word]
+    for variant, canonical_form in SPELLING_VARIANTS.items():
+        if variant in word:
+            word = word.replace(variant, canonical_form)
+    return word
+
+
+def _fused_numeral(word: str):
+    """단위어가 붙은 어절 ("챕터일", "두번째", "일챕터") → 숫자로 바꾼 어절, 아니면 None"""
+    if word in NOT_NUMERALS:
+        return None
+    for prefix in PREFIX_COUNTERS:
+        if word.startswith(prefix) and len(word) > len(prefix):
+            value = numeral_value(word[len(prefix):])
+            if value is not None:
+                return f"{prefix}{value}"
+    for suffix in SUFFIX_COUNTERS:
+        index = word.find(suffix)
+        if index > 0:
+            value = numeral_value(word[:index])
+            if value is not None:
+                return f"{value}{word[index:]}"
+    return None
+
+
+def _convert_numerals(forms: list) -> list:
+    converted = list(forms)
+    for i, form in enumerate(forms):
+        fused = _fused_numeral(form)
+        if fused is not None:
+            converted[i] = fused
+            continue
+        value = numeral_value(form)
+        if value is None or form.isdigit():
+            continue
+        before = forms[i - 1] if i > 0 else ""
+        after = forms[i + 1] if i + 1 < len(forms) else ""
+        if before.endswith(PREFIX_COUNTERS) or (after.startswith(SUFFIX_COUNTERS) and after not in NOT_NUMERALS):
+            converted[i] = str(value)
+    return converted
+
+
+class NormalizedText:
+    """정규화된 전사 (만든 뒤에는 바꾸지 않음, 캐시에서 공유)
+
+    text: 원문, words: 원문 어절(공백 기준), forms: 어절별 정규형, compact: forms 를 이어 붙인 문자열
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.words = text.split()
+        folded = unicodedata.normalize("NFKC", text).lower().split()
+        # NFKC 가 어절 수를 바꾸는 경우(전각 공백 등)에는 원문 어절과 맞추지 않고 정규화 결과 기준
+        if len(folded) != len(self.words):
+            self.words = folded
+        self.forms = _convert_numerals([_fold_word(word) for word in folded])
+        self.compact = "".join(self.forms)
+        self._starts = []
+        position = 0
+        for form in self.forms:
+            self._starts.append(position)
+            position += len(form)
+        self._boundaries = frozenset(self._starts) | {len(self.compact)}
+
+    def word_at(self, position: int) -> int:
+        """compact 의 문자 위치 → 어절 인덱스"""
+        return max(0, bisect.bisect_right(self._starts, position) - 1)
+
+    def find(self, phrase: str, start: int = 0, breaks: frozenset = frozenset(), open_end: bool = False) -> int:
+        """compact 에서 start 이후 어절 경계에 맞는 phrase(정규형) 위치, 없으면 -1
+
+        breaks: phrase 안의 어절 경계 위치 (word_breaks), 이 위치에서는 전사도 띄어 써도 됨
+        open_end: 텍스트 끝을 어절 끝으로 보지 않음 (디코딩 중인 부분 전사는 마지막 어절이 더 이어질 수 있음)
+        """
+        if not phrase:
+            return -1
+        word_ends = self._boundaries - {len(self.compact)} if open_end else self._boundaries
+        position = self.compact.find(phrase, start)
+        while position >= 0:
+            end = position + len(phrase)
+            if position in self._boundaries:
+                crossed = [b - position for b in self._boundaries if position < b < end]
+                if all(offset in breaks for offset in crossed) or end in word_ends:
+                    return position
+            position = self.compact.find(phrase, position + 1)
+        return -1
+
+    def contains(self, phrase: str, breaks: frozenset = frozenset(), open_end: bool = False) -> bool:
+        """어절 경계에 맞게 phrase(정규형)가 포함되었는지"""
+        return self.find(phrase, 0, breaks, open_end) >= 0
+
+    def span(self, start_word: int, end_word: int) -> str:
+        """어절 범위 [start, end) 의 원문"""
+        return " ".join(self.words[start_word:end_word])
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@lru_cache(maxsize=1024)
+def _normalize_cached(text: str) -> NormalizedText:
+    return NormalizedText(text)
+
+
+def normalize(text) -> NormalizedText:
+    """문자열 → NormalizedText (이미 정규화된 객체면 그대로, 같은 문자열은 캐시된 객체)"""
+    return text if isinstance(text, NormalizedText) else _normalize_cached(text or "")
+
+
+def canonical(phrase: str) -> str:
+    """키워드/별칭의 매칭용 정규형"""
+    return normalize(phrase).compact
+
+
+def word_breaks(phrase: str) -> frozenset:
+    """키워드/별칭 정규형 안의 어절 경계 위치 ("메인 메뉴" → {2}, "점프" → 빈 집합)"""
+    normalized = normalize(phrase)
+    return frozenset(start for start in normalized._starts if 0 < start < len(normalized.compact))
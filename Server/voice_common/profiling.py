@@ -0,0 +1,217 @@
+"""
+실행 중 서버 프로파일링 (재시작 없이 관리자 요청으로 시작)
+- CPU 샘플링: 모든 스레드의 스택을 주기적으로 수집 → collapsed stack (flamegraph 호환) + 상위 함수
+- torch 연산자 프로파일: 세션 동안의 추론 호출을 torch.profiler로 감싸 연산자별 시간 + chrome trace
+- 메모리: tracemalloc 스냅샷 (세션 시작 대비 증가량 상위 + 원본 스냅샷 파일)
+- 세션은 다음 N개 요청 또는 T초 후 자동 종료, 결과는 PROFILE_DIR/<세션 ID>/ 에 저장
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_KINDS = ("cpu", "torch", "memory")
+
+
+class StackSampler(threading.Thread):
+    """sys._current_frames() 기반 샘플링 프로파일러"""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, directory: str):
+        with open(os.path.join(directory, "cpu_collapsed.txt"), "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # 리프 함수(self time) / 포함 함수(total time) 상위 목록
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                self_counts[frames[-1]] += count
+            for name in set(frames):
+                total_counts[name] += count
+        with open(os.path.join(directory, "cpu_top.txt"), "w", encoding="utf-8") as f:
+            f.write(f"samples: {self.samples} (interval {self.interval * 1000:.1f}ms)\n\n[self]\n")
+            for name, count in self_counts.most_common(40):
+                f.write(f"{count:8d}  {name}\n")
+            f.write("\n[total]\n")
+            for name, count in total_counts.most_common(40):
+                f.write(f"{count:8d}  {name}\n")
+
+
+class ProfileSession:
+    """프로파일링 세션 하나 (요청 수 / 시간 제한)"""
+
+    def __init__(self, session_id: str, directory: str, kinds: tuple, max_requests: int, max_seconds: float):
+        self.session_id = session_id
+        self.directory = directory
+        self.kinds = kinds
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+        self.started_at = time.time()
+        self.requests = 0
+        self.torch_calls = 0
+        self.torch_tables = []
+        self.sampler = None
+        self.memory_baseline = None
+        self.finished = False
+
+
+class Profiler:
+    """관리자 엔드포인트에서 사용하는 프로파일링 세션 관리자 (한 번에 하나의 세션)"""
+
+    def __init__(self, output_dir: str = "profiles"):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self.session = None
+
+    @property
+    def active(self) -> bool:
+        return self.session is not None and not self.session.finished
+
+    def start(self, kinds: tuple = PROFILE_KINDS, max_requests: int = 20, max_seconds: float = 60.0) -> dict:
+        with self._lock:
+            if self.active:
+                raise RuntimeError(f"profile session '{self.session.session_id}' already running")
+
+            session_id = time.strftime("%Y%m%d-%H%M%S")
+            directory = os.path.join(self.output_dir, session_id)
+            os.makedirs(directory, exist_ok=True)
+            session = ProfileSession(session_id, directory, kinds, max_requests, max_seconds)
+
+            if "cpu" in kinds:
+                session.sampler = StackSampler()
+                session.sampler.start()
+            if "memory" in kinds:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                session.memory_baseline = tracemalloc.take_snapshot()
+            self.session = session
+
+        if max_seconds:
+            timer = threading.Timer(max_seconds, self._expire, args=(session,))
+            timer.daemon = True
+            timer.start()
+        print(f"[Profiler] 세션 시작: {session_id} ({', '.join(kinds)}, {max_requests} requests / {max_seconds}s)")
+        return self.status()
+
+    def _expire(self, session: ProfileSession):
+        if self.session is session and not session.finished:
+            self.stop()
+
+    def request_finished(self):
+        """요청 하나가 끝날 때 호출 (요청 수 제한 도달 시 세션 종료)"""
+        session = self.session
+        if session is None or session.finished:
+            return
+        session.requests += 1
+        if session.max_requests and session.requests >= session.max_requests:
+            self.stop()
+
+    @contextlib.contextmanager
+    def torch_scope(self, label: str = "inference"):
+        """세션 중이면 torch.profiler로 감싸 연산자 프로파일 수집 (아니면 아무 것도 하지 않음)"""
+        session = self.session
+        if session is None or session.finished or "torch" not in session.kinds:
+            yield
+            return
+
+        from torch.profiler import ProfilerActivity, profile
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True, profile_memory=True) as prof:
+            yield
+        session.torch_calls += 1
+        prof.export_chrome_trace(os.path.join(session.directory, f"torch_trace_{session.torch_calls:03d}.json"))
+        session.torch_tables.append(
+            f"== {label} #{session.torch_calls} ==\n"
+            + prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=30)
+        )
+
+    def stop(self) -> dict:
+        """세션 종료 및 결과 파일 저장"""
+        with self._lock:
+            session = self.session
+            if session is None or session.finished:
+                return self.status()
+
+            if session.sampler:
+                session.sampler.stop()
+                session.sampler.write(session.directory)
+            if session.torch_tables:
+                with open(os.path.join(session.directory, "torch_ops.txt"), "w", encoding="utf-8") as f:
+                    f.write("\n\n".join(session.torch_tables))
+            if session.memory_baseline is not None:
+                snapshot = tracemalloc.take_snapshot()
+                snapshot.dump(os.path.join(session.directory, "tracemalloc.snapshot"))
+                with open(os.path.join(session.directory, "memory_top.txt"), "w", encoding="utf-8") as f:
+                    current, peak = tracemalloc.get_traced_memory()
+                    f.write(f"traced current: {current / 1e6:.1f}MB, peak: {peak / 1e6:.1f}MB\n\n")
+                    for stat in snapshot.compare_to(session.memory_baseline, "lineno")[:40]:
+                        f.write(f"{stat}\n")
+                tracemalloc.stop()
+            session.finished = True
+
+        print(f"[Profiler] 세션 종료: {session.session_id} ({session.requests} requests) → {session.directory}")
+        return self.status()
+
+    def status(self) -> dict:
+        session = self.session
+        if session is None:
+            return {"active": False}
+        return {
+            "active": not session.finished,
+            "session_id": session.session_id,
+            "kinds": list(session.kinds),
+            "requests": session.requests,
+            "max_requests": session.max_requests,
+            "elapsed": round(time.time() - session.started_at, 1),
+            "max_seconds": session.max_seconds,
+            "artifacts": self.artifacts(session.session_id)
+        }
+
+    def sessions(self) -> list:
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(os.listdir(self.output_dir), reverse=True)
+
+    def artifacts(self, session_id: str) -> list:
+        directory = os.path.join(self.output_dir, session_id)
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def artifact_path(self, session_id: str, name: str):
+        """다운로드할 결과 파일 경로 (세션 디렉터리 밖은 허용하지 않음)"""
+        if os.path.basename(session_id) != session_id or os.path.basename(name) != name:
+            return None
+        path = os.path.join(self.output_dir, session_id, name)
+        return path if os.path.isfile(path) else None
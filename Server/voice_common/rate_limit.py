@@ -0,0 +1,139 @@
+"""
+클라이언트별 토큰 버킷 요청 제한
+- 클라이언트 키: 접속 IP. X-Client-Id / X-Forwarded-For 헤더는 신뢰하는 프록시(trusted_proxies)를 거친 요청에서만 사용
+  (클라이언트가 헤더 값을 바꿔 가며 새 버킷을 받아 제한을 우회하지 못하도록)
+- 예산 종류별로 버킷을 따로 둠 (음성 인식 오디오 초, LLM 호출 수)
+- 초과 시 대기 없이 바로 거절하고 다시 시도할 수 있는 시각(초)을 알려줌
+"""
+
+import threading
+import time
+
+CLIENT_ID_HEADER = "x-client-id"
+FORWARDED_FOR_HEADER = "x-forwarded-for"
+
+
+def parse_trusted_proxies(value: str) -> frozenset:
+    """쉼표로 구분한 프록시 주소 목록 (TRUSTED_PROXIES 환경 변수)"""
+    return frozenset(address.strip() for address in value.split(",") if address.strip())
+
+
+def client_key(request, trusted_proxies: frozenset = frozenset()) -> str:
+    """요청의 클라이언트 키 (Starlette Request)
+
+    직접 접속한 요청은 IP 기준. 신뢰하는 프록시를 거친 요청만 프록시가 붙인 X-Client-Id,
+    없으면 X-Forwarded-For 에서 프록시가 아닌 마지막 주소를 사용
+    """
+    peer = request.client.host if request.client else "unknown"
+    if peer not in trusted_proxies:
+        return f"ip:{peer}"
+    client_id = request.headers.get(CLIENT_ID_HEADER, "").strip()
+    if client_id:
+        return f"id:{client_id[:64]}"
+    forwarded = [address.strip() for address in request.headers.get(FORWARDED_FOR_HEADER, "").split(",")]
+    for address in reversed(forwarded):
+        if address and address not in trusted_proxies:
+            return f"ip:{address}"
+    return f"ip:{peer}"
+
+
+class TokenBucket:
+    """용량 capacity, 초당 refill_rate 만큼 채워지는 버킷 (생성 시 가득 참)"""
+
+    __slots__ = ("capacity", "refill_rate", "tokens", "updated_at")
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def try_take(self, amount: float, now: float) -> float:
+        """토큰을 가져가면 0, 부족하면 충분해질 때까지 남은 시간(초)
+
+        한 번 요청량이 용량보다 크면 용량만큼만 요구 (긴 클립도 가득 찬 버킷으로는 통과)
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        if self.refill_rate <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.refill_rate
+
+    def level(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+
+class ClientRateLimiter:
+    """클라이언트 키별 토큰 버킷 모음 (capacity가 0이면 제한 없음)
+
+    idle_seconds 동안 쓰이지 않고 가득 찬 버킷은 정리 (클라이언트 수만큼 메모리가 늘지 않도록)
+    """
+
+    def __init__(self, name: str, capacity: float, refill_rate: float, idle_seconds: float = 600.0):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._last_sweep = time.monotonic()
+        self.allowed = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def try_acquire(self, client: str, amount: float = 1.0) -> tuple:
+        """(허용 여부, 다시 시도까지 남은 초)"""
+        if not self.enabled:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.capacity, self.refill_rate)
+            retry_after = bucket.try_take(amount, now)
+            if retry_after > 0:
+                self.rejected += 1
+            else:
+                self.allowed += 1
+            if now - self._last_sweep > self.idle_seconds:
+                self._sweep(now)
+        return retry_after == 0, retry_after
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        idle = [
+            client for client, bucket in self._buckets.items()
+            if now - bucket.updated_at > self.idle_seconds and bucket.level(now) >= self.capacity
+        ]
+        for client in idle:
+            del self._buckets[client]
+
+    def snapshot(self, top: int = 20) -> dict:
+        """버킷 잔량이 적은 클라이언트 순으로 top개"""
+        now = time.monotonic()
+        with self._lock:
+            levels = sorted(
+                ((client, bucket.level(now)) for client, bucket in self._buckets.items()),
+                key=lambda item: item[1]
+            )
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "refill_rate": self.refill_rate,
+            "clients": len(levels),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "levels": {client: round(level, 2) for client, level in levels[:top]}
+        }
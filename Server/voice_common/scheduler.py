@@ -0,0 +1,193 @@
+"""
+추론 작업 스케줄러
+- 게임 컨텍스트별 우선순위 클래스 (전투 중 > 인게임 UI > 메뉴 > 전사 전용)
+- 요청별 마감 시간(deadline): 추론 시작 전에 마감이 지난 요청은 버림(shed)
+- 클라이언트 연결이 끊기면 대기 중인 작업은 취소, 실행 중인 작업에는 취소 신호 전달
+- offer(): 결과를 기다리지 않는 부가 작업 (조기 종료 후 전체 전사 등), 대기 수 상한을 넘으면 버림
+- 선점 가능(preemptible) 작업: 실행 중에 더 높은 우선순위 작업이 들어오면 취소 신호를 받음
+  (섀도/전체 전사 같은 부가 작업이 하나뿐인 작업자와 모델 CPU를 붙잡아 플레이어 요청을 지연시키지 않도록)
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+
+# 우선순위 클래스 (값이 작을수록 먼저 처리)
+PRIORITY_COMBAT = 0      # InGame_Playing
+PRIORITY_INGAME = 1      # 그 외 InGame_* (일시정지, 게임오버 등)
+PRIORITY_MENU = 2        # Menu_* 및 컨텍스트 없는 명령
+PRIORITY_BACKGROUND = 3  # /transcribe 등 명령 분류가 없는 요청
+
+PRIORITY_NAMES = {
+    PRIORITY_COMBAT: "combat",
+    PRIORITY_INGAME: "ingame",
+    PRIORITY_MENU: "menu",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+def priority_for_context(context: str) -> int:
+    """게임 컨텍스트 → 우선순위 클래스"""
+    if context == "InGame_Playing":
+        return PRIORITY_COMBAT
+    if context and context.startswith("InGame_"):
+        return PRIORITY_INGAME
+    return PRIORITY_MENU
+
+
+class RequestShed(Exception):
+    """추론 시작 전에 마감 시간이 지나 버려진 요청"""
+    pass
+
+
+class RequestCancelled(Exception):
+    """클라이언트 연결 종료로 취소된 요청"""
+    pass
+
+
+class _Job:
+    __slots__ = ("priority", "deadline", "seq", "fn", "future", "cancel_event", "enqueued_at", "preemptible")
+
+    def __init__(self, priority: int, deadline: float, seq: int, fn, preemptible: bool = False):
+        self.priority = priority
+        self.preemptible = preemptible
+        self.deadline = deadline
+        self.seq = seq
+        self.fn = fn
+        self.future = Future()
+        self.cancel_event = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        # 같은 우선순위에서는 마감이 빠른 요청 먼저, 그 다음 도착 순서
+        return (self.priority, self.deadline, self.seq) < (other.priority, other.deadline, other.seq)
+
+
+class InferenceScheduler:
+    """우선순위 큐 + 전용 작업자 스레드로 추론 작업 실행
+
+    fn(cancel_event) 형태의 동기 함수를 받아 작업자 스레드에서 실행
+    """
+
+    def __init__(self, workers: int = 1, default_deadlines: dict = None):
+        self.default_deadlines = default_deadlines or {
+            PRIORITY_COMBAT: 3.0,
+            PRIORITY_INGAME: 5.0,
+            PRIORITY_MENU: 10.0,
+            PRIORITY_BACKGROUND: 30.0,
+        }
+        self._heap = []
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._stats = {name: {"completed": 0, "shed": 0, "cancelled": 0, "failed": 0, "dropped": 0, "preempted": 0}
+                       for name in PRIORITY_NAMES.values()}
+        self._running = 0
+        self._active = set()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True).start()
+
+    def _count(self, priority: int, key: str):
+        with self._cv:
+            self._stats[PRIORITY_NAMES[priority]][key] += 1
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                while not self._heap:
+                    self._cv.wait()
+                job = heapq.heappop(self._heap)
+                self._running += 1
+                self._active.add(job)
+
+            try:
+                if job.cancel_event.is_set():
+                    job.future.cancel()
+                    continue
+
+                waited = time.monotonic() - job.enqueued_at
+                if time.monotonic() > job.deadline:
+                    self._count(job.priority, "shed")
+                    print(f"[Scheduler] 마감 초과로 버림 ({PRIORITY_NAMES[job.priority]}, 대기 {waited:.2f}s)")
+                    job.future.set_exception(RequestShed(f"deadline exceeded after waiting {waited:.2f}s"))
+                    continue
+
+                try:
+                    result = job.fn(job.cancel_event)
+                except Exception as e:
+                    self._count(job.priority, "failed")
+                    job.future.set_exception(e)
+                else:
+                    self._count(job.priority, "completed")
+                    job.future.set_result(result)
+            finally:
+                with self._cv:
+                    self._running -= 1
+                    self._active.discard(job)
+
+    def _enqueue(self, job: _Job):
+        """대기열에 추가하고, 실행 중인 더 낮은 우선순위의 선점 가능 작업에 취소 신호 (self._cv 보유 상태)"""
+        heapq.heappush(self._heap, job)
+        self._cv.notify()
+        for running in self._active:
+            if running.preemptible and running.priority > job.priority and not running.cancel_event.is_set():
+                running.cancel_event.set()
+                self._stats[PRIORITY_NAMES[running.priority]]["preempted"] += 1
+                print(f"[Scheduler] {PRIORITY_NAMES[job.priority]} 작업 도착 → "
+                      f"실행 중인 {PRIORITY_NAMES[running.priority]} 작업 선점")
+
+    async def submit(self, fn, priority: int = PRIORITY_MENU, deadline_seconds: float = None,
+                     is_disconnected=None, poll_interval: float = 0.1, preemptible: bool = False):
+        """작업 등록 후 결과 대기
+
+        deadline_seconds: 도착 시점 기준 마감까지 남은 시간 (없으면 우선순위별 기본값)
+        is_disconnected: 클라이언트 연결 종료 여부를 확인하는 async 함수 (Starlette Request.is_disconnected)
+        preemptible: 실행 중 더 높은 우선순위 작업이 들어오면 cancel_event 설정 (fn 이 중단 여부를 판단)
+        """
+        budget = deadline_seconds if deadline_seconds else self.default_deadlines[priority]
+        job = _Job(priority, time.monotonic() + budget, next(self._seq), fn, preemptible)
+        with self._cv:
+            self._enqueue(job)
+
+        result = asyncio.wrap_future(job.future)
+        while True:
+            done, _ = await asyncio.wait({result}, timeout=poll_interval)
+            if done:
+                return result.result()
+            if is_disconnected is not None and await is_disconnected():
+                job.cancel_event.set()
+                # 실행 중이던 작업의 결과/예외는 버림
+                result.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._count(priority, "cancelled")
+                print(f"[Scheduler] 클라이언트 연결 종료 → 작업 취소 ({PRIORITY_NAMES[priority]})")
+                raise RequestCancelled("client disconnected")
+
+    def offer(self, fn, priority: int = PRIORITY_BACKGROUND, deadline_seconds: float = None,
+              max_queued: int = 1):
+        """결과를 기다리지 않는 선점 가능 작업 등록 (작업자 스레드 등 동기 코드에서 호출 가능)
+
+        같은 우선순위의 대기 작업이 max_queued개 이상이면 등록하지 않고 버림 → None, 아니면 작업의 Future
+        """
+        budget = deadline_seconds if deadline_seconds else self.default_deadlines[priority]
+        with self._cv:
+            if sum(1 for job in self._heap if job.priority == priority) >= max_queued:
+                self._stats[PRIORITY_NAMES[priority]]["dropped"] += 1
+                return None
+            job = _Job(priority, time.monotonic() + budget, next(self._seq), fn, preemptible=True)
+            self._enqueue(job)
+        return job.future
+
+    def snapshot(self) -> dict:
+        with self._cv:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for job in self._heap:
+                queued[PRIORITY_NAMES[job.priority]] += 1
+            return {
+                "queued": queued,
+                "running": self._running,
+                "stats": {name: dict(counts) for name, counts in self._stats.items()},
+                "default_deadlines": {PRIORITY_NAMES[p]: d for p, d in self.default_deadlines.items()}
+            }
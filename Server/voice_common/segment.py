@@ -0,0 +1,65 @@
+"""
+한 발화 안의 여러 명령/스킬 분리 ("왼쪽으로 이동 점프", "파이어볼 그리고 실드")
+- 정규화된 전사(voice_common.normalize)에서 카탈로그 구문(명령 키워드, 활성 스킬 이름/별칭)의
+  정규형 출현 위치를 어절 경계에 맞는 것만 모두 찾고, 긴 구문부터 겹치지 않게 채택 → 발화 순서대로 정렬
+- 항목마다 어절(공백 단위) 범위와 신뢰도 (구문이 걸친 어절을 얼마나 덮는지)
+- "그리고", "다음에" 같은 연결어는 어떤 구문에도 걸리지 않으므로 자연히 건너뜀
+"""
+
+from voice_common.normalize import canonical, normalize, word_breaks
+
+
+def _phrases(catalog, skills: list, commands, context: str) -> list:
+    """[(정규형 구문, 어절 경계 위치, 대상, 시스템 명령 여부)] (commands가 None이면 모든 명령 허용)"""
+    phrases = [(keyword, catalog.breaks(keyword), f"SYSTEM:{command}", True)
+               for keyword, command in catalog.index_for(context) if commands is None or command in commands]
+    by_canonical = {canonical(skill): skill for skill in skills}
+    for alias, target in catalog.skill_index:
+        skill = by_canonical.get(canonical(target))
+        if skill:
+            phrases.append((alias, catalog.breaks(alias), skill, False))
+    phrases += [(key, word_breaks(skill), skill, False) for key, skill in by_canonical.items() if key]
+    return phrases
+
+
+def segment_commands(text, catalog, skills: list = (), commands=None, context: str = "") -> list:
+    """전사 텍스트(문자열 또는 NormalizedText) → 발화 순서의 명령/스킬 목록
+
+    항목: {"name", "confidence", "is_system_command", "start_word", "end_word", "text"}
+    start_word/end_word: 원문 어절 인덱스 [start, end), text: 해당 어절들의 원문
+    같은 길이의 구문이 겹치면 시스템 명령 우선 (resolve_text 와 같은 우선순위)
+    context: 게임 컨텍스트 (컨텍스트별 키워드 반영)
+    """
+    normalized = normalize(text)
+    compact = normalized.compact
+    hits = []
+    for phrase, breaks, target, is_system in _phrases(catalog, list(skills), commands, context):
+        start = normalized.find(phrase, 0, breaks)
+        while start >= 0:
+            hits.append((start, start + len(phrase), target, is_system))
+            start = normalized.find(phrase, start + 1, breaks)
+
+    taken = []
+    occupied = [False] * len(compact)
+    for start, end, target, is_system in sorted(hits, key=lambda h: (h[0] - h[1], not h[3], h[0])):
+        if any(occupied[start:end]):
+            continue
+        for i in range(start, end):
+            occupied[i] = True
+        taken.append((start, end, target, is_system))
+    taken.sort()
+
+    items = []
+    for start, end, target, is_system in taken:
+        start_word = normalized.word_at(start)
+        end_word = normalized.word_at(end - 1) + 1
+        span_length = sum(len(form) for form in normalized.forms[start_word:end_word])
+        items.append({
+            "name": target,
+            "confidence": round(min(0.95, 0.5 + 0.45 * (end - start) / span_length), 3),
+            "is_system_command": is_system,
+            "start_word": start_word,
+            "end_word": end_word,
+            "text": normalized.span(start_word, end_word)
+        })
+    return items
@@ -0,0 +1,154 @@
+"""
+섀도 모드: 실제 요청 일부를 응답 후 다른 엔진/설정으로 한 번 더 처리해 비교 기록
+- 플레이어 응답 경로에는 영향 없음 (FastAPI BackgroundTasks로 응답 전송 후 실행)
+- 전사 텍스트, 판정 결과, 지연을 JSONL로 남기고 일치율/지연 통계를 집계
+- 대기 중인 섀도 작업이 max_pending 이상이면 샘플링하지 않음 (부하 누적 방지)
+- 섀도 작업이 플레이어 요청에 양보하면(선점, 엔진 사용 중, 마감 초과) ShadowSkipped → 오류가 아닌 skipped 로 집계
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+class ShadowSkipped(Exception):
+    """플레이어 요청에 양보해 실행하지 않았거나 중단한 섀도 작업"""
+    pass
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+class ShadowRecorder:
+    """섀도 실행 샘플링 + 비교 결과 기록
+
+    primary / shadow 결과 dict: {"text", "matched", "confidence", "latency"}
+    """
+
+    def __init__(self, primary_name: str, shadow_name: str, sample_rate: float = 0.0,
+                 log_path: str = "", max_pending: int = 2, window: int = 1000):
+        self.primary_name = primary_name
+        self.shadow_name = shadow_name
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.sampled = 0
+        self.completed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.skipped = 0
+        self._text_matches = deque(maxlen=window)
+        self._decision_matches = deque(maxlen=window)
+        self._primary_latencies = deque(maxlen=window)
+        self._shadow_latencies = deque(maxlen=window)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def should_sample(self) -> bool:
+        """이번 요청을 섀도로 처리할지 결정 (True면 반드시 run()을 호출해야 함)"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            self.sampled += 1
+        return True
+
+    async def run(self, primary: dict, run_shadow, metadata: dict = None):
+        """run_shadow: 섀도 결과 dict를 반환하는 async 함수 (응답 전송 후 백그라운드에서 호출)"""
+        try:
+            shadow = await run_shadow()
+        except ShadowSkipped as e:
+            with self._lock:
+                self.skipped += 1
+            print(f"[Shadow] {self.shadow_name} 건너뜀: {e}")
+            return
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"[Shadow] {self.shadow_name} 실패: {e}")
+            return
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        text_match = primary["text"].replace(" ", "") == shadow["text"].replace(" ", "")
+        decision_match = primary["matched"] == shadow["matched"]
+        with self._lock:
+            self.completed += 1
+            self._text_matches.append(text_match)
+            self._decision_matches.append(decision_match)
+            self._primary_latencies.append(primary["latency"])
+            self._shadow_latencies.append(shadow["latency"])
+
+        entry = {
+            "time": time.time(),
+            **(metadata or {}),
+            "primary": {"name": self.primary_name, **primary},
+            "shadow": {"name": self.shadow_name, **shadow},
+            "text_match": text_match,
+            "decision_match": decision_match
+        }
+        if not decision_match:
+            print(f"[Shadow] 판정 불일치: {self.primary_name}={primary['matched']} ('{primary['text']}') / "
+                  f"{self.shadow_name}={shadow['matched']} ('{shadow['text']}')")
+        if self.log_path:
+            await asyncio.to_thread(self._append, entry)
+
+    def _append(self, entry: dict):
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            text_matches = list(self._text_matches)
+            decision_matches = list(self._decision_matches)
+            primary_latencies = list(self._primary_latencies)
+            shadow_latencies = list(self._shadow_latencies)
+            pending = self._pending
+
+        def rate(values):
+            return round(sum(values) / len(values), 4) if values else None
+
+        return {
+            "primary": self.primary_name,
+            "shadow": self.shadow_name,
+            "sample_rate": self.sample_rate,
+            "sampled": self.sampled,
+            "completed": self.completed,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "pending": pending,
+            "text_match_rate": rate(text_matches),
+            "decision_match_rate": rate(decision_matches),
+            "primary_latency": {
+                "p50": round(_percentile(primary_latencies, 0.50), 3),
+                "p95": round(_percentile(primary_latencies, 0.95), 3)
+            },
+            "shadow_latency": {
+                "p50": round(_percentile(shadow_latencies, 0.50), 3),
+                "p95": round(_percentile(shadow_latencies, 0.95), 3)
+            },
+            "log_path": self.log_path or None
+        }
@@ -0,0 +1,124 @@
+"""
+메모리 매핑 Whisper 가중치 저장소
+- whisper.load_model 은 체크포인트를 프로세스마다 힙 메모리로 역직렬화 (시작이 느리고 프로세스 수만큼 RAM 사용)
+- 가중치를 정렬된 원시 텐서 바이트(<이름>.bin) + 색인(<이름>.json)으로 한 번 내보내 두면
+  서버는 파일을 읽기 전용으로 mmap 해 그대로 텐서로 사용 → 로드가 거의 즉시,
+  같은 호스트의 모든 프로세스가 페이지 캐시의 같은 물리 페이지를 공유
+- CPU 추론 dtype(float32)으로 저장 (로드 시 변환/복사가 없도록, 원본 fp16 체크포인트의 두 배 크기)
+- 내보내기: python tools/export_weights.py base --out weights (서버는 WEIGHT_STORE_DIR 로 지정)
+"""
+
+import json
+import os
+
+ALIGNMENT = 64
+FORMAT_VERSION = 1
+
+
+def store_paths(directory: str, name: str) -> tuple:
+    return os.path.join(directory, f"{name}.json"), os.path.join(directory, f"{name}.bin")
+
+
+def has_store(directory: str, name: str) -> bool:
+    return bool(directory) and all(os.path.exists(path) for path in store_paths(directory, name))
+
+
+def _model_tensors(model) -> list:
+    """[(이름, 밀집 텐서, 희소 여부)] 파라미터 + 모든 버퍼 (비영속 버퍼 포함: 디코더 마스크, 정렬 헤드)"""
+    tensors = [(name, parameter, False) for name, parameter in model.named_parameters()]
+    for name, buffer in model.named_buffers():
+        tensors.append((name, buffer.to_dense() if buffer.is_sparse else buffer, buffer.is_sparse))
+    return tensors
+
+
+def export_store(model, name: str, directory: str) -> str:
+    """로드된 Whisper 모델 → <directory>/<name>.bin + .json, 색인 경로 반환"""
+    import dataclasses
+
+    os.makedirs(directory, exist_ok=True)
+    index_path, data_path = store_paths(directory, name)
+    entries = []
+    offset = 0
+    temp_path = data_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        for tensor_name, tensor, sparse in _model_tensors(model):
+            array = tensor.detach().cpu().contiguous().numpy()
+            padding = -offset % ALIGNMENT
+            f.write(b"\0" * padding)
+            offset += padding
+            f.write(array.tobytes())
+            entries.append({
+                "name": tensor_name,
+                "dtype": str(array.dtype),
+                "shape": list(array.shape),
+                "offset": offset,
+                "sparse": sparse
+            })
+            offset += array.nbytes
+    os.replace(temp_path, data_path)
+
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "format": FORMAT_VERSION,
+            "name": name,
+            "dims": dataclasses.asdict(model.dims),
+            "bytes": offset,
+            "tensors": entries
+        }, f, indent=1)
+    return index_path
+
+
+def _assign(model, name: str, tensor, is_parameter: bool):
+    import torch
+
+    module_path, _, attr = name.rpartition(".")
+    module = model.get_submodule(module_path) if module_path else model
+    if is_parameter:
+        setattr(module, attr, torch.nn.Parameter(tensor, requires_grad=False))
+    else:
+        module._buffers[attr] = tensor
+
+
+def load_store(directory: str, name: str):
+    """mmap 저장소 → Whisper 모델 (가중치는 파일 페이지를 그대로 가리키는 읽기 전용 텐서)
+
+    모델 골격은 가능하면 meta 장치에서 만들어 임의 초기화 비용/힙 할당 없이 텐서만 교체
+    (meta 생성이 안 되는 torch 버전이면 CPU 에서 만든 뒤 교체, 임시 가중치는 교체 후 해제)
+    """
+    import warnings
+
+    import numpy as np
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    index_path, data_path = store_paths(directory, name)
+    with open(index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("format") != FORMAT_VERSION:
+        raise ValueError(f"unsupported weight store format: {index.get('format')}")
+
+    dims = ModelDimensions(**index["dims"])
+    try:
+        with torch.device("meta"):
+            model = Whisper(dims)
+    except Exception:
+        model = Whisper(dims)
+    parameter_names = {n for n, _ in model.named_parameters()}
+
+    data = np.memmap(data_path, dtype=np.uint8, mode="r")
+    with warnings.catch_warnings():
+        # 읽기 전용 mmap 에서 만든 텐서 경고 (추론은 가중치를 쓰지 않음)
+        warnings.simplefilter("ignore", UserWarning)
+        for entry in index["tensors"]:
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"])) if entry["shape"] else 1
+            array = data[entry["offset"]:entry["offset"] + count * dtype.itemsize].view(dtype).reshape(entry["shape"])
+            tensor = torch.from_numpy(array)
+            if entry.get("sparse"):
+                tensor = tensor.to_sparse()
+            _assign(model, entry["name"], tensor, entry["name"] in parameter_names)
+
+    leftover = [n for n, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if leftover:
+        raise ValueError(f"weight store {name} is missing tensors: {', '.join(leftover[:5])}")
+    return model.eval()